@@ -0,0 +1,131 @@
+"""
+Per-account row filters for the IDOO report, as data instead of if/elif.
+
+A rule set maps an account key to include/exclude lists:
+
+    {
+        "*":      {"exclude_stores": ["PHILLY - HUB"]},
+        "PHILLY": {"exclude_markets": ["BAWA"]},
+        "BAWA":   {"include_markets": ["BAWA"]}
+    }
+
+Keys are matched against the account label case-insensitively, as a
+substring, in file order; the first match applies together with "*".
+Fields: include_/exclude_ markets, stores and skus. Include lists keep
+only the listed values; excludes drop them.
+
+The defaults above are the long-standing IOTPHILLY / IOTBAWA behaviour.
+Override them with a JSON file at ACCOUNT_RULES_FILE (default
+account_rules.json, if it exists).
+
+Each account's rules compile to one boolean mask over the report, applied
+in a single pass.
+"""
+
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES = {
+    "*": {"exclude_stores": ["PHILLY - HUB"]},
+    "PHILLY": {"exclude_markets": ["BAWA"]},
+    "BAWA": {"include_markets": ["BAWA"]},
+}
+
+# Rule field suffix -> report column
+COLUMNS = {
+    "markets": "Market",
+    "stores": "Store Name",
+    "skus": "Item Number",
+}
+
+
+def load_rules(path=None):
+    """Rule set from ACCOUNT_RULES_FILE / account_rules.json, else the defaults"""
+    path = path or os.getenv("ACCOUNT_RULES_FILE", "account_rules.json")
+    if not os.path.exists(path):
+        return DEFAULT_RULES
+    with open(path, "r", encoding="utf-8") as f:
+        rules = json.load(f)
+    unknown = {
+        field for rule in rules.values() for field in rule
+        if field.split("_", 1)[-1] not in COLUMNS or not field.startswith(("include_", "exclude_"))
+    }
+    if unknown:
+        raise ValueError(f"Unknown account rule field(s) in {path}: {', '.join(sorted(unknown))}")
+    return rules
+
+
+class AccountFilter:
+    """One account's rules, merged into (column, values, include) conditions"""
+
+    def __init__(self, label, conditions):
+        self.label = label
+        self.conditions = conditions
+
+    def describe(self):
+        if not self.conditions:
+            return "no filters"
+        return "; ".join(
+            f"{'only' if include else 'not'} {column} in {sorted(values)}"
+            for column, values, include in self.conditions
+        )
+
+    def mask(self, df, factorized=None):
+        """
+        Boolean numpy mask of the rows this account keeps.
+
+        Each condition is evaluated on the column's distinct values and
+        broadcast through the factorized codes, so the cost per condition is
+        one take() over the rows. Pass factorized (from factorize()) to reuse
+        that work. Raises ValueError when a rule names a missing column.
+        """
+        import numpy as np
+
+        factorized = factorized or factorize(df, {column for column, _, _ in self.conditions})
+        keep = np.ones(len(df), dtype=bool)
+        for column, values, include in self.conditions:
+            if column not in factorized:
+                raise ValueError(f"Account rules for {self.label} filter on {column!r}, "
+                                 f"which is not a column of the report")
+            codes, uniques = factorized[column]
+            hit = np.fromiter((str(u) in values for u in uniques), dtype=bool, count=len(uniques))
+            # Missing values (code -1) never match a listed value
+            row_hit = np.append(hit, False)[codes]
+            keep &= row_hit if include else ~row_hit
+        return keep
+
+    def apply(self, df):
+        return df[self.mask(df)]
+
+
+def factorize(df, columns):
+    """{column: (codes, uniques)} for the filter columns present in df"""
+    import pandas as pd
+
+    return {column: pd.factorize(df[column]) for column in columns if column in df.columns}
+
+
+def compile_rules(label, rules=None):
+    """AccountFilter for an account label"""
+    rules = DEFAULT_RULES if rules is None else rules
+    label_upper = label.upper()
+    matched = [rules["*"]] if "*" in rules else []
+    for key, rule in rules.items():
+        if key != "*" and key.upper() in label_upper:
+            matched.append(rule)
+            break
+
+    merged = {}
+    for rule in matched:
+        for field, values in rule.items():
+            merged.setdefault(field, set()).update(str(v) for v in values)
+
+    conditions = []
+    for field, values in merged.items():
+        kind, target = field.split("_", 1)
+        conditions.append((COLUMNS[target], frozenset(values), kind == "include"))
+    return AccountFilter(label, conditions)
+
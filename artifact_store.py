@@ -0,0 +1,216 @@
+"""
+Content-addressed store for RT POS exports and generated reports.
+
+Each browser session downloads into its own job directory, so parallel
+sessions never see each other's files. Finished files are moved into the
+store under their SHA-256 and indexed by (account, run date, kind):
+
+    download_files/artifacts/
+        jobs/<date>/<session>-<id>/      per-session download directories
+        objects/ab/abcdef....xlsx        one copy per distinct content
+        index.db                         account, run_date, kind, name -> sha256
+
+Identical content is kept once, however many runs produce it. Old index
+entries are pruned after ARTIFACT_RETENTION_DAYS (default 30). The newest
+ARTIFACT_KEEP_LAST (default 3) per account and kind are always kept.
+Objects nothing points to any more are deleted.
+
+Usage:
+    from artifact_store import get_artifact_store
+
+    store = get_artifact_store()
+    path = store.latest("IOTPHILLY", "rtpos_export_7d")
+"""
+
+import os
+import uuid
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOT = os.path.join(os.getcwd(), "download_files", "artifacts")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    account     TEXT NOT NULL,
+    run_date    TEXT NOT NULL,
+    kind        TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    sha256      TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    job         TEXT,
+    created_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_key ON artifacts (account, kind, run_date);
+CREATE INDEX IF NOT EXISTS idx_artifacts_sha ON artifacts (sha256);
+"""
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """Per-job download directories plus a deduplicated, indexed object store"""
+
+    def __init__(self, root=None, retention_days=None, keep_last=None):
+        self.root = os.path.abspath(root or os.getenv("ARTIFACT_DIR") or DEFAULT_ROOT)
+        if retention_days is None:
+            retention_days = os.getenv("ARTIFACT_RETENTION_DAYS", "30")
+        if keep_last is None:
+            keep_last = os.getenv("ARTIFACT_KEEP_LAST", "3")
+        self.retention_days = int(retention_days)
+        self.keep_last = int(keep_last)
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.jobs_dir = os.path.join(self.root, "jobs")
+        self.db_path = os.path.join(self.root, "index.db")
+        self._lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Short-lived connection, so any thread can use the store"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def job_dir(self, session_key="session"):
+        """A fresh, empty directory for one browser session's downloads"""
+        safe_key = "".join(c if c.isalnum() or c in "-_." else "_" for c in session_key)
+        path = os.path.join(self.jobs_dir, datetime.now().strftime("%Y-%m-%d"),
+                            f"{safe_key}-{uuid.uuid4().hex[:8]}")
+        os.makedirs(path)
+        return path
+
+    def object_path(self, sha256, ext):
+        return os.path.join(self.objects_dir, sha256[:2], sha256 + ext)
+
+    def put(self, path, account, kind, run_date=None, name=None, keep=False):
+        """
+        Add a file to the store and index it; returns the stored object's path.
+
+        The file is moved in, or copied when keep is set so the original
+        stays where it is. Content already in the store is not written twice.
+        """
+        sha256 = file_sha256(path)
+        ext = os.path.splitext(path)[1].lower()
+        target = self.object_path(sha256, ext)
+        size = os.path.getsize(path)
+        job = os.path.basename(os.path.dirname(path)) if path.startswith(self.jobs_dir) else None
+
+        with self._lock:
+            if os.path.exists(target):
+                if not keep:
+                    os.remove(path)
+                logger.info(f"Artifact {os.path.basename(path)} already stored as {sha256[:12]}")
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if keep:
+                    # A copy, not a hard link: the original may be rewritten in place later
+                    shutil.copy2(path, target)
+                else:
+                    shutil.move(path, target)
+                logger.info(f"Stored artifact {os.path.basename(path)} as {sha256[:12]} ({size} bytes)")
+
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO artifacts (account, run_date, kind, name, sha256, size, job, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (account, run_date or datetime.now().strftime("%Y-%m-%d"), kind,
+                     name or os.path.basename(path), sha256, size, job,
+                     datetime.now().isoformat(timespec="seconds")),
+                )
+        return target
+
+    def find(self, account=None, kind=None, run_date=None):
+        """Index rows (newest first) as dicts with the object path added"""
+        clauses, params = [], []
+        for column, value in (("account", account), ("kind", kind), ("run_date", run_date)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                f"SELECT * FROM artifacts {where} ORDER BY created_at DESC, rowid DESC", params
+            ).fetchall()
+        results = []
+        for row in rows:
+            entry = dict(row)
+            entry["path"] = self.object_path(entry["sha256"], os.path.splitext(entry["name"])[1].lower())
+            results.append(entry)
+        return results
+
+    def latest(self, account, kind, run_date=None):
+        """Path of the newest artifact for (account, kind[, run_date]), or None"""
+        for entry in self.find(account, kind, run_date):
+            if os.path.exists(entry["path"]):
+                return entry["path"]
+        return None
+
+    def prune(self):
+        """Apply the retention policy; returns the number of objects deleted"""
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat(timespec="seconds")
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                """
+                DELETE FROM artifacts WHERE created_at < ? AND rowid NOT IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY account, kind ORDER BY created_at DESC, rowid DESC
+                        ) AS rank FROM artifacts
+                    ) WHERE rank <= ?
+                )
+                """,
+                (cutoff, self.keep_last),
+            )
+            referenced = {row[0] for row in conn.execute("SELECT DISTINCT sha256 FROM artifacts")}
+
+            removed = 0
+            for dirpath, _, filenames in os.walk(self.objects_dir):
+                for filename in filenames:
+                    if os.path.splitext(filename)[0] not in referenced:
+                        os.remove(os.path.join(dirpath, filename))
+                        removed += 1
+
+        # Job directories are only scratch space for downloads; leave today's
+        # and yesterday's alone since browsers may still be using them
+        stale = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        for day in os.listdir(self.jobs_dir):
+            if day < stale:
+                shutil.rmtree(os.path.join(self.jobs_dir, day), ignore_errors=True)
+
+        if removed:
+            logger.info(f"Pruned {removed} artifact(s) older than {self.retention_days} days")
+        return removed
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """Process-wide artifact store (root from ARTIFACT_DIR)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore()
+        return _store
@@ -0,0 +1,278 @@
+"""
+Browserless client for the b2b_tmo catalog allocations (CATALOG_CLIENT=http).
+
+The browser path logs in on init.do, switches to isaTop/header, clicks
+show_catalog_view() and reads the items from the form_input frame, with
+one tab per extra section. Each of those frames is a plain HTML page, so
+this client requests the same pages over one pooled requests session:
+
+    init.do login form          POST the form; the session keeps the cookies
+    logged-in frameset          isaTop frame -> header frame
+    header show_catalog_view()  catalog URL, the default (Phones) section
+    cat-secnav-areaname links   the other sections (CPO)
+
+Pages are parsed with lxml (pip install lxml). If a page doesn't look the
+way the browser path expects, CatalogParseError is raised. Examples: no
+login form, no frame, no catalog list, no section link, or a list holder
+with no items in it (they may be rendered by JavaScript) unless the page
+says the section is empty.
+harvest_allocations() logs it and returns None, and the caller falls back
+to the browser. A login the site rejects (the form comes back) raises
+CatalogLoginError instead, which harvest_allocations() lets through: the
+browser would only try the same password again and risk a lockout.
+"""
+
+import re
+import logging
+from urllib.parse import urljoin, urlsplit
+
+from proxy_pool import get_proxy_pool
+from politeness import get_scheduler, TMO_HOST
+from log_pipeline import SkuLog
+from tmo_catalog import (
+    TMO_LOGIN_URL, CATALOG_ITEM_XPATH, CATALOG_SECTIONS,
+    allocation_available, merge_sections, section_nav_xpath,
+)
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+TIMEOUT = (10, 60)
+
+CATALOG_LIST_XPATH = '//div[contains(@class,"catItemList-holder")]'
+# Text on a catalog page that really has nothing in it, rather than items still to be rendered
+_EMPTY_LIST_TEXT = re.compile(r"\bno (?:items|products|results)\b", re.I)
+
+# URL-ish string literal inside an onclick / javascript: href / script body
+_URL_LITERAL = re.compile(r"""['"]([^'"\s]+\.(?:do|jsp)[^'"\s]*)['"]""")
+_CATALOG_VIEW_FUNCTION = re.compile(r"function\s+show_catalog_view\s*\([^)]*\)\s*\{(.*?)\n?\s*\}", re.S)
+
+
+class CatalogParseError(Exception):
+    """A catalog page didn't have what the browser path would look for"""
+
+
+class CatalogLoginError(Exception):
+    """The site rejected the credentials (the login form came back)"""
+
+
+def _parse(html):
+    try:
+        import lxml.html
+    except ImportError as e:
+        raise CatalogParseError("the HTTP catalog client needs lxml (pip install lxml)") from e
+    if not html or not html.strip():
+        raise CatalogParseError("empty page")
+    return lxml.html.document_fromstring(html)
+
+
+def new_session(proxy=None, pool_size=8):
+    """requests session with a keep-alive connection pool, optionally through a proxy"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    if proxy:
+        # Unlike Chrome's --proxy-server, requests takes the credentials too
+        session.proxies = {"http": proxy.url, "https": proxy.url}
+    return session
+
+
+def login_form(doc, page_url):
+    """(action URL, fields) of the form around input#userid"""
+    forms = doc.xpath('//input[@id="userid"]/ancestor::form[1]')
+    if not forms:
+        raise CatalogParseError("login form not found")
+    form = forms[0]
+
+    fields = {}
+    for field in form.xpath(".//input[@name] | .//select[@name] | .//textarea[@name]"):
+        name = field.get("name")
+        kind = (field.get("type") or "text").lower()
+        if field.tag == "select":
+            selected = field.xpath(".//option[@selected]") or field.xpath(".//option")
+            fields[name] = selected[0].get("value", selected[0].text_content()) if selected else ""
+        elif kind in ("checkbox", "radio"):
+            if field.get("checked") is not None:
+                fields[name] = field.get("value", "on")
+        elif kind not in ("submit", "button", "image", "reset", "file"):
+            fields[name] = field.get("value", "")
+    return urljoin(page_url, form.get("action") or page_url), fields
+
+
+def frame_url(doc, page_url, name):
+    """Absolute src of the frame/iframe called name"""
+    src = doc.xpath(f'//frame[@name="{name}"]/@src | //iframe[@name="{name}"]/@src')
+    if not src:
+        raise CatalogParseError(f"frame {name!r} not found")
+    return urljoin(page_url, src[0].strip())
+
+
+def catalog_view_url(header_doc, page_url):
+    """URL show_catalog_view() loads, from its definition in the header frame"""
+    for script in header_doc.xpath("//script/text()"):
+        body = _CATALOG_VIEW_FUNCTION.search(script)
+        if body:
+            literal = _URL_LITERAL.search(body.group(1))
+            if literal:
+                return urljoin(page_url, literal.group(1))
+    raise CatalogParseError("show_catalog_view() target not found in the header frame")
+
+
+def section_url(catalog_doc, page_url, nav_label):
+    """URL behind a section's cat-secnav-areaname link"""
+    links = catalog_doc.xpath(section_nav_xpath(nav_label) + "/ancestor::a[1]")
+    if not links:
+        raise CatalogParseError(f"{nav_label} section link not found")
+    link = links[0]
+    href = (link.get("href") or "").strip()
+    if href and not href.startswith(("javascript:", "#")):
+        return urljoin(page_url, href)
+    literal = _URL_LITERAL.search(f"{href} {link.get('onclick') or ''}")
+    if literal:
+        return urljoin(page_url, literal.group(1))
+    raise CatalogParseError(f"{nav_label} section link has no URL")
+
+
+def parse_catalog_items(doc, section_name):
+    """[(sku, available_qty)] for items with allocation, like extract_catalog_items()"""
+    if not doc.xpath(CATALOG_LIST_XPATH):
+        raise CatalogParseError(f"{section_name}: catalog item list not found")
+
+    nodes = doc.xpath(CATALOG_ITEM_XPATH)
+    if not nodes:
+        if _EMPTY_LIST_TEXT.search(doc.text_content()):
+            logger.info(f"{section_name}: the catalog lists no items")
+            return []
+        raise CatalogParseError(f"{section_name}: catalog item list is empty and the page doesn't say why")
+
+    items = []
+    sku_log = SkuLog(logger, section_name)
+    for node in nodes:
+        try:
+            node_sku = node.xpath('.//div[@class="cat-prd-id"]')[0].text_content().strip()
+            qty_text = " ".join(node.xpath('.//td[@class="cat-prd-qty"]')[0].text_content().split())
+            qty = allocation_available(qty_text)
+            if int(qty) > 0:
+                sku_log.added(node_sku)
+                items.append((node_sku, qty))
+        except Exception as e:
+            logger.error(f"Error processing {section_name} node: {e}")
+            continue
+
+    sku_log.summary()
+    return items
+
+
+class CatalogClient:
+    """One logged-in b2b_tmo session over HTTP"""
+
+    def __init__(self, session=None, login_url=TMO_LOGIN_URL, proxy=None):
+        self.session = session or new_session(proxy)
+        self.login_url = login_url
+        self.proxy = proxy
+        self.home_url = None
+
+    def _request(self, method, url, **kwargs):
+        import requests
+
+        get_scheduler().throttle(urlsplit(url).hostname)
+        try:
+            response = self.session.request(method, url, timeout=TIMEOUT, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            # Only a connection that fails counts against the proxy
+            self._report_proxy(False)
+            raise
+        response.raise_for_status()
+        return response
+
+    def _report_proxy(self, ok):
+        pool = get_proxy_pool()
+        if self.proxy and pool:
+            pool.report(self.proxy, ok)
+
+    def _page(self, url, referer=None):
+        response = self._request("GET", url, headers={"Referer": referer} if referer else None)
+        return response.url, _parse(response.text)
+
+    def login(self, user_id, password):
+        """
+        Submit the init.do login form and return the frameset.
+
+        Raises CatalogLoginError when the form comes back (credentials
+        rejected) and CatalogParseError for any other page.
+        """
+        with get_scheduler().login_slot(TMO_HOST):
+            page_url, doc = self._page(self.login_url)
+            action, fields = login_form(doc, page_url)
+
+            userid = doc.xpath('//input[@id="userid"]')[0].get("name") or "userid"
+            password_field = doc.xpath('//input[@id="password"]')
+            fields[userid] = user_id
+            fields[password_field[0].get("name") if password_field else "password"] = password
+            agree = doc.xpath('//input[@name="AgreeTerms"]')
+            if agree:
+                fields["AgreeTerms"] = agree[0].get("value", "on")
+
+            response = self._request("POST", action, data=fields, headers={"Referer": page_url})
+
+        result = _parse(response.text)
+        if not result.xpath('//frameset[@id="isaTopFS"]'):
+            if result.xpath('//input[@id="userid"]'):
+                raise CatalogLoginError(f"login rejected for {user_id} (login form returned)")
+            raise CatalogParseError("login did not reach the frameset")
+        self._report_proxy(True)
+        self.home_url = response.url
+        logger.info("Login successful (HTTP)")
+        return result
+
+    def open_catalog(self, frameset_doc):
+        """(URL, document) of the default catalog section, via isaTop/header"""
+        top_url, top_doc = self._page(frame_url(frameset_doc, self.home_url, "isaTop"), self.home_url)
+        header_url, header_doc = self._page(frame_url(top_doc, top_url, "header"), top_url)
+        return self._page(catalog_view_url(header_doc, header_url), header_url)
+
+    def harvest(self, frameset_doc, sections=None):
+        """[(section, sku, qty)] across the catalog sections, same shape as harvest_catalog_sections()"""
+        sections = sections or CATALOG_SECTIONS
+        catalog_url, catalog_doc = self.open_catalog(frameset_doc)
+        logger.info("Opened catalog view (HTTP)")
+
+        harvested = {sections[0]["name"]: parse_catalog_items(catalog_doc, sections[0]["name"])}
+        for section in sections[1:]:
+            url = section_url(catalog_doc, catalog_url, section["nav_label"])
+            _, doc = self._page(url, catalog_url)
+            harvested[section["name"]] = parse_catalog_items(doc, section["name"])
+        return merge_sections(sections, harvested)
+
+    def close(self):
+        self.session.close()
+
+
+def harvest_allocations(user_id, password, proxy=None, login_url=TMO_LOGIN_URL):
+    """
+    Log in and harvest every catalog section over HTTP.
+
+    Returns the rows, or None when the pages could not be fetched or parsed
+    the way the browser path would, so the caller can use the browser.
+    CatalogLoginError is raised, not swallowed: the browser must not retry
+    credentials the site has just rejected.
+    """
+    client = CatalogClient(login_url=login_url, proxy=proxy)
+    try:
+        frameset = client.login(user_id, password)
+        return client.harvest(frameset)
+    except CatalogLoginError:
+        raise
+    except CatalogParseError as e:
+        logger.warning(f"HTTP catalog client gave up for {user_id}: {e}")
+    except Exception as e:
+        logger.warning(f"HTTP catalog request failed for {user_id}: {e}")
+    finally:
+        client.close()
+    return None
@@ -0,0 +1,841 @@
+"""
+Chrome DevTools Protocol driver backend (DRIVER_BACKEND=cdp).
+
+Selenium sends every command as an HTTP request to chromedriver, which
+forwards it to Chrome over CDP, and each call blocks its thread. This
+backend launches Chrome itself and talks CDP to it over one websocket per
+browser. All browsers share a single asyncio event loop running in a
+background thread:
+
+    CDPConnection   the websocket: request ids, responses, event dispatch
+    CDPBrowser      one Chrome process; targets, downloads
+    CDPPage         one tab: navigation, frames, queries, script, input
+
+CDPDriver wraps these in the blocking WebDriver methods the scraper calls
+(get, find_element(s), switch_to.frame/window, execute_script,
+execute_cdp_cmd, ...). do_login(), the catalog loops and download_report()
+then run on it unchanged. Misses raise Selenium's own exceptions, so the
+existing except clauses still apply. Async code can drive CDPBrowser and
+CDPPage directly on event_loop() to run many sessions at once.
+
+Needs the websockets package (pip install websockets) and a Chrome or
+Chromium binary: CHROME_BINARY, or the first one found on PATH.
+"""
+
+import os
+import json
+import time
+import base64
+import shutil
+import asyncio
+import logging
+import tempfile
+import itertools
+import threading
+import subprocess
+import concurrent.futures
+from collections import deque
+
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import (
+    WebDriverException, TimeoutException, NoSuchElementException, NoSuchFrameException,
+    NoSuchWindowException, StaleElementReferenceException, ElementNotInteractableException,
+)
+
+logger = logging.getLogger(__name__)
+
+CHROME_NAMES = ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome")
+
+LAUNCH_TIMEOUT = 30
+COMMAND_TIMEOUT = 60
+FRAME_TIMEOUT = 5
+POLL_INTERVAL = 0.25
+
+# Selenium Keys characters sent as key presses rather than text
+SPECIAL_KEYS = {
+    "\ue003": ("Backspace", 8),
+    "\ue004": ("Tab", 9),
+    "\ue006": ("Enter", 13),
+    "\ue007": ("Enter", 13),
+    "\ue00c": ("Escape", 27),
+    "\ue017": ("Delete", 46),
+}
+
+CONSOLE_LEVELS = {"error": "SEVERE", "assert": "SEVERE", "warning": "WARNING", "debug": "DEBUG"}
+
+# Elements matching a WebDriver locator, below `this` when it is a node
+FIND_JS = """function(by, value) {
+    const root = (this && this.nodeType) ? this : document;
+    const doc = root.ownerDocument || root;
+    if (by === "xpath") {
+        const snapshot = doc.evaluate(value, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        const found = [];
+        for (let i = 0; i < snapshot.snapshotLength; i++) {
+            const node = snapshot.snapshotItem(i);
+            if (node.nodeType === 1) found.push(node);
+        }
+        return found;
+    }
+    if (by === "link text" || by === "partial link text") {
+        return Array.from(root.querySelectorAll("a")).filter(a => {
+            const text = a.innerText.trim();
+            return by === "link text" ? text === value : text.includes(value);
+        });
+    }
+    let css = value;
+    if (by === "id") css = "#" + CSS.escape(value);
+    else if (by === "name") css = '[name="' + value.replace(/"/g, '\\\\"') + '"]';
+    else if (by === "class name") css = "." + CSS.escape(value);
+    return Array.from(root.querySelectorAll(css));
+}"""
+
+# Child frame element by index, or by name / id like Selenium's switch_to.frame()
+FRAME_JS = """function(reference) {
+    const frames = Array.from(document.querySelectorAll("frame, iframe"));
+    if (typeof reference === "number") return frames[reference] || null;
+    return frames.find(f => f.name === reference) || frames.find(f => f.id === reference) || null;
+}"""
+
+ATTRIBUTE_JS = """function(name) {
+    if (name !== "class" && name !== "style") {
+        const value = this[name];
+        if (typeof value === "boolean") return value ? "true" : null;
+        if (value !== undefined && value !== null && typeof value !== "object" && typeof value !== "function")
+            return String(value);
+    }
+    return this.getAttribute(name);
+}"""
+
+DISPLAYED_JS = """function() {
+    const style = getComputedStyle(this);
+    if (style.display === "none" || style.visibility === "hidden") return false;
+    return this.getClientRects().length > 0;
+}"""
+
+CLEAR_JS = """function() {
+    this.focus();
+    if ("value" in this) this.value = "";
+    else this.textContent = "";
+    this.dispatchEvent(new Event("input", {bubbles: true}));
+    this.dispatchEvent(new Event("change", {bubbles: true}));
+}"""
+
+
+class CDPError(WebDriverException):
+    """Error reply to a CDP command"""
+
+
+def _websockets():
+    try:
+        import websockets
+    except ImportError as e:
+        raise WebDriverException("DRIVER_BACKEND=cdp needs the websockets package (pip install websockets)") from e
+    return websockets
+
+
+# ── Event loop ───────────────────────────────────────────────────────────────
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def event_loop():
+    """The asyncio loop all CDP sessions run on (started on first use)"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="cdp-loop", daemon=True).start()
+        return _loop
+
+
+def run(coro, timeout=None):
+    """Run a coroutine on the shared loop and block for its result"""
+    future = asyncio.run_coroutine_threadsafe(coro, event_loop())
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise TimeoutException(f"CDP call timed out after {timeout}s")
+
+
+# ── Protocol ─────────────────────────────────────────────────────────────────
+
+class CDPConnection:
+    """One websocket to a browser; flattened target sessions share it"""
+
+    def __init__(self, ws):
+        self._ws = ws
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._handlers = {}     # session id (None = browser) -> handler(method, params)
+        self.closed = False
+        self._reader = asyncio.get_running_loop().create_task(self._read())
+
+    @classmethod
+    async def connect(cls, url):
+        ws = await _websockets().connect(url, max_size=None, ping_interval=None)
+        return cls(ws)
+
+    def subscribe(self, session_id, handler):
+        self._handlers[session_id] = handler
+
+    def unsubscribe(self, session_id):
+        self._handlers.pop(session_id, None)
+
+    async def send(self, method, params=None, session_id=None, timeout=COMMAND_TIMEOUT):
+        if self.closed:
+            raise CDPError(f"{method}: browser disconnected")
+        msg_id = next(self._ids)
+        message = {"id": msg_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[msg_id] = future
+        try:
+            await self._ws.send(json.dumps(message))
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutException(f"{method}: no CDP response after {timeout}s")
+        finally:
+            self._pending.pop(msg_id, None)
+
+    async def _read(self):
+        try:
+            async for raw in self._ws:
+                message = json.loads(raw)
+                if "id" in message:
+                    future = self._pending.get(message["id"])
+                    if future is None or future.done():
+                        continue
+                    if "error" in message:
+                        error = message["error"]
+                        future.set_exception(CDPError(f"{error.get('message')} ({error.get('code')})"))
+                    else:
+                        future.set_result(message.get("result", {}))
+                    continue
+                handler = self._handlers.get(message.get("sessionId"))
+                if handler is not None:
+                    try:
+                        handler(message.get("method"), message.get("params", {}))
+                    except Exception as e:
+                        logger.debug(f"CDP event handler failed for {message.get('method')}: {e}")
+        except Exception as e:
+            logger.debug(f"CDP connection closed: {e}")
+        finally:
+            self.closed = True
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(CDPError("browser disconnected"))
+
+    async def close(self):
+        try:
+            await self._ws.close()
+        finally:
+            self._reader.cancel()
+
+
+# ── Browser ──────────────────────────────────────────────────────────────────
+
+def chrome_binary():
+    """CHROME_BINARY, else the first Chrome/Chromium on PATH"""
+    binary = os.getenv("CHROME_BINARY")
+    if binary:
+        return binary
+    for name in CHROME_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    raise WebDriverException("No Chrome binary found; set CHROME_BINARY")
+
+
+def chrome_args(user_data_dir, headless=True, proxy=None):
+    args = [
+        "--remote-debugging-port=0",
+        f"--user-data-dir={user_data_dir}",
+        "--no-first-run",
+        "--no-default-browser-check",
+        "--no-sandbox",
+        "--disable-dev-shm-usage",
+        "--disable-gpu",
+        "--disable-blink-features=AutomationControlled",
+        # Keep the dealer site's frames in the page's renderer, so one
+        # session reaches them and element coordinates are page-relative
+        "--disable-features=IsolateOrigins,site-per-process",
+    ]
+    if headless:
+        args += ["--headless=new", "--window-size=1920,1080"]
+    else:
+        args.append("--start-maximized")
+    if proxy:
+        args.append(f"--proxy-server={proxy.server_arg}")
+    return args + ["about:blank"]
+
+
+class CDPBrowser:
+    """A Chrome process started with remote debugging, and its targets"""
+
+    def __init__(self, process, connection, user_data_dir, download_dir):
+        self.process = process
+        self.connection = connection
+        self.user_data_dir = user_data_dir
+        self.download_dir = download_dir
+        self.pages = {}             # target id -> attached CDPPage
+        self.downloads = {}         # guid -> {"file", "url", "state"}
+        self._download_done = {}
+        connection.subscribe(None, self._on_event)
+
+    @classmethod
+    async def launch(cls, download_dir, headless=True, proxy=None, binary=None):
+        user_data_dir = tempfile.mkdtemp(prefix="cdp-profile-")
+        process = subprocess.Popen(
+            [binary or chrome_binary()] + chrome_args(user_data_dir, headless, proxy),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            url = await cls._devtools_url(process, user_data_dir)
+            connection = await CDPConnection.connect(url)
+        except BaseException:
+            process.kill()
+            shutil.rmtree(user_data_dir, ignore_errors=True)
+            raise
+
+        browser = cls(process, connection, user_data_dir, download_dir)
+        await connection.send("Browser.setDownloadBehavior", {
+            "behavior": "allow", "downloadPath": download_dir, "eventsEnabled": True,
+        })
+        return browser
+
+    @staticmethod
+    async def _devtools_url(process, user_data_dir):
+        """Browser websocket URL, from the DevToolsActivePort file Chrome writes"""
+        port_file = os.path.join(user_data_dir, "DevToolsActivePort")
+        deadline = time.monotonic() + LAUNCH_TIMEOUT
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise WebDriverException(f"Chrome exited during startup (code {process.returncode})")
+            try:
+                with open(port_file, encoding="utf-8") as f:
+                    lines = f.read().split()
+                if len(lines) >= 2:
+                    return f"ws://127.0.0.1:{lines[0]}{lines[1]}"
+            except OSError:
+                pass
+            await asyncio.sleep(0.1)
+        raise WebDriverException(f"Chrome did not open a DevTools port within {LAUNCH_TIMEOUT}s")
+
+    def _on_event(self, method, params):
+        if method == "Browser.downloadWillBegin":
+            self.downloads[params["guid"]] = {
+                "file": params.get("suggestedFilename"), "url": params.get("url"), "state": "inProgress",
+            }
+            self._download_done[params["guid"]] = asyncio.get_running_loop().create_future()
+            logger.info(f"Download started: {params.get('suggestedFilename')}")
+        elif method == "Browser.downloadProgress" and params.get("state") != "inProgress":
+            entry = self.downloads.setdefault(params["guid"], {"file": None, "url": None})
+            entry["state"] = params["state"]
+            done = self._download_done.get(params["guid"])
+            if done is not None and not done.done():
+                done.set_result(params["state"])
+            logger.info(f"Download {params['state']}: {entry['file']}")
+        elif method == "Target.detachedFromTarget":
+            for page in self.pages.values():
+                if page.session_id == params.get("sessionId"):
+                    page.closed = True
+
+    async def page_targets(self):
+        """Target ids of the open tabs and windows"""
+        result = await self.connection.send("Target.getTargets")
+        return [t["targetId"] for t in result.get("targetInfos", []) if t.get("type") == "page"]
+
+    async def page(self, target_id):
+        """The CDPPage for a target, attaching to it on first use"""
+        page = self.pages.get(target_id)
+        if page is None or page.closed:
+            result = await self.connection.send("Target.attachToTarget", {"targetId": target_id, "flatten": True})
+            page = CDPPage(self, target_id, result["sessionId"])
+            self.pages[target_id] = page
+            await page.enable()
+        return page
+
+    async def new_page(self, url="about:blank", new_window=False):
+        result = await self.connection.send("Target.createTarget", {"url": url, "newWindow": new_window})
+        return await self.page(result["targetId"])
+
+    async def wait_for_downloads(self, timeout=60):
+        """Wait for every started download to finish; returns {file: state}"""
+        pending = [f for f in self._download_done.values() if not f.done()]
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+        return {d["file"]: d["state"] for d in self.downloads.values()}
+
+    async def close(self):
+        try:
+            if not self.connection.closed:
+                await self.connection.send("Browser.close", timeout=5)
+        except Exception:
+            pass
+        await self.connection.close()
+        # Waiting on the process and deleting the profile would block the shared loop
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.process.wait, 5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        await loop.run_in_executor(None, lambda: shutil.rmtree(self.user_data_dir, ignore_errors=True))
+
+
+# ── Page ─────────────────────────────────────────────────────────────────────
+
+class CDPPage:
+    """One attached tab. Frames are addressed by CDP frame id (None = main frame)"""
+
+    def __init__(self, browser, target_id, session_id):
+        self.browser = browser
+        self.target_id = target_id
+        self.session_id = session_id
+        self.main_frame = None
+        self.closed = False
+        self.contexts = {}          # frame id -> default execution context id
+        self.console = deque(maxlen=500)
+        self.network = deque(maxlen=1000)
+        self._load_waiters = []
+        browser.connection.subscribe(session_id, self._on_event)
+
+    async def send(self, method, params=None, timeout=COMMAND_TIMEOUT):
+        return await self.browser.connection.send(method, params, self.session_id, timeout)
+
+    async def enable(self):
+        for domain in ("Page", "Runtime", "Network", "Log"):
+            await self.send(f"{domain}.enable")
+        tree = await self.send("Page.getFrameTree")
+        self.main_frame = tree["frameTree"]["frame"]["id"]
+
+    def _on_event(self, method, params):
+        if method == "Runtime.executionContextCreated":
+            context = params["context"]
+            aux = context.get("auxData", {})
+            if aux.get("isDefault") and aux.get("frameId"):
+                self.contexts[aux["frameId"]] = context["id"]
+        elif method == "Runtime.executionContextDestroyed":
+            for frame_id, context_id in list(self.contexts.items()):
+                if context_id == params.get("executionContextId"):
+                    del self.contexts[frame_id]
+        elif method == "Runtime.executionContextsCleared":
+            self.contexts.clear()
+        elif method == "Page.loadEventFired":
+            for waiter in self._load_waiters:
+                if not waiter.done():
+                    waiter.set_result(True)
+            self._load_waiters.clear()
+        elif method == "Runtime.consoleAPICalled":
+            text = " ".join(str(a.get("value", a.get("description", ""))) for a in params.get("args", []))
+            self.console.append({
+                "timestamp": int(params.get("timestamp", time.time() * 1000)),
+                "level": CONSOLE_LEVELS.get(params.get("type"), "INFO"), "message": text,
+            })
+        elif method == "Log.entryAdded":
+            entry = params["entry"]
+            self.console.append({
+                "timestamp": int(entry.get("timestamp", time.time() * 1000)),
+                "level": CONSOLE_LEVELS.get(entry.get("level"), "INFO"),
+                "message": f"{entry.get('url', '')} {entry.get('text', '')}".strip(),
+            })
+        elif method in ("Network.responseReceived", "Network.loadingFailed"):
+            # Same shape as chromedriver's performance log
+            self.network.append({
+                "timestamp": int(time.time() * 1000),
+                "message": json.dumps({"message": {"method": method, "params": params}}),
+            })
+
+    async def context(self, frame_id=None, timeout=FRAME_TIMEOUT):
+        """Execution context of a frame, waiting briefly while it (re)loads"""
+        frame_id = frame_id or self.main_frame
+        deadline = time.monotonic() + timeout
+        while frame_id not in self.contexts:
+            if time.monotonic() > deadline:
+                raise NoSuchFrameException(f"No document in frame {frame_id}")
+            await asyncio.sleep(0.05)
+        return self.contexts[frame_id]
+
+    async def navigate(self, url, timeout=COMMAND_TIMEOUT):
+        """Load url in the main frame and wait for its load event"""
+        loaded = asyncio.get_running_loop().create_future()
+        self._load_waiters.append(loaded)
+        result = await self.send("Page.navigate", {"url": url}, timeout=timeout)
+        if result.get("errorText"):
+            raise WebDriverException(f"Navigation to {url} failed: {result['errorText']}")
+        if result.get("loaderId"):
+            try:
+                await asyncio.wait_for(loaded, timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutException(f"Timed out after {timeout}s loading {url}")
+
+    async def reload(self, timeout=COMMAND_TIMEOUT):
+        """Reload the main frame and wait for its load event"""
+        loaded = asyncio.get_running_loop().create_future()
+        self._load_waiters.append(loaded)
+        await self.send("Page.reload", timeout=timeout)
+        try:
+            await asyncio.wait_for(loaded, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutException(f"Timed out after {timeout}s reloading the page")
+
+    async def call(self, function, args=(), object_id=None, frame_id=None, by_value=True):
+        """
+        Runtime.callFunctionOn with `this` bound to object_id (or in a frame's
+        context). Arguments are plain values or {"objectId": ...}; returns the
+        result RemoteObject.
+        """
+        params = {
+            "functionDeclaration": function,
+            "arguments": [a if isinstance(a, dict) else {"value": a} for a in args],
+            "returnByValue": by_value,
+            "awaitPromise": True,
+        }
+        if object_id:
+            params["objectId"] = object_id
+        else:
+            params["executionContextId"] = await self.context(frame_id)
+        try:
+            result = await self.send("Runtime.callFunctionOn", params)
+        except CDPError as e:
+            if "Could not find object" in str(e) or "Cannot find context" in str(e):
+                raise StaleElementReferenceException(str(e)) from e
+            raise
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            description = details.get("exception", {}).get("description") or details.get("text")
+            raise WebDriverException(f"javascript error: {description}")
+        return result["result"]
+
+    async def evaluate(self, function, args=(), object_id=None, frame_id=None):
+        """JSON value of call()"""
+        return (await self.call(function, args, object_id, frame_id)).get("value")
+
+    async def array_items(self, remote):
+        """RemoteObjects of an array RemoteObject's elements, in order"""
+        result = await self.send("Runtime.getProperties", {"objectId": remote["objectId"], "ownProperties": True})
+        items = sorted(
+            (int(p["name"]), p["value"]) for p in result.get("result", [])
+            if p["name"].isdigit() and "value" in p
+        )
+        await self.send("Runtime.releaseObject", {"objectId": remote["objectId"]})
+        return [value for _, value in items]
+
+    async def query(self, by, value, object_id=None, frame_id=None):
+        """Object ids of the elements matching a locator"""
+        found = await self.call(FIND_JS, (by, value), object_id, frame_id, by_value=False)
+        return [item["objectId"] for item in await self.array_items(found)]
+
+    async def child_frame(self, reference, frame_id=None):
+        """Frame id of a child frame by index, name/id or element object id"""
+        if isinstance(reference, dict):
+            object_id = reference["objectId"]
+        else:
+            element = await self.call(FRAME_JS, (reference,), frame_id=frame_id, by_value=False)
+            object_id = element.get("objectId")
+        if object_id:
+            node = await self.send("DOM.describeNode", {"objectId": object_id})
+            if node["node"].get("frameId"):
+                return node["node"]["frameId"]
+        raise NoSuchFrameException(f"No frame {reference!r}")
+
+    async def click(self, object_id):
+        """Scroll the element into view and click the middle of its first box"""
+        try:
+            await self.send("DOM.scrollIntoViewIfNeeded", {"objectId": object_id})
+            quads = (await self.send("DOM.getContentQuads", {"objectId": object_id})).get("quads")
+        except CDPError as e:
+            if "Could not find object" in str(e):
+                raise StaleElementReferenceException(str(e)) from e
+            raise ElementNotInteractableException(str(e)) from e
+        if not quads:
+            raise ElementNotInteractableException("element has no size and location")
+        quad = quads[0]
+        x, y = sum(quad[0::2]) / 4, sum(quad[1::2]) / 4
+        await self.send("Input.dispatchMouseEvent", {"type": "mouseMoved", "x": x, "y": y})
+        for event in ("mousePressed", "mouseReleased"):
+            await self.send("Input.dispatchMouseEvent", {
+                "type": event, "x": x, "y": y, "button": "left", "clickCount": 1,
+            })
+
+    async def type_text(self, object_id, text):
+        """Focus the element and type text; Selenium Keys characters become key presses"""
+        await self.call("function() { this.focus(); }", object_id=object_id)
+        chunk = ""
+        for char in text:
+            if char not in SPECIAL_KEYS:
+                chunk += char
+                continue
+            if chunk:
+                await self.send("Input.insertText", {"text": chunk})
+                chunk = ""
+            key, code = SPECIAL_KEYS[char]
+            extra = {"text": "\r"} if key == "Enter" else {}
+            await self.send("Input.dispatchKeyEvent", {"type": "keyDown", "key": key, "windowsVirtualKeyCode": code, **extra})
+            await self.send("Input.dispatchKeyEvent", {"type": "keyUp", "key": key, "windowsVirtualKeyCode": code})
+        if chunk:
+            await self.send("Input.insertText", {"text": chunk})
+
+    async def screenshot(self):
+        return base64.b64decode((await self.send("Page.captureScreenshot", {"format": "png"}))["data"])
+
+    async def close(self):
+        self.browser.connection.unsubscribe(self.session_id)
+        self.closed = True
+        await self.browser.connection.send("Target.closeTarget", {"targetId": self.target_id})
+
+
+# ── Blocking WebDriver facade ────────────────────────────────────────────────
+
+class CDPElement:
+    """A DOM element held as a CDP object id"""
+
+    def __init__(self, driver, page, object_id):
+        self._driver = driver
+        self._page = page
+        self.object_id = object_id
+
+    def _call(self, function, *args):
+        return self._driver._run(self._page.evaluate(function, args, object_id=self.object_id))
+
+    def find_element(self, by=By.ID, value=None):
+        found = self.find_elements(by, value)
+        if not found:
+            raise NoSuchElementException(f"No element for {by}={value}")
+        return found[0]
+
+    def find_elements(self, by=By.ID, value=None):
+        return self._driver._find(by, value, self._page, object_id=self.object_id)
+
+    def get_attribute(self, name):
+        return self._call(ATTRIBUTE_JS, name)
+
+    def get_dom_attribute(self, name):
+        return self._call("function(name) { return this.getAttribute(name); }", name)
+
+    def get_property(self, name):
+        return self._call("function(name) { return this[name]; }", name)
+
+    @property
+    def text(self):
+        return (self._call("function() { return this.innerText; }") or "").strip()
+
+    @property
+    def tag_name(self):
+        return self._call("function() { return this.tagName.toLowerCase(); }")
+
+    def is_displayed(self):
+        return bool(self._call(DISPLAYED_JS))
+
+    def is_enabled(self):
+        return not self._call("function() { return !!this.disabled; }")
+
+    def is_selected(self):
+        return bool(self._call("function() { return !!(this.checked || this.selected); }"))
+
+    def click(self):
+        self._driver._run(self._page.click(self.object_id))
+
+    def send_keys(self, *values):
+        self._driver._run(self._page.type_text(self.object_id, "".join(str(v) for v in values)))
+
+    def clear(self):
+        self._call(CLEAR_JS)
+
+    def submit(self):
+        self._call("function() { (this.form || this).submit(); }")
+
+
+class _CDPSwitchTo:
+    def __init__(self, driver):
+        self._driver = driver
+
+    def frame(self, reference):
+        driver = self._driver
+        if isinstance(reference, CDPElement):
+            reference = {"objectId": reference.object_id}
+        frame_id = driver._run(driver._page.child_frame(reference, driver._frame))
+        driver._frames.append(frame_id)
+
+    def default_content(self):
+        self._driver._frames = []
+
+    def parent_frame(self):
+        self._driver._frames = self._driver._frames[:-1]
+
+    def window(self, handle):
+        driver = self._driver
+        if handle not in driver.window_handles:
+            raise NoSuchWindowException(f"No window {handle}")
+        driver._page = driver._run(driver.browser.page(handle))
+        driver._frames = []
+
+    def new_window(self, type_hint=None):
+        driver = self._driver
+        driver._page = driver._run(driver.browser.new_page(new_window=type_hint == "window"))
+        driver._frames = []
+
+
+class CDPDriver:
+    """WebDriver-style blocking interface over a CDPBrowser"""
+
+    def __init__(self, browser, page):
+        self.browser = browser
+        self.browser_pid = browser.process.pid
+        self.download_dir = browser.download_dir
+        self._page = page
+        self._frames = []
+        self._implicit_wait = 0
+        self._page_load_timeout = COMMAND_TIMEOUT
+
+    @property
+    def _frame(self):
+        return self._frames[-1] if self._frames else None
+
+    def _run(self, coro, timeout=None):
+        return run(coro, timeout or max(COMMAND_TIMEOUT, self._page_load_timeout) + 5)
+
+    def _find(self, by, value, page, object_id=None, frame_id=None):
+        """Matching elements, polling for up to the implicit wait like chromedriver"""
+        deadline = time.monotonic() + self._implicit_wait
+        while True:
+            found = self._run(page.query(by, value, object_id, frame_id))
+            if found or time.monotonic() >= deadline:
+                return [CDPElement(self, page, oid) for oid in found]
+            time.sleep(POLL_INTERVAL)
+
+    def _unwrap(self, remote):
+        """Python value for a RemoteObject; nodes become CDPElements"""
+        if "objectId" not in remote:
+            return remote.get("value")
+        if remote.get("subtype") == "node":
+            return CDPElement(self, self._page, remote["objectId"])
+        if remote.get("subtype") == "array":
+            return [self._unwrap(item) for item in self._run(self._page.array_items(remote))]
+        return self._run(self._page.evaluate("function() { return this; }", object_id=remote["objectId"]))
+
+    # Navigation and page state
+
+    def get(self, url):
+        self._frames = []
+        self._run(self._page.navigate(url, self._page_load_timeout))
+
+    def refresh(self):
+        self._frames = []
+        self._run(self._page.reload(self._page_load_timeout))
+
+    @property
+    def current_url(self):
+        return self._run(self._page.evaluate("function() { return location.href; }"))
+
+    @property
+    def title(self):
+        return self._run(self._page.evaluate("function() { return document.title; }"))
+
+    @property
+    def page_source(self):
+        return self._run(self._page.evaluate(
+            "function() { return document.documentElement.outerHTML; }", frame_id=self._frame))
+
+    # Elements
+
+    def find_element(self, by=By.ID, value=None):
+        found = self.find_elements(by, value)
+        if not found:
+            raise NoSuchElementException(f"No element for {by}={value}")
+        return found[0]
+
+    def find_elements(self, by=By.ID, value=None):
+        return self._find(by, value, self._page, frame_id=self._frame)
+
+    # Windows and frames
+
+    @property
+    def switch_to(self):
+        return _CDPSwitchTo(self)
+
+    @property
+    def window_handles(self):
+        return self._run(self.browser.page_targets())
+
+    @property
+    def current_window_handle(self):
+        return self._page.target_id
+
+    def close(self):
+        self._run(self._page.close())
+        self._frames = []
+
+    # Scripts and CDP
+
+    def execute_script(self, script, *args):
+        arguments = [{"objectId": a.object_id} if isinstance(a, CDPElement) else a for a in args]
+        remote = self._run(self._page.call(f"function() {{ {script}\n}}", arguments,
+                                           frame_id=self._frame, by_value=False))
+        return self._unwrap(remote)
+
+    def execute_cdp_cmd(self, cmd, params=None):
+        """Browser.* and Target.* go to the browser, everything else to the current tab"""
+        if cmd.split(".")[0] in ("Browser", "Target", "SystemInfo"):
+            return self._run(self.browser.connection.send(cmd, params))
+        return self._run(self._page.send(cmd, params))
+
+    # Downloads
+
+    @property
+    def downloads(self):
+        """{guid: {"file", "url", "state"}} for downloads started in this browser"""
+        return dict(self.browser.downloads)
+
+    def wait_for_downloads(self, timeout=60):
+        return self._run(self.browser.wait_for_downloads(timeout), timeout + 5)
+
+    # Diagnostics
+
+    def get_log(self, log_type):
+        buffer = self._page.console if log_type == "browser" else self._page.network if log_type == "performance" else None
+        if buffer is None:
+            return []
+        entries = list(buffer)
+        buffer.clear()
+        return entries
+
+    def save_screenshot(self, path):
+        with open(path, "wb") as f:
+            f.write(self._run(self._page.screenshot()))
+        return True
+
+    # Settings and lifecycle
+
+    def implicitly_wait(self, seconds):
+        self._implicit_wait = seconds
+
+    def set_page_load_timeout(self, seconds):
+        self._page_load_timeout = seconds
+
+    def maximize_window(self):
+        pass
+
+    def quit(self):
+        try:
+            self._run(self.browser.close(), 15)
+        except Exception as e:
+            logger.debug(f"CDP browser close failed: {e}")
+            if self.browser.process.poll() is None:
+                self.browser.process.kill()
+
+
+def launch(download_dir, headless=True, proxy=None):
+    """Start Chrome and return a CDPDriver on its first tab"""
+
+    async def start():
+        browser = await CDPBrowser.launch(download_dir, headless=headless, proxy=proxy)
+        targets = await browser.page_targets()
+        page = await (browser.page(targets[0]) if targets else browser.new_page())
+        return browser, page
+
+    browser, page = run(start(), LAUNCH_TIMEOUT + COMMAND_TIMEOUT)
+    logger.info(f"CDP browser started (pid {browser.process.pid})")
+    return CDPDriver(browser, page)
@@ -0,0 +1,182 @@
+"""
+Command line entry point.
+
+    python cli.py scrape [--profile]                      full run (what CI does)
+    python cli.py build-report EXPORT --account IOTBAWA   workbook from a saved export
+    python cli.py email FILE... [--to ADDR]               send existing reports
+    python cli.py probe [--probe N] [--every S]           RT POS latency probe
+    python cli.py bench EXPORT [-n 5]                     time the offline stages
+    python cli.py daemon                                  resident scheduler
+
+Nothing heavy is imported here: each subcommand imports what it needs
+(pandas, Selenium, ...) when it runs, so `--help` and the offline stages
+start quickly. `python scraper.py` still works and maps to `scrape`.
+"""
+
+import os
+import sys
+import argparse
+import logging
+
+logger = logging.getLogger("scraper")
+
+
+def _load_env():
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+
+def _prepare(args):
+    """Shared setup for the stages that log to scraper.log"""
+    import warnings
+    import scraper
+
+    warnings.filterwarnings("ignore")
+    _load_env()
+    scraper.setup_logging()
+    if getattr(args, "profile", None):
+        import profiling
+        profiling.enable(args.profile, args.profile_dir)
+    return scraper
+
+
+def cmd_scrape(args):
+    scraper = _prepare(args)
+    logger.info("Scraper starting")
+
+    # NOTE: Do NOT redirect stderr - GitHub Actions needs it for error visibility
+    try:
+        scraper.main()
+    except KeyboardInterrupt:
+        print("\nScript interrupted by user")
+    except Exception as e:
+        import traceback
+        logger.error(f"Fatal error: {e}")
+        logger.error(traceback.format_exc())
+    return 0
+
+
+def cmd_build_report(args):
+    scraper = _prepare(args)
+    try:
+        outputs = scraper.replay_offline(args.export, args.account.upper(), build_email=args.build_email,
+                                         output_file=args.output, formats=args.formats)
+    except Exception as e:
+        logger.error(f"Could not build report from {args.export}: {e}")
+        return 1
+    if not outputs:
+        return 1
+    print("\n".join(outputs))
+    return 0
+
+
+def cmd_email(args):
+    scraper = _prepare(args)
+    recipient = args.to or os.getenv("RECIPIENT_EMAIL")
+    sent = scraper.send_email_with_attachments(args.subject, args.body, args.files, recipient)
+    return 0 if sent else 1
+
+
+def cmd_probe(args):
+    _load_env()
+    import test_rtpos
+
+    argv = []
+    if args.probe is not None:
+        argv += ["--probe", str(args.probe), "--every", str(args.every)]
+    return test_rtpos.main(argv)
+
+
+def cmd_bench(args):
+    import time
+    import statistics
+    import profiling
+
+    args.profile = None
+    scraper = _prepare(args)
+    profiling.enable("time")
+
+    totals = []
+    for i in range(args.runs):
+        start = time.perf_counter()
+        if not scraper.replay_offline(args.export, args.account.upper(), build_email=True):
+            logger.error(f"Bench run {i + 1} failed")
+            return 1
+        totals.append(time.perf_counter() - start)
+
+    per_stage = {}
+    for stage, seconds in profiling.timings():
+        per_stage.setdefault(stage, []).append(seconds)
+
+    print(f"{'stage':<16}{'median':>10}{'min':>10}{'max':>10}")
+    for stage, values in per_stage.items():
+        print(f"{stage:<16}{statistics.median(values):>9.3f}s{min(values):>9.3f}s{max(values):>9.3f}s")
+    print(f"{'total':<16}{statistics.median(totals):>9.3f}s{min(totals):>9.3f}s{max(totals):>9.3f}s")
+    return 0
+
+
+def cmd_daemon(args):
+    _load_env()
+    import daemon
+
+    daemon.serve()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="T-Mobile allocation / RT POS reorder scraper")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_profile(p):
+        p.add_argument("--profile", nargs="?", const="both", choices=["cprofile", "sample", "both"],
+                       help="profile each stage (default mode: both)")
+        p.add_argument("--profile-dir", help="where to write profiles (default download_files/profiles/<ts>)")
+
+    p = sub.add_parser("scrape", help="full run: catalog, RT POS export, report, email")
+    add_profile(p)
+    p.set_defaults(func=cmd_scrape)
+
+    p = sub.add_parser("build-report", help="build the IDOO workbook from a saved RT POS export")
+    p.add_argument("export", help="saved 'ReOrder Custom Report.xlsx'")
+    p.add_argument("--account", default="IOTPHILLY", help="account label (SKUs come from its last run)")
+    p.add_argument("--output", help="workbook file name (default IDOO-<account>-replay.xlsx)")
+    p.add_argument("--formats", help="comma-separated xlsx,csv,parquet,jsonl (default OUTPUT_FORMATS or xlsx)")
+    p.add_argument("--build-email", action="store_true", help="also build (not send) the email")
+    add_profile(p)
+    p.set_defaults(func=cmd_build_report)
+
+    p = sub.add_parser("email", help="email existing report files")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--to", help="recipient (default RECIPIENT_EMAIL)")
+    p.add_argument("--subject", default="IDOO Inventory Reports")
+    p.add_argument("--body", default="Please find the attached inventory reports.")
+    p.set_defaults(func=cmd_email)
+
+    p = sub.add_parser("probe", help="RT POS export test / latency probe (test_rtpos.py)")
+    p.add_argument("--probe", type=int, metavar="N",
+                   help="repeat the flow N times (0 = until stopped) and report latency percentiles")
+    p.add_argument("--every", type=float, default=0, help="with --probe, start a run every this many seconds")
+    p.set_defaults(func=cmd_probe)
+
+    p = sub.add_parser("bench", help="time the offline stages on a saved export")
+    p.add_argument("export")
+    p.add_argument("--account", default="IOTPHILLY")
+    p.add_argument("-n", "--runs", type=int, default=5)
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser("daemon", help="resident scheduler with HTTP trigger (daemon.py)")
+    p.set_defaults(func=cmd_daemon)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,409 @@
+"""
+Resident scheduler daemon.
+
+Keeps one Python process alive instead of a cold CI job per run: imports,
+the proxy pool, politeness/circuit-breaker state and the history store stay
+loaded, and the browser for the next phase is launched while the current
+phase runs, so phases don't wait for Chrome to boot.
+
+Runs are started by
+- a cron schedule, evaluated in UTC like GitHub Actions
+  (DAEMON_SCHEDULE, default "0 14 * * 1,3,5"; separate several with ";")
+- POST /run on the local HTTP endpoint (DAEMON_HOST:DAEMON_PORT,
+  default 127.0.0.1:8765). Requests need "Authorization: Bearer <token>"
+  with DAEMON_TOKEN, or the token generated into .daemon_token when it is
+  unset. Browsers may only call it from DAEMON_ALLOWED_ORIGIN (the
+  dashboard's origin); other origins get 403.
+
+Only one run happens at a time: a trigger that arrives while a run is in
+flight is merged into it and gets that run's id back. GET /status shows
+the current and last run and the next scheduled time.
+
+    python daemon.py
+    curl -X POST -H "Authorization: Bearer $(cat .daemon_token)" http://127.0.0.1:8765/run
+"""
+
+import os
+import hmac
+import json
+import time
+import logging
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCHEDULE = "0 14 * * 1,3,5"
+TOKEN_FILE = ".daemon_token"
+
+
+# ── Cron ─────────────────────────────────────────────────────────────────────
+
+class CronSchedule:
+    """Five-field cron expression (minute hour day-of-month month day-of-week)"""
+
+    RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.RANGES)
+        )
+        # Like cron: when both day fields are restricted, either may match
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field, low, high):
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step = part.split("/", 1)
+                step = int(step)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(v) for v in part.split("-", 1))
+            else:
+                start = end = int(part)
+            values.update(range(start, end + 1, step))
+        if high == 6 and 7 in values:   # 7 is Sunday too
+            values.add(0)
+        return values
+
+    def _day_matches(self, moment):
+        weekday = (moment.weekday() + 1) % 7    # cron: Sunday = 0
+        day_ok = moment.day in self.days
+        weekday_ok = weekday in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment):
+        """First matching minute strictly after moment"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366)
+        while candidate < limit:
+            if candidate.month not in self.months or not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+                continue
+            if candidate.minute in self.minutes:
+                return candidate
+            candidate += timedelta(minutes=1)
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+
+def load_schedules():
+    value = os.getenv("DAEMON_SCHEDULE", DEFAULT_SCHEDULE)
+    return [CronSchedule(expr.strip()) for expr in value.split(";") if expr.strip()]
+
+
+# ── Warm browsers ────────────────────────────────────────────────────────────
+
+class BrowserPool:
+    """
+    Keeps the browser for the next phase launched ahead of time.
+
+    prewarm() takes the run's sessions in the order their phases run and
+    starts the first browser. Each take() hands over the browser that is
+    already running (waiting for it if it is still starting), and the pool
+    then starts the next session's browser while that phase works. So at
+    most one browser sits idle, and launches never overlap (one worker).
+
+    A take() for a session later in the plan means the phases in between
+    were skipped (e.g. the catalog read over HTTP). The browser warmed for
+    them is quit, and the caller launches its own. Sessions outside the plan,
+    such as a relaunch after a recycle, are not served from the pool.
+    run_watched() quits a taken browser after the phase as usual. Whatever
+    is left is quit by drain().
+    """
+
+    def __init__(self, launch, start_timeout=180):
+        self.launch = launch
+        self.start_timeout = start_timeout
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warm-browser")
+        self._queue = []
+        self._next = None       # (key, future) of the browser launched for the next phase
+        self._lock = threading.Lock()
+
+    def prewarm(self, session_keys, use_proxy=True):
+        with self._lock:
+            self._queue.extend((key, use_proxy) for key in session_keys)
+            if self._next is None:
+                self._launch_next()
+        logger.info(f"Planned {len(session_keys)} warm browser(s): {', '.join(session_keys)}")
+
+    def _launch_next(self):
+        if self._queue:
+            key = self._queue.pop(0)
+            self._next = (key, self._executor.submit(self.launch, *key))
+
+    def _discard(self, future):
+        try:
+            future.result(timeout=self.start_timeout).quit()
+        except Exception:
+            pass
+
+    def take(self, session_key, use_proxy=True):
+        key = (session_key, use_proxy)
+        future = None
+        with self._lock:
+            if self._next is not None and self._next[0] == key:
+                future = self._next[1]
+                self._next = None
+            elif key in self._queue:
+                if self._next is not None:
+                    logger.info(f"Warm browser for {self._next[0][0]} not used, quitting it")
+                    self._executor.submit(self._discard, self._next[1])
+                    self._next = None
+                del self._queue[:self._queue.index(key) + 1]
+            else:
+                return None
+            self._launch_next()
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=self.start_timeout)
+        except Exception as e:
+            logger.warning(f"Warm browser for {session_key} failed to start: {e}")
+            return None
+
+    def drain(self):
+        with self._lock:
+            self._queue = []
+            pending, self._next = self._next, None
+        if pending is not None:
+            self._discard(pending[1])
+
+
+# ── Single-flight runs ───────────────────────────────────────────────────────
+
+class RunCoordinator:
+    """Runs the scrape at most once at a time; concurrent triggers join the run in flight"""
+
+    def __init__(self, run_fn):
+        self.run_fn = run_fn
+        self.current = None
+        self.last = None
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def trigger(self, source):
+        """Start a run (in the background) or join the one in flight; returns (run, merged)"""
+        with self._lock:
+            if self.current is not None:
+                self.current["triggers"].append(source)
+                logger.info(f"Trigger from {source} merged into run {self.current['id']}")
+                return dict(self.current), True
+            self._sequence += 1
+            run = {
+                "id": self._sequence,
+                "triggers": [source],
+                "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            }
+            self.current = run
+        threading.Thread(target=self._execute, args=(run,), name=f"run-{run['id']}", daemon=True).start()
+        return dict(run), False
+
+    def _execute(self, run):
+        logger.info(f"Run {run['id']} started ({', '.join(run['triggers'])})")
+        start = time.time()
+        try:
+            self.run_fn()
+            run["outcome"] = "ok"
+        except Exception as e:
+            logger.error(f"Run {run['id']} failed: {e}")
+            run["outcome"] = "error"
+            run["error"] = str(e)
+        run["duration"] = round(time.time() - start, 1)
+        run["finished_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self._lock:
+            self.current = None
+            self.last = run
+        logger.info(f"Run {run['id']} finished in {run['duration']}s ({run['outcome']})")
+
+    def wait_idle(self, poll=1.0):
+        while self.current is not None:
+            time.sleep(poll)
+
+
+# ── HTTP trigger ─────────────────────────────────────────────────────────────
+
+def load_token(path=TOKEN_FILE):
+    """DAEMON_TOKEN, or a random token kept in path (created owner-only on first start)"""
+    token = os.getenv("DAEMON_TOKEN")
+    if token:
+        return token
+    if os.path.exists(path):
+        with open(path) as f:
+            token = f.read().strip()
+    if not token:
+        token = secrets.token_urlsafe(32)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(token + "\n")
+        logger.info(f"DAEMON_TOKEN not set; generated one in {path}")
+    return token
+
+
+def make_handler(coordinator, next_run, token, allowed_origin=None):
+    """
+    Handler for /run, /status and /health.
+
+    Every request but /health needs "Authorization: Bearer <token>".
+    Browser requests (those with an Origin header) are refused unless the
+    origin is allowed_origin, which is also the only origin CORS allows.
+    """
+    if not token:
+        raise ValueError("The trigger endpoint needs a token")
+
+    class TriggerHandler(BaseHTTPRequestHandler):
+        def _cors(self):
+            origin = self.headers.get("Origin")
+            if origin and origin == allowed_origin:
+                self.send_header("Access-Control-Allow-Origin", origin)
+                self.send_header("Vary", "Origin")
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self._cors()
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _origin_allowed(self):
+            origin = self.headers.get("Origin")
+            return origin is None or origin == allowed_origin
+
+        def _authorized(self):
+            return hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {token}")
+
+        def _check(self):
+            """Send the refusal and return False unless the request may go on"""
+            if not self._origin_allowed():
+                self._send(403, {"success": False, "message": "origin not allowed"})
+                return False
+            if not self._authorized():
+                self._send(401, {"success": False, "message": "unauthorized"})
+                return False
+            return True
+
+        def do_OPTIONS(self):
+            if not self._origin_allowed():
+                return self._send(403, {"success": False, "message": "origin not allowed"})
+            self.send_response(204)
+            self._cors()
+            self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+            self.send_header("Access-Control-Allow-Headers", "Authorization, Content-Type")
+            self.end_headers()
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/run":
+                return self._send(404, {"success": False, "message": "not found"})
+            if not self._check():
+                return
+            run, merged = coordinator.trigger(f"http:{self.client_address[0]}")
+            self._send(202, {"success": True, "run_id": run["id"], "merged": merged,
+                             "message": "Joined the run in progress" if merged else "Run started"})
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/health":
+                return self._send(200, {"ok": True})
+            if self.path.rstrip("/") != "/status":
+                return self._send(404, {"success": False, "message": "not found"})
+            if not self._check():
+                return
+            upcoming = next_run()
+            self._send(200, {
+                "running": coordinator.current is not None,
+                "current": coordinator.current,
+                "last": coordinator.last,
+                "next_scheduled": upcoming.isoformat() if upcoming else None,
+            })
+
+        def log_message(self, format, *args):
+            logger.debug("HTTP " + format % args)
+
+    return TriggerHandler
+
+
+# ── Main loop ────────────────────────────────────────────────────────────────
+
+def serve():
+    from dotenv import load_dotenv
+    import scraper
+
+    load_dotenv()
+    scraper.setup_logging()
+    scraper.cleanup_chrome_processes()
+
+    pool = BrowserPool(lambda key, use_proxy: scraper.driverinitialize(use_proxy=use_proxy, session_key=key, warm=False))
+    scraper.set_warm_pool(pool)
+
+    def plan_accounts(accounts):
+        try:
+            with scraper.open_store() as store:
+                return scraper.plan_accounts(accounts, store)
+        except Exception as e:
+            logger.warning(f"History store unavailable for warm-up order: {e}")
+            return scraper.plan_accounts(accounts)
+
+    def run_once():
+        # Phase order: each account's catalog browser, then its RT POS
+        # browser, both proxied like process_account() launches them, with
+        # accounts in the order main() will process them
+        keys = []
+        if os.path.exists("cred.txt"):
+            for plan in plan_accounts(scraper.load_accounts("cred.txt")):
+                keys += [plan.account['user_id'], plan.account['report_user_id']]
+        pool.prewarm(keys, use_proxy=True)
+        try:
+            scraper.main()
+        finally:
+            pool.drain()
+
+    coordinator = RunCoordinator(run_once)
+    schedules = load_schedules()
+
+    def next_run():
+        now = datetime.now(timezone.utc)
+        return min((s.next_after(now) for s in schedules), default=None)
+
+    host = os.getenv("DAEMON_HOST", "127.0.0.1")
+    port = int(os.getenv("DAEMON_PORT", "8765"))
+    handler = make_handler(coordinator, next_run, load_token(), os.getenv("DAEMON_ALLOWED_ORIGIN"))
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="trigger-http", daemon=True).start()
+    logger.info(f"Daemon listening on http://{host}:{port} (POST /run, GET /status)")
+
+    try:
+        while True:
+            upcoming = next_run()
+            if upcoming is None:
+                time.sleep(3600)
+                continue
+            logger.info(f"Next scheduled run at {upcoming.isoformat()}")
+            while datetime.now(timezone.utc) < upcoming:
+                time.sleep(min(30, max(0.5, (upcoming - datetime.now(timezone.utc)).total_seconds())))
+            coordinator.trigger("schedule")
+    except KeyboardInterrupt:
+        logger.info("Daemon stopping")
+    finally:
+        server.shutdown()
+        coordinator.wait_idle()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,172 @@
+"""
+Run deadline, per-account / per-phase time budgets and account ordering.
+
+The whole run gets RUN_DEADLINE_SECONDS (default 50 minutes, under the
+workflow's 60 minute limit). Accounts are ordered by priority and then by
+how long they usually take, and each one gets a budget carved out of the
+remaining time so that critical accounts always have room to finish:
+
+    ACCOUNT_PRIORITIES="iotphilly=1,iotbawa=2"
+
+Priority 1 (the default) is critical and never skipped. Lower-priority
+accounts are skipped, or cut short, when the time left can't cover them.
+A critical account that overruns its budget keeps going: its phases and
+waits are never cut below CRITICAL_FLOOR_SECONDS (or the wait's own
+timeout, when that is shorter).
+
+Inside an account, each phase gets a share of the account time still left
+when it starts (Budget.phase): the catalog CATALOG_SHARE, the RT POS export
+RTPOS_SHARE, and the report whatever remains. The catalog and RT POS budgets
+cap their phase's retry policies (RetryPolicy.within) and waits (Budget.cap);
+the report has neither, so its budget is only checked once it is written.
+"""
+
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RUN_SECONDS = 50 * 60
+DEFAULT_ACCOUNT_SECONDS = 600       # expected account duration with no history
+EMAIL_RESERVE_SECONDS = 60          # kept back for sending the email
+CRITICAL_PRIORITY = 1
+CATALOG_SHARE = 0.35                # of the account budget, when the catalog starts
+RTPOS_SHARE = 0.85                  # of what's left after the catalog; the rest is for the report
+CRITICAL_FLOOR_SECONDS = 300        # a critical account's phases and waits never get less
+
+
+class Budget:
+    """A named slice of wall-clock time"""
+
+    def __init__(self, name, seconds, critical=False):
+        self.name = name
+        self.critical = critical
+        self.seconds = max(0.0, seconds)
+        self.start = time.time()
+        self.end = self.start + self.seconds
+
+    def elapsed(self):
+        return time.time() - self.start
+
+    def remaining(self):
+        return max(0.0, self.end - time.time())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def cap(self, timeout):
+        """
+        Shrink a timeout so it doesn't outlive this budget.
+
+        Critical budgets keep at least CRITICAL_FLOOR_SECONDS of it, even once expired.
+        """
+        remaining = int(self.remaining())
+        if self.critical:
+            remaining = max(remaining, CRITICAL_FLOOR_SECONDS)
+        return max(0, min(timeout, remaining))
+
+    def phase(self, name, share, floor=30):
+        """
+        Child budget for a phase: share of what's left, but at least floor seconds if available.
+
+        A critical budget's phases get at least CRITICAL_FLOOR_SECONDS, available or not.
+        """
+        remaining = self.remaining()
+        seconds = min(remaining, max(remaining * share, floor))
+        if self.critical:
+            seconds = max(seconds, CRITICAL_FLOOR_SECONDS)
+        return Budget(f"{self.name}/{name}", seconds, critical=self.critical)
+
+    def __repr__(self):
+        return f"Budget({self.name}: {self.remaining():.0f}s of {self.seconds:.0f}s left)"
+
+
+class AccountPlan:
+    """An account queued for this run, with its priority and expected duration"""
+
+    def __init__(self, account, priority, expected):
+        self.account = account
+        self.priority = priority
+        self.expected = expected
+
+    @property
+    def critical(self):
+        return self.priority <= CRITICAL_PRIORITY
+
+    @property
+    def user_id(self):
+        return self.account['user_id']
+
+
+def load_priorities():
+    """ACCOUNT_PRIORITIES="user=priority,..." -> {user: priority} (lower is more important)"""
+    priorities = {}
+    for part in os.getenv('ACCOUNT_PRIORITIES', '').split(','):
+        if '=' not in part:
+            continue
+        user, value = part.split('=', 1)
+        try:
+            priorities[user.strip().lower()] = int(value)
+        except ValueError:
+            logger.warning(f"Ignoring malformed ACCOUNT_PRIORITIES entry: {part}")
+    return priorities
+
+
+class RunDeadline(Budget):
+    """Deadline for the whole run; hands out account budgets in priority order"""
+
+    def __init__(self, seconds=None):
+        if seconds is None:
+            seconds = float(os.getenv('RUN_DEADLINE_SECONDS', DEFAULT_RUN_SECONDS))
+        super().__init__("run", seconds)
+
+    def plan(self, accounts, expected_duration=None):
+        """
+        Order accounts by priority, then by historical duration (shortest first).
+
+        expected_duration(user_id) returns seconds or None when there's no history.
+        """
+        priorities = load_priorities()
+        plans = []
+        for account in accounts:
+            user_id = account['user_id']
+            expected = expected_duration(user_id) if expected_duration else None
+            plans.append(AccountPlan(
+                account,
+                priorities.get(user_id.lower(), CRITICAL_PRIORITY),
+                expected or DEFAULT_ACCOUNT_SECONDS
+            ))
+        # sorted() is stable, so equal accounts keep the credentials file order
+        plans = sorted(plans, key=lambda p: (p.priority, p.expected))
+        logger.info("Account order: " + ", ".join(
+            f"{p.user_id} (priority {p.priority}, ~{p.expected:.0f}s)" for p in plans
+        ))
+        return plans
+
+    def account_budget(self, plan, pending):
+        """
+        Budget for one account, or None if it should be skipped.
+
+        Time expected by the critical accounts still queued after this one
+        (pending) is held back so they can always finish.
+        """
+        remaining = self.remaining() - EMAIL_RESERVE_SECONDS
+        reserved = sum(p.expected for p in pending if p.critical)
+        available = remaining - reserved
+
+        if plan.critical:
+            # Critical accounts get at least their usual duration while any time is left
+            seconds = max(available, min(remaining, plan.expected))
+            if seconds <= 0:
+                logger.error(f"Run deadline reached before critical account {plan.user_id}")
+                return None
+            return Budget(plan.user_id, seconds, critical=True)
+
+        if available < plan.expected * 0.5:
+            logger.warning(
+                f"Skipping {plan.user_id} (priority {plan.priority}): {max(available, 0):.0f}s "
+                f"available, usually needs ~{plan.expected:.0f}s"
+            )
+            return None
+        return Budget(plan.user_id, min(available, plan.expected * 2))
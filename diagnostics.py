@@ -0,0 +1,127 @@
+"""
+Failure-only diagnostics for browser sessions.
+
+Each driver carries a small in-memory ring buffer of recent DOM snapshots,
+browser console messages and network events. Nothing is written while a run
+goes well; when a phase fails, the buffer is dumped to disk together with a
+screenshot:
+
+    download_files/diagnostics/<session>-<phase>-<timestamp>/
+        events.jsonl      every buffered event, oldest first
+        dom_<n>.html      the buffered DOM snapshots
+        screenshot.png    the page at the moment of failure
+
+Console and network events come from chromedriver's "browser" and
+"performance" logs, enabled by logging_prefs() in driverinitialize().
+"""
+
+import os
+import json
+import time
+import logging
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+MAX_DOM_CHARS = 250_000
+NETWORK_METHODS = ("Network.responseReceived", "Network.loadingFailed")
+
+
+def logging_prefs():
+    """Chrome logging capability needed for console and network capture"""
+    return {"browser": "ALL", "performance": "INFO"}
+
+
+class SessionDiagnostics:
+    """Rolling buffer of recent page state for one browser session"""
+
+    def __init__(self, driver, session, max_snapshots=5, max_events=200):
+        self.driver = driver
+        self.session = session
+        self.snapshots = deque(maxlen=max_snapshots)
+        self.events = deque(maxlen=max_events)
+
+    def _drain_logs(self):
+        """Move chromedriver's buffered console/network logs into the ring buffer"""
+        try:
+            for entry in self.driver.get_log("browser"):
+                self.events.append({
+                    "ts": entry.get("timestamp"), "kind": "console",
+                    "level": entry.get("level"), "message": entry.get("message"),
+                })
+        except Exception:
+            pass
+
+        try:
+            for entry in self.driver.get_log("performance"):
+                message = json.loads(entry.get("message", "{}")).get("message", {})
+                method = message.get("method")
+                if method not in NETWORK_METHODS:
+                    continue
+                params = message.get("params", {})
+                response = params.get("response", {})
+                self.events.append({
+                    "ts": entry.get("timestamp"), "kind": "network", "method": method,
+                    "url": response.get("url"), "status": response.get("status"),
+                    "error": params.get("errorText"),
+                })
+        except Exception:
+            pass
+
+    def mark(self, step):
+        """Record the current page (URL, title, DOM) under a step name"""
+        self._drain_logs()
+        snapshot = {"ts": time.time(), "kind": "step", "step": step}
+        try:
+            snapshot["url"] = self.driver.current_url
+            snapshot["title"] = self.driver.title
+            dom = self.driver.page_source
+            self.snapshots.append((step, dom[:MAX_DOM_CHARS]))
+        except Exception as e:
+            snapshot["error"] = str(e)
+        self.events.append(snapshot)
+
+    def dump(self, phase, error=None):
+        """Write the buffer and a screenshot to disk; returns the directory"""
+        self._drain_logs()
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        out_dir = os.path.join(os.getcwd(), "download_files", "diagnostics", f"{self.session}-{phase}-{stamp}")
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+
+            with open(os.path.join(out_dir, "events.jsonl"), "w", encoding="utf-8") as f:
+                if error is not None:
+                    f.write(json.dumps({"ts": time.time(), "kind": "failure", "phase": phase, "error": str(error)}) + "\n")
+                for event in self.events:
+                    f.write(json.dumps(event, default=str) + "\n")
+
+            for index, (step, dom) in enumerate(self.snapshots):
+                safe_step = "".join(c if c.isalnum() else "_" for c in step)
+                with open(os.path.join(out_dir, f"dom_{index}_{safe_step}.html"), "w", encoding="utf-8") as f:
+                    f.write(dom)
+
+            try:
+                self.driver.save_screenshot(os.path.join(out_dir, "screenshot.png"))
+            except Exception:
+                pass
+
+            logger.info(f"Diagnostics for failed {phase} written to: {out_dir}")
+        except Exception as e:
+            logger.warning(f"Could not write diagnostics for {phase}: {e}")
+        return out_dir
+
+
+def mark(driver, step):
+    """Buffer a snapshot if the driver has diagnostics attached"""
+    diagnostics = getattr(driver, "diagnostics", None)
+    if diagnostics:
+        diagnostics.mark(step)
+
+
+def capture_failure(driver, phase, error=None):
+    """Dump the driver's diagnostics buffer for a failed phase"""
+    diagnostics = getattr(driver, "diagnostics", None)
+    if diagnostics:
+        return diagnostics.dump(phase, error)
+    return None
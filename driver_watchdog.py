@@ -0,0 +1,269 @@
+"""
+Driver health watchdog.
+
+A background thread per driver samples the RSS of chromedriver / Chrome
+(browser and renderer processes) and checks that the browser still answers
+a trivial CDP command. When a renderer or the whole browser grows past its
+memory limit, or the browser stops answering, the watchdog kills the process
+tree so the blocked WebDriver call fails fast. run_watched() then recreates
+the driver and hands the phase back to the retry logic.
+
+Thresholds (environment):
+    WATCHDOG_RENDERER_MB           per-renderer RSS limit (default 1500)
+    WATCHDOG_TOTAL_MB              total Chrome + chromedriver RSS limit (default 3000)
+    WATCHDOG_UNRESPONSIVE_SECONDS  how long CDP may stay silent (default 120)
+    WATCHDOG_INTERVAL              seconds between samples (default 10)
+
+The CDP ping shares the chromedriver session, which runs one command at a
+time, so it can't answer while a driver.get() is still loading. Silence is
+therefore tolerated for at least the driver's page-load timeout (plus
+PAGE_LOAD_GRACE_SECONDS): a slow but legitimate load fails with the
+driver's own TimeoutException instead of being killed.
+
+psutil is used when installed; otherwise /proc is read directly (Linux).
+"""
+
+import os
+import time
+import signal
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+DEFAULT_PAGE_LOAD_SECONDS = 300    # WebDriver's default page-load timeout
+PAGE_LOAD_GRACE_SECONDS = 30
+
+
+class DriverRecycled(Exception):
+    """The watchdog killed the driver; the phase should be retried with a fresh one"""
+
+
+# ── Process sampling ─────────────────────────────────────────────────────────
+
+def _proc_children():
+    """{ppid: [pid, ...]} for every process, read from /proc"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+            # comm may contain spaces; fields after the closing paren are fixed
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def _proc_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _proc_cmdline(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read().replace(b"\0", b" ").decode(errors="ignore")
+    except OSError:
+        return ""
+
+
+def process_tree(root_pids):
+    """All pids under (and including) root_pids"""
+    root_pids = [p for p in root_pids if p]
+    if psutil:
+        pids = set()
+        for pid in root_pids:
+            try:
+                proc = psutil.Process(pid)
+                pids.add(pid)
+                pids.update(child.pid for child in proc.children(recursive=True))
+            except psutil.Error:
+                continue
+        return pids
+
+    if not os.path.isdir("/proc"):
+        return set()
+    children = _proc_children()
+    pids, stack = set(), list(root_pids)
+    while stack:
+        pid = stack.pop()
+        if pid in pids:
+            continue
+        pids.add(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+
+def sample_memory(pids):
+    """Return (total_mb, largest_renderer_mb) for a set of pids"""
+    total, renderer = 0.0, 0.0
+    for pid in pids:
+        if psutil:
+            try:
+                proc = psutil.Process(pid)
+                rss = proc.memory_info().rss / (1024 * 1024)
+                cmdline = " ".join(proc.cmdline())
+            except psutil.Error:
+                continue
+        else:
+            rss, cmdline = _proc_rss_mb(pid), _proc_cmdline(pid)
+        total += rss
+        if "--type=renderer" in cmdline:
+            renderer = max(renderer, rss)
+    return total, renderer
+
+
+def driver_root_pids(driver):
+    """chromedriver pid plus the browser pid undetected_chromedriver starts itself"""
+    pids = []
+    service = getattr(driver, "service", None)
+    process = getattr(service, "process", None)
+    if process is not None:
+        pids.append(process.pid)
+    browser_pid = getattr(driver, "browser_pid", None)
+    if browser_pid:
+        pids.append(browser_pid)
+    return pids
+
+
+# ── Watchdog ─────────────────────────────────────────────────────────────────
+
+class DriverWatchdog(threading.Thread):
+    """Samples one driver's memory and responsiveness; kills it when unhealthy"""
+
+    def __init__(self, driver, label, interval=None, renderer_limit_mb=None,
+                 total_limit_mb=None, unresponsive_seconds=None):
+        super().__init__(name=f"watchdog-{label}", daemon=True)
+        self.driver = driver
+        self.label = label
+        self.interval = interval or float(os.getenv("WATCHDOG_INTERVAL", "10"))
+        self.renderer_limit_mb = renderer_limit_mb or float(os.getenv("WATCHDOG_RENDERER_MB", "1500"))
+        self.total_limit_mb = total_limit_mb or float(os.getenv("WATCHDOG_TOTAL_MB", "3000"))
+        self.unresponsive_seconds = unresponsive_seconds or float(os.getenv("WATCHDOG_UNRESPONSIVE_SECONDS", "120"))
+        self.page_load_seconds = self._page_load_timeout() or DEFAULT_PAGE_LOAD_SECONDS
+        self.root_pids = driver_root_pids(driver)
+        self.tripped = None
+        self.peak_total_mb = 0.0
+        self._last_response = time.time()
+        self._probe = None
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+        if self.peak_total_mb:
+            logger.info(f"[{self.label}] peak browser memory {self.peak_total_mb:.0f} MB")
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                reason = self._check()
+            except Exception as e:
+                logger.debug(f"[{self.label}] watchdog sample failed: {e}")
+                continue
+            if reason:
+                self._trip(reason)
+                return
+
+    def _check(self):
+        pids = process_tree(self.root_pids)
+        if pids:
+            total, renderer = sample_memory(pids)
+            self.peak_total_mb = max(self.peak_total_mb, total)
+            if renderer > self.renderer_limit_mb:
+                return f"renderer RSS {renderer:.0f} MB > {self.renderer_limit_mb:.0f} MB"
+            if total > self.total_limit_mb:
+                return f"browser RSS {total:.0f} MB > {self.total_limit_mb:.0f} MB"
+
+        # Keep at most one CDP probe in flight; a probe that never returns
+        # means the browser (or chromedriver) is wedged
+        if self._probe is None or not self._probe.is_alive():
+            self._probe = threading.Thread(target=self._ping, daemon=True)
+            self._probe.start()
+        silent = time.time() - self._last_response
+        if silent > self.silence_limit:
+            return f"no CDP response for {silent:.0f}s"
+        return None
+
+    @property
+    def silence_limit(self):
+        """Seconds of CDP silence before tripping; never shorter than a page load may take"""
+        return max(self.unresponsive_seconds, self.page_load_seconds + PAGE_LOAD_GRACE_SECONDS)
+
+    def _page_load_timeout(self):
+        try:
+            return float(self.driver.timeouts.page_load)
+        except Exception:
+            return None
+
+    def _ping(self):
+        try:
+            self.driver.execute_cdp_cmd("Runtime.evaluate", {"expression": "1", "returnByValue": True})
+            self._last_response = time.time()
+        except Exception as e:
+            # An error reply still proves the browser is alive, unless it's gone
+            if "not reachable" not in str(e) and "disconnected" not in str(e):
+                self._last_response = time.time()
+            return
+        # The phase may have changed the page-load timeout since the last ping
+        self.page_load_seconds = self._page_load_timeout() or self.page_load_seconds
+
+    def _trip(self, reason):
+        self.tripped = reason
+        logger.error(f"[{self.label}] watchdog recycling driver: {reason}")
+        for pid in process_tree(self.root_pids):
+            try:
+                os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            except OSError:
+                pass
+
+
+def run_watched(phase, driver_factory, body, recycles=1):
+    """
+    Run body(driver) on a fresh driver under a watchdog.
+
+    If the watchdog has to kill the driver, a new one is created and the
+    phase starts over (up to `recycles` times) through retry_call(). Any
+    other exception propagates from the first attempt: the body does its own
+    retrying, and re-running it would repeat every login. The driver is
+    always quit afterwards. Returns whatever body returns.
+    """
+    from retry import retry_call, RetryPolicy
+
+    def attempt(n):
+        driver = driver_factory()
+        watchdog = DriverWatchdog(driver, phase)
+        watchdog.start()
+        try:
+            result = body(driver)
+        except Exception as e:
+            if watchdog.tripped:
+                raise DriverRecycled(f"{phase}: {watchdog.tripped}") from e
+            raise
+        finally:
+            watchdog.stop()
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        if watchdog.tripped:
+            raise DriverRecycled(f"{phase}: {watchdog.tripped}")
+        return result
+
+    return retry_call(f"{phase} phase", attempt, RetryPolicy(attempts=recycles + 1, base_delay=2, max_delay=5),
+                      retry_on=DriverRecycled)
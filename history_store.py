@@ -0,0 +1,647 @@
+"""
+Local time-series history of catalog allocations and RT POS reorder rows.
+
+Every run appends what it scraped (SKU allocations per catalog section and the
+parsed RT POS rows) to an embedded SQLite database, so trends can be queried
+later without reopening old xlsx attachments.
+
+Per-phase durations (catalog, RT POS login/generate, report, email) are kept
+too, for ETAs during a run and for spotting regressions afterwards. Browser
+page-load samples taken during a phase (page_metrics.py) are stored with it:
+
+    python history_store.py report --threshold 0.25
+
+Usage:
+    from history_store import open_store
+
+    with open_store() as store:
+        df = store.allocation_vs_velocity(account="IOTPHILLY", since="2026-01-01")
+"""
+
+import os
+import re
+import time
+import sqlite3
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(os.getcwd(), "history", "idoo_history.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_date    TEXT NOT NULL,
+    account     TEXT NOT NULL,
+    started_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_account_date ON runs (account, run_date);
+
+CREATE TABLE IF NOT EXISTS allocations (
+    run_id      INTEGER NOT NULL,
+    run_date    TEXT NOT NULL,
+    account     TEXT NOT NULL,
+    section     TEXT NOT NULL,
+    sku         TEXT NOT NULL,
+    quantity    INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_alloc_account_date ON allocations (account, run_date);
+CREATE INDEX IF NOT EXISTS idx_alloc_sku_date ON allocations (sku, run_date);
+
+CREATE TABLE IF NOT EXISTS reorder_rows (
+    run_id      INTEGER NOT NULL,
+    run_date    TEXT NOT NULL,
+    account     TEXT NOT NULL,
+    market      TEXT,
+    store_id    TEXT,
+    store_name  TEXT,
+    item_number TEXT NOT NULL,
+    on_hand     REAL,
+    on_po       REAL,
+    sales_7d    REAL,
+    suggested   REAL,
+    item_cost   REAL,
+    total_qty   REAL
+);
+CREATE INDEX IF NOT EXISTS idx_reorder_account_date ON reorder_rows (account, run_date);
+CREATE INDEX IF NOT EXISTS idx_reorder_item_date ON reorder_rows (item_number, run_date);
+CREATE INDEX IF NOT EXISTS idx_reorder_run_item ON reorder_rows (run_id, item_number);
+
+CREATE TABLE IF NOT EXISTS sales_windows (
+    run_id      INTEGER NOT NULL,
+    run_date    TEXT NOT NULL,
+    account     TEXT NOT NULL,
+    store_id    TEXT,
+    item_number TEXT NOT NULL,
+    days        INTEGER NOT NULL,
+    sales       REAL
+);
+CREATE INDEX IF NOT EXISTS idx_windows_item_date ON sales_windows (item_number, run_date);
+
+CREATE TABLE IF NOT EXISTS account_runs (
+    run_date    TEXT NOT NULL,
+    account     TEXT NOT NULL,
+    started_at  TEXT NOT NULL,
+    duration    REAL NOT NULL,
+    outcome     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_account_runs ON account_runs (account, started_at);
+
+CREATE TABLE IF NOT EXISTS phase_runs (
+    run_id      INTEGER,
+    run_date    TEXT NOT NULL,
+    account     TEXT NOT NULL,
+    phase       TEXT NOT NULL,
+    started_at  TEXT NOT NULL,
+    duration    REAL NOT NULL,
+    outcome     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_phase_runs ON phase_runs (account, phase, started_at);
+
+CREATE TABLE IF NOT EXISTS page_loads (
+    run_id          INTEGER,
+    run_date        TEXT NOT NULL,
+    account         TEXT NOT NULL,
+    phase           TEXT NOT NULL,
+    step            TEXT NOT NULL,
+    sampled_at      TEXT NOT NULL,
+    url             TEXT,
+    ttfb_ms         REAL,
+    dom_ready_ms    REAL,
+    load_ms         REAL,
+    resources       INTEGER,
+    transfer_bytes  INTEGER,
+    blocking        INTEGER,
+    js_heap_mb      REAL,
+    layout_ms       REAL,
+    style_ms        REAL,
+    script_ms       REAL,
+    task_ms         REAL,
+    slowest         TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_page_loads ON page_loads (account, phase, step, run_date);
+"""
+
+PAGE_LOAD_COLUMNS = [
+    'url', 'ttfb_ms', 'dom_ready_ms', 'load_ms', 'resources', 'transfer_bytes', 'blocking',
+    'js_heap_mb', 'layout_ms', 'style_ms', 'script_ms', 'task_ms', 'slowest',
+]
+
+# Where a phase's time goes: the remote sites or our own code
+PHASE_SOURCES = {
+    'catalog': 'upstream',
+    'rtpos_login': 'upstream',
+    'rtpos_generate': 'upstream',
+    'report': 'local',
+    'email': 'local',
+}
+
+# Report column -> reorder_rows column
+REORDER_COLUMNS = {
+    'Market': 'market',
+    'StoreID': 'store_id',
+    'Store Name': 'store_name',
+    'Item Number': 'item_number',
+    'On Hand': 'on_hand',
+    'On PO': 'on_po',
+    '7 Days': 'sales_7d',
+    'Suggested': 'suggested',
+    'Item Cost': 'item_cost',
+    'Total Qty': 'total_qty',
+}
+
+
+def _to_number(value):
+    """Coerce a spreadsheet cell to float, or None for blanks/NaN/text"""
+    if value is None or value == "":
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if number != number else number
+
+
+def _median(values):
+    values = sorted(values)
+    if not values:
+        return None
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2
+
+
+def phase_source(phase):
+    """'upstream' or 'local' for a phase name like rtpos_generate_7d"""
+    for prefix, source in PHASE_SOURCES.items():
+        if phase == prefix or phase.startswith(prefix + "_"):
+            return source
+    return 'unknown'
+
+
+class HistoryStore:
+    """Append-only SQLite store for per-run allocation and reorder history"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.getenv('HISTORY_DB', DEFAULT_DB_PATH)
+        db_dir = os.path.dirname(os.path.abspath(self.db_path))
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.conn = sqlite3.connect(self.db_path)
+        # WAL keeps appends cheap and lets readers query while a run writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # ── Append path ──────────────────────────────────────────────────────────
+
+    def start_run(self, account, run_date):
+        """Register a run for an account and return its run_id"""
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO runs (run_date, account, started_at) VALUES (?, ?, ?)",
+                (run_date, account, datetime.now().isoformat(timespec='seconds'))
+            )
+        return cur.lastrowid
+
+    def append_allocations(self, run_id, account, run_date, section_rows):
+        """
+        Append catalog allocations.
+
+        Args:
+            section_rows: iterable of (section, sku, quantity)
+        """
+        rows = [
+            (run_id, run_date, account, section, str(sku), int(_to_number(qty) or 0))
+            for section, sku, qty in section_rows
+        ]
+        if not rows:
+            return 0
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO allocations (run_id, run_date, account, section, sku, quantity) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        logger.info(f"History: stored {len(rows)} allocation rows for {account}")
+        return len(rows)
+
+    def append_reorder_rows(self, run_id, account, run_date, report_df):
+        """Append parsed RT POS rows (the "report" sheet DataFrame)"""
+        columns = [c for c in REORDER_COLUMNS if c in report_df.columns]
+        rows = []
+        for record in report_df[columns].itertuples(index=False, name=None):
+            values = dict(zip(columns, record))
+            rows.append((
+                run_id, run_date, account,
+                values.get('Market'), _str_or_none(values.get('StoreID')),
+                values.get('Store Name'), str(values.get('Item Number')),
+                _to_number(values.get('On Hand')), _to_number(values.get('On PO')),
+                _to_number(values.get('7 Days')), _to_number(values.get('Suggested')),
+                _to_number(values.get('Item Cost')), _to_number(values.get('Total Qty')),
+            ))
+        if not rows:
+            return 0
+
+        # Extra RT POS day windows ("14 Days", "30 Days", ...) go to a long table
+        window_rows = []
+        for column in report_df.columns:
+            match = re.fullmatch(r"(\d+) Days", str(column))
+            if not match or column == '7 Days':
+                continue
+            days = int(match.group(1))
+            for store_id, item_number, sales in report_df[['StoreID', 'Item Number', column]].itertuples(index=False, name=None):
+                window_rows.append((
+                    run_id, run_date, account, _str_or_none(store_id),
+                    str(item_number), days, _to_number(sales)
+                ))
+
+        with self.conn:
+            if window_rows:
+                self.conn.executemany(
+                    "INSERT INTO sales_windows (run_id, run_date, account, store_id, item_number, days, sales) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    window_rows
+                )
+            self.conn.executemany(
+                "INSERT INTO reorder_rows (run_id, run_date, account, market, store_id, store_name, "
+                "item_number, on_hand, on_po, sales_7d, suggested, item_cost, total_qty) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        logger.info(f"History: stored {len(rows)} reorder rows for {account}")
+        return len(rows)
+
+    def record_account_run(self, account, run_date, duration, outcome):
+        """Record how long an account took end to end and how it ended"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO account_runs (run_date, account, started_at, duration, outcome) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (run_date, account, datetime.now().isoformat(timespec='seconds'), duration, outcome)
+            )
+
+    def expected_duration(self, account, last_n=10):
+        """Median duration of the account's last successful runs, or None"""
+        rows = self.conn.execute(
+            "SELECT duration FROM account_runs WHERE account = ? AND outcome = 'ok' "
+            "ORDER BY started_at DESC LIMIT ?",
+            (account, last_n)
+        ).fetchall()
+        return _median(r[0] for r in rows)
+
+    def record_phase(self, run_id, account, run_date, phase, duration, outcome):
+        """Record one phase's duration and outcome ("ok", "failed" or "error")"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO phase_runs (run_id, run_date, account, phase, started_at, duration, outcome) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_id, run_date, account, phase,
+                 datetime.now().isoformat(timespec='seconds'), duration, outcome)
+            )
+
+    def record_page_loads(self, run_id, account, run_date, phase, samples):
+        """Store a phase's browser page-load samples (see page_metrics.py)"""
+        rows = [
+            (run_id, run_date, account, phase, sample["step"],
+             datetime.fromtimestamp(sample["sampled_at"]).isoformat(timespec='seconds'))
+            + tuple(sample.get(column) for column in PAGE_LOAD_COLUMNS)
+            for sample in samples
+        ]
+        columns = ", ".join(PAGE_LOAD_COLUMNS)
+        placeholders = ", ".join("?" * (6 + len(PAGE_LOAD_COLUMNS)))
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO page_loads (run_id, run_date, account, phase, step, sampled_at, {columns}) "
+                f"VALUES ({placeholders})",
+                rows
+            )
+
+    def phase_medians(self, account, last_n=10):
+        """{phase: median duration} over the account's last successful runs of each phase"""
+        rows = self.conn.execute(
+            "SELECT phase, duration FROM ("
+            "  SELECT phase, duration, ROW_NUMBER() OVER ("
+            "    PARTITION BY phase ORDER BY started_at DESC) AS n "
+            "  FROM phase_runs WHERE account = ? AND outcome = 'ok'"
+            ") WHERE n <= ?",
+            (account, last_n)
+        ).fetchall()
+        by_phase = {}
+        for phase, duration in rows:
+            by_phase.setdefault(phase, []).append(duration)
+        return {phase: _median(durations) for phase, durations in by_phase.items()}
+
+    # ── Query API ────────────────────────────────────────────────────────────
+
+    def latest_allocations(self, account):
+        """[(section, sku, quantity)] from the account's most recent run with allocations"""
+        return self.conn.execute(
+            "SELECT section, sku, quantity FROM allocations WHERE run_id = ("
+            "  SELECT MAX(run_id) FROM allocations WHERE account = ?"
+            ") ORDER BY rowid",
+            (account,)
+        ).fetchall()
+
+    def _query(self, sql, params):
+        import pandas as pd
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    @staticmethod
+    def _filters(account, since, until, sku_column=None, sku=None):
+        clauses, params = [], []
+        if account:
+            clauses.append("account = ?")
+            params.append(account)
+        if since:
+            clauses.append("run_date >= ?")
+            params.append(since)
+        if until:
+            clauses.append("run_date <= ?")
+            params.append(until)
+        if sku and sku_column:
+            clauses.append(f"{sku_column} = ?")
+            params.append(sku)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def allocation_trend(self, sku=None, account=None, since=None, until=None):
+        """Allocated quantity per run date, account and SKU"""
+        where, params = self._filters(account, since, until, "sku", sku)
+        return self._query(
+            f"SELECT run_date, account, sku, SUM(quantity) AS allocated "
+            f"FROM allocations {where} "
+            f"GROUP BY run_date, account, sku ORDER BY run_date, account, sku",
+            params
+        )
+
+    def reorder_trend(self, item_number=None, account=None, since=None, until=None):
+        """On Hand / On PO / 7 Days / Suggested summed across stores per run date"""
+        where, params = self._filters(account, since, until, "item_number", item_number)
+        return self._query(
+            f"SELECT run_date, account, item_number, "
+            f"SUM(on_hand) AS on_hand, SUM(on_po) AS on_po, "
+            f"SUM(sales_7d) AS sales_7d, SUM(suggested) AS suggested, "
+            f"COUNT(DISTINCT store_id) AS stores "
+            f"FROM reorder_rows {where} "
+            f"GROUP BY run_date, account, item_number ORDER BY run_date, account, item_number",
+            params
+        )
+
+    def sales_window_trend(self, item_number=None, account=None, since=None, until=None):
+        """Sales per extra RT POS day window (14/30 days, ...) summed across stores"""
+        where, params = self._filters(account, since, until, "item_number", item_number)
+        return self._query(
+            f"SELECT run_date, account, item_number, days, SUM(sales) AS sales "
+            f"FROM sales_windows {where} "
+            f"GROUP BY run_date, account, item_number, days ORDER BY run_date, account, item_number, days",
+            params
+        )
+
+    def allocation_vs_velocity(self, account=None, since=None, until=None):
+        """
+        Join allocations with sales velocity per run date and SKU.
+
+        weeks_of_cover is allocated / 7-day sales, i.e. how many weeks the
+        allocation would last at the current sell-through.
+        """
+        where, params = self._filters(account, since, until)
+        df = self._query(
+            f"WITH alloc AS ("
+            f"  SELECT run_id, run_date, account, sku, SUM(quantity) AS allocated "
+            f"  FROM allocations {where} GROUP BY run_id, run_date, account, sku"
+            f"), sales AS ("
+            f"  SELECT run_id, item_number, SUM(sales_7d) AS sales_7d, "
+            f"  SUM(on_hand) AS on_hand, SUM(suggested) AS suggested "
+            f"  FROM reorder_rows WHERE run_id IN (SELECT DISTINCT run_id FROM alloc) "
+            f"  GROUP BY run_id, item_number"
+            f") "
+            f"SELECT alloc.run_date, alloc.account, alloc.sku, alloc.allocated, "
+            f"sales.sales_7d, sales.on_hand, sales.suggested "
+            f"FROM alloc LEFT JOIN sales "
+            f"ON sales.run_id = alloc.run_id AND sales.item_number = alloc.sku "
+            f"ORDER BY alloc.run_date, alloc.account, alloc.sku",
+            params
+        )
+        velocity = df['sales_7d'].where(df['sales_7d'] > 0)
+        df['weeks_of_cover'] = (df['allocated'] / velocity).round(2)
+        return df
+
+    def phase_trend(self, account=None, since=None, until=None):
+        """Weekly median duration and failure count per account and phase"""
+        where, params = self._filters(account, since, until)
+        df = self._query(
+            f"SELECT run_date, account, phase, duration, outcome FROM phase_runs {where}",
+            params
+        )
+        if df.empty:
+            return df
+        df['week'] = df['run_date'].map(lambda d: datetime.strptime(d, '%Y-%m-%d').strftime('%G-W%V'))
+        keys = ['account', 'phase', 'week']
+        # Failures are counted on every run, so a week where a phase only failed still shows up
+        df['failed'] = df['outcome'] != 'ok'
+        failures = df.groupby(keys)['failed'].sum().rename('failures')
+        durations = df[~df['failed']].groupby(keys)['duration'].agg(['median', 'count'])
+        trend = failures.to_frame().join(durations).fillna({'count': 0}).reset_index()
+        trend = trend.astype({'count': int, 'failures': int})
+        trend['source'] = trend['phase'].map(phase_source)
+        return trend.rename(columns={'median': 'median_seconds', 'count': 'runs'})
+
+    def page_load_summary(self, account=None, since=None, until=None):
+        """Median page timing, resources and browser work per account, phase and step"""
+        where, params = self._filters(account, since, until)
+        df = self._query(f"SELECT * FROM page_loads {where}", params)
+        if df.empty:
+            return df
+        df['transfer_kb'] = df['transfer_bytes'] / 1024
+        summary = df.groupby(['account', 'phase', 'step']).agg(
+            samples=('step', 'size'),
+            ttfb_ms=('ttfb_ms', 'median'),
+            load_ms=('load_ms', 'median'),
+            resources=('resources', 'median'),
+            transfer_kb=('transfer_kb', 'median'),
+            blocking=('blocking', 'median'),
+            script_ms=('script_ms', 'median'),
+            layout_ms=('layout_ms', 'median'),
+            task_ms=('task_ms', 'median'),
+            js_heap_mb=('js_heap_mb', 'median'),
+        )
+        return summary.round(1).reset_index()
+
+    def phase_regressions(self, threshold=0.25, recent_days=7, baseline_days=28, min_runs=3, today=None):
+        """
+        Phases whose median over the last recent_days is more than threshold
+        (fraction) slower than over the baseline_days before that.
+
+        Only successful runs count; each side needs at least min_runs runs.
+        """
+        import pandas as pd
+
+        today = today or datetime.now().date()
+        recent_start = (today - timedelta(days=recent_days)).isoformat()
+        baseline_start = (today - timedelta(days=recent_days + baseline_days)).isoformat()
+        df = self._query(
+            "SELECT run_date, account, phase, duration FROM phase_runs "
+            "WHERE outcome = 'ok' AND run_date > ?",
+            [baseline_start]
+        )
+
+        columns = ['account', 'phase', 'source', 'baseline_seconds', 'recent_seconds', 'change', 'runs']
+        flagged = []
+        for (account, phase), group in df.groupby(['account', 'phase']):
+            recent = group[group['run_date'] > recent_start]['duration']
+            baseline = group[group['run_date'] <= recent_start]['duration']
+            if len(recent) < min_runs or len(baseline) < min_runs:
+                continue
+            baseline_median = baseline.median()
+            recent_median = recent.median()
+            if baseline_median <= 0:
+                continue
+            change = recent_median / baseline_median - 1
+            if change > threshold:
+                flagged.append((account, phase, phase_source(phase), round(baseline_median, 1),
+                                round(recent_median, 1), round(change, 3), len(recent)))
+        return pd.DataFrame(flagged, columns=columns).sort_values('change', ascending=False)
+
+
+class RunRecorder:
+    """
+    Per-account handle used by the scraper's append path.
+
+    History is best-effort: a failure to record is logged and never fails the run.
+    """
+
+    def __init__(self, store, account, run_date):
+        self.store = store
+        self.account = account
+        self.run_date = run_date
+        self.run_id = None
+        try:
+            self.run_id = store.start_run(account, run_date)
+        except Exception as e:
+            logger.warning(f"History: could not start run for {account}: {e}")
+
+    def allocations(self, section_rows):
+        if self.run_id is None:
+            return
+        try:
+            self.store.append_allocations(self.run_id, self.account, self.run_date, section_rows)
+        except Exception as e:
+            logger.warning(f"History: could not store allocations for {self.account}: {e}")
+
+    def reorder_rows(self, report_df):
+        if self.run_id is None:
+            return
+        try:
+            self.store.append_reorder_rows(self.run_id, self.account, self.run_date, report_df)
+        except Exception as e:
+            logger.warning(f"History: could not store reorder rows for {self.account}: {e}")
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a phase and record it. Yields a dict; set ["outcome"] = "failed"
+        when the phase fails without raising. Exceptions are recorded as "error".
+        """
+        status = {"outcome": "ok"}
+        start = time.time()
+        try:
+            yield status
+        except BaseException:
+            status["outcome"] = "error"
+            raise
+        finally:
+            try:
+                self.store.record_phase(self.run_id, self.account, self.run_date, name,
+                                        time.time() - start, status["outcome"])
+            except Exception as e:
+                logger.warning(f"History: could not record phase {name} for {self.account}: {e}")
+            if status.get("page_loads"):
+                try:
+                    self.store.record_page_loads(self.run_id, self.account, self.run_date, name,
+                                                 status["page_loads"])
+                except Exception as e:
+                    logger.warning(f"History: could not record page loads for {name}: {e}")
+
+
+def _str_or_none(value):
+    if value is None:
+        return None
+    text = str(value)
+    return None if text == "nan" else text
+
+
+def open_store(db_path=None):
+    """Open the history store (path from HISTORY_DB or history/idoo_history.db)"""
+    return HistoryStore(db_path)
+
+
+def print_report(store, account=None, weeks=6, threshold=0.25):
+    """Print weekly phase trends, page-load medians and any regressed phases"""
+    import pandas as pd
+
+    since = (datetime.now().date() - timedelta(weeks=weeks)).isoformat()
+    trend = store.phase_trend(account=account, since=since)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        if trend.empty:
+            print("No phase history yet")
+            return 0
+        print(f"Phase durations (weekly median seconds, last {weeks} weeks):\n")
+        print(trend.pivot_table(index=['account', 'phase', 'source'], columns='week',
+                                values='median_seconds').round(1).to_string())
+
+        if trend['failures'].any():
+            print(f"\nPhase failures (per week, last {weeks} weeks):\n")
+            print(trend.pivot_table(index=['account', 'phase', 'source'], columns='week',
+                                    values='failures', aggfunc='sum', fill_value=0).to_string())
+
+        page_loads = store.page_load_summary(account=account, since=since)
+        if not page_loads.empty:
+            print(f"\nPage loads (median per step, last {weeks} weeks):\n")
+            print(page_loads.to_string(index=False))
+
+        regressions = store.phase_regressions(threshold=threshold)
+        if account:
+            regressions = regressions[regressions['account'] == account]
+        if regressions.empty:
+            print(f"\nNo phase regressed more than {threshold:.0%} in the last 7 days against the previous 4 weeks")
+            return 0
+        print(f"\nRegressed phases (> {threshold:.0%} slower in the last 7 days than in the previous 4 weeks):\n")
+        print(regressions.to_string(index=False))
+        upstream = set(regressions['source']) == {'upstream'}
+        print("\nAll regressions are in upstream site phases" if upstream
+              else "\nSome regressions are in local phases (our code)")
+    return 1
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query the scraper's history store")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    report = subcommands.add_parser("report", help="phase duration trends and regressions")
+    report.add_argument("--account", help="limit to one account label, e.g. IOTPHILLY")
+    report.add_argument("--weeks", type=int, default=6, help="weeks of trend to show")
+    report.add_argument("--threshold", type=float, default=0.25,
+                        help="flag phases whose median grew by more than this fraction")
+    args = parser.parse_args()
+
+    with open_store() as store:
+        sys.exit(print_report(store, account=args.account, weeks=args.weeks, threshold=args.threshold))
@@ -0,0 +1,257 @@
+"""
+Queue-based, structured logging pipeline.
+
+Every logger call only puts the record on an in-memory queue; a single
+listener thread formats it and writes it out, so accounts running in
+parallel never block on (or interleave inside) the log file.
+
+- scraper.log gets one JSON object per line, written in batches
+- the console keeps a readable one-line format
+- records carry account / phase / attempt context, set with log_context()
+
+Per-SKU messages from the catalog loops go through SkuLog, which follows
+LOG_SKU_MODE:
+    all         one line per SKU (the old behaviour)
+    sample      every LOG_SKU_SAMPLE_EVERY-th SKU, plus the summary
+    aggregate   only a per-section summary line (default)
+"""
+
+import os
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+CONTEXT_FIELDS = ("account", "phase", "attempt")
+
+_context = contextvars.ContextVar("log_context", default={})
+_listener = None
+_traceback_formatter = logging.Formatter()
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach account/phase/attempt (or any other) fields to records logged inside the block"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def current_context():
+    return dict(_context.get())
+
+
+class ContextFilter(logging.Filter):
+    """Copy the active log_context() onto each record (runs on the QueueHandler, in the caller's thread)"""
+
+    def filter(self, record):
+        context = _context.get()
+        for field in CONTEXT_FIELDS:
+            setattr(record, field, context.get(field))
+        record.context = context
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in getattr(record, "context", {}).items() if v is not None})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Readable line with a [account/phase#attempt] prefix when context is set"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(levelname)s - %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        context = getattr(record, "context", {})
+        tag = "/".join(str(context[f]) for f in ("account", "phase") if context.get(f))
+        if context.get("attempt"):
+            tag += f"#{context['attempt']}"
+        return f"[{tag}] {line}" if tag else line
+
+
+class BatchingFileHandler(logging.Handler):
+    """
+    Buffer formatted records and write them in one go.
+
+    Flushes when capacity records are buffered, when flush_interval seconds
+    have passed since the last write, on WARNING and above, and on close.
+    The time-based flush is checked on each record and, while no records
+    arrive, by the listener thread (see BatchingQueueListener).
+    """
+
+    def __init__(self, filename, capacity=200, flush_interval=2.0, encoding="utf-8"):
+        super().__init__()
+        self.filename = filename
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.encoding = encoding
+        self.buffer = []
+        self.last_flush = time.monotonic()
+
+    def emit(self, record):
+        try:
+            self.buffer.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self.buffer) >= self.capacity or record.levelno >= logging.WARNING:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self.buffer:
+                with open(self.filename, "a", encoding=self.encoding) as f:
+                    f.write("\n".join(self.buffer) + "\n")
+                self.buffer = []
+            self.last_flush = time.monotonic()
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+class StructuredQueueHandler(QueueHandler):
+    """
+    QueueHandler that keeps the traceback apart from the message.
+
+    The stock prepare() folds the traceback into msg and drops exc_info, so
+    JsonFormatter would never see it. Here the message is merged with its
+    args as usual and the traceback is kept as exc_text, which formatters
+    print after the message (and JsonFormatter puts under "exc").
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class BatchingQueueListener(QueueListener):
+    """QueueListener that lets BatchingFileHandler flush on time while the queue is idle"""
+
+    def __init__(self, log_queue, *handlers, idle_check=0.5, **kwargs):
+        super().__init__(log_queue, *handlers, **kwargs)
+        self.idle_check = idle_check
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.idle_check if block else None)
+            except queue.Empty:
+                if not block:
+                    raise
+            for handler in self.handlers:
+                if isinstance(handler, BatchingFileHandler):
+                    handler.flush_if_due()
+
+
+def configure(log_file="scraper.log", extra_handlers=(), level=logging.INFO):
+    """
+    Route all logging through a queue to a batching JSON file handler and the console.
+
+    extra_handlers (e.g. the webhook) are driven by the same listener thread.
+    Safe to call more than once; later calls are ignored.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    file_handler = BatchingFileHandler(log_file)
+    file_handler.setFormatter(JsonFormatter())
+    console = logging.StreamHandler()
+    console.setFormatter(ConsoleFormatter())
+    for handler in extra_handlers:
+        if handler.formatter is None:
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    # Context lives in the caller's thread, so capture it before the record is queued
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = BatchingQueueListener(log_queue, file_handler, console, *extra_handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+
+
+def shutdown():
+    """Drain the queue and flush the log file"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        try:
+            handler.close()
+        except Exception:
+            pass
+    _listener = None
+
+
+class SkuLog:
+    """Per-SKU logging for one catalog section, following LOG_SKU_MODE"""
+
+    def __init__(self, logger, section_name, mode=None, sample_every=None):
+        self.logger = logger
+        self.section_name = section_name
+        self.mode = (mode or os.getenv("LOG_SKU_MODE", "aggregate")).lower()
+        self.sample_every = sample_every or int(os.getenv("LOG_SKU_SAMPLE_EVERY", "25"))
+        self.skus = []
+
+    def added(self, sku):
+        self.skus.append(sku)
+        if self.mode == "all" or (self.mode == "sample" and (len(self.skus) - 1) % self.sample_every == 0):
+            self.logger.info(f"{self.section_name} stock added for SKU: {sku}")
+
+    def summary(self):
+        if self.mode == "all":
+            return
+        preview = ", ".join(self.skus[:5]) + (", ..." if len(self.skus) > 5 else "")
+        self.logger.info(f"{self.section_name} stock added for {len(self.skus)} SKU(s)"
+                         + (f": {preview}" if self.skus else ""))
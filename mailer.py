@@ -0,0 +1,274 @@
+"""
+Report email delivery over SMTP.
+
+Attachments are streamed: the message is written to the SMTP DATA command
+in base64 chunks read straight from disk, so a report is never held in
+memory whole. One authenticated connection is kept for every message sent
+through a Mailer (several recipients, one message per account, ...) and is
+re-opened if the server drops it.
+
+Gmail rejects messages over 25 MB after base64 encoding. Attachments are
+packed into as few messages as fit under EMAIL_MAX_BYTES (default
+24,000,000); more than that and the reports go out as "part 1/2", "part 2/2".
+EMAIL_ZIP=1 zips each attachment first.
+
+Server settings come from the environment: SMTP_HOST (smtp.gmail.com),
+SMTP_PORT (587), SMTP_STARTTLS (1), GMAIL_USER / GMAIL_APP_PASSWORD. To try
+it locally without Gmail, run a stand-in such as
+`python -m aiosmtpd -n -l localhost:1025` and set SMTP_HOST=localhost
+SMTP_PORT=1025 SMTP_STARTTLS=0 (login is skipped without credentials).
+"""
+
+import os
+import base64
+import shutil
+import logging
+import smtplib
+import zipfile
+import tempfile
+import mimetypes
+from email.header import Header
+from email.utils import encode_rfc2231, formatdate, make_msgid, quote
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 24_000_000
+
+# 57 raw bytes encode to one 76-character base64 line
+LINE_BYTES = 57
+CHUNK_LINES = 1024
+
+
+def encoded_size(raw_size):
+    """Bytes an attachment of raw_size takes in the message (base64 lines + CRLF)"""
+    return -(-raw_size // LINE_BYTES) * 78
+
+
+def _env_flag(name, default):
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _header(value):
+    try:
+        value.encode("ascii")
+        return value
+    except UnicodeEncodeError:
+        return Header(value, "utf-8").encode()
+
+
+def _filename_param(key, filename):
+    """key="filename", or key*=utf-8''... (RFC 2231) when the name isn't ASCII"""
+    try:
+        filename.encode("ascii")
+        return f'{key}="{quote(filename)}"'
+    except UnicodeEncodeError:
+        return f"{key}*={encode_rfc2231(filename, 'utf-8')}"
+
+
+def _base64_lines(data):
+    for start in range(0, len(data), LINE_BYTES):
+        yield base64.b64encode(data[start:start + LINE_BYTES]) + b"\r\n"
+
+
+def iter_message(sender, recipient, subject, body, attachments):
+    """
+    Yield the raw message in chunks: headers, a base64 text part, then each
+    (path, filename) attachment read from disk a block at a time.
+
+    Every line is a header or base64, so none starts with "." and the
+    chunks can go to DATA without dot-stuffing.
+    """
+    boundary = f"=_idoo_{make_msgid().strip('<>').replace('@', '.')}"
+    head = [
+        f"From: {sender}",
+        f"To: {recipient}",
+        f"Subject: {_header(subject)}",
+        f"Date: {formatdate(localtime=True)}",
+        f"Message-ID: {make_msgid()}",
+        "MIME-Version: 1.0",
+        f'Content-Type: multipart/mixed; boundary="{boundary}"',
+        "",
+        f"--{boundary}",
+        'Content-Type: text/plain; charset="utf-8"',
+        "Content-Transfer-Encoding: base64",
+        "",
+    ]
+    yield ("\r\n".join(head) + "\r\n").encode("ascii")
+    yield b"".join(_base64_lines(body.encode("utf-8")))
+
+    for path, filename in attachments:
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        part = [
+            f"--{boundary}",
+            f"Content-Type: {content_type}; {_filename_param('name', filename)}",
+            "Content-Transfer-Encoding: base64",
+            f"Content-Disposition: attachment; {_filename_param('filename', filename)}",
+            "",
+        ]
+        yield ("\r\n".join(part) + "\r\n").encode("ascii")
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(LINE_BYTES * CHUNK_LINES)
+                if not block:
+                    break
+                yield b"".join(_base64_lines(block))
+
+    yield f"--{boundary}--\r\n".encode("ascii")
+
+
+def pack_attachments(attachments, max_bytes, overhead=0):
+    """
+    Group (path, filename) attachments, in order, into batches whose encoded
+    size stays under max_bytes. An attachment too big for any message is
+    left out with an error.
+    """
+    batches = []
+    current, current_size = [], overhead
+    for path, filename in attachments:
+        size = encoded_size(os.path.getsize(path)) + 512
+        if overhead + size > max_bytes:
+            logger.error(f"{filename} is too large to email ({os.path.getsize(path) / 1e6:.1f} MB), leaving it out")
+            continue
+        if current and current_size + size > max_bytes:
+            batches.append(current)
+            current, current_size = [], overhead
+        current.append((path, filename))
+        current_size += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+class Mailer:
+    """One SMTP connection, reused for every message until close()"""
+
+    def __init__(self, host=None, port=None, user=None, password=None, starttls=None,
+                 max_bytes=None, compress=None, timeout=60):
+        self.host = host or os.getenv("SMTP_HOST", "smtp.gmail.com")
+        self.port = int(port or os.getenv("SMTP_PORT", "587"))
+        self.user = user if user is not None else os.getenv("GMAIL_USER")
+        self.password = password if password is not None else os.getenv("GMAIL_APP_PASSWORD")
+        self.starttls = _env_flag("SMTP_STARTTLS", "1") if starttls is None else starttls
+        self.max_bytes = max_bytes or int(os.getenv("EMAIL_MAX_BYTES", str(DEFAULT_MAX_BYTES)))
+        self.compress = _env_flag("EMAIL_ZIP", "0") if compress is None else compress
+        self.timeout = timeout
+        self.sender = self.user or os.getenv("EMAIL_FROM", "reports@localhost")
+        self._server = None
+        self._work_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _connection(self):
+        if self._server is not None:
+            try:
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except smtplib.SMTPException:
+                pass
+            self._drop()
+
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.user and self.password:
+                server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        logger.info(f"Connected to SMTP server {self.host}:{self.port}")
+        self._server = server
+        return server
+
+    def _drop(self):
+        if self._server is not None:
+            try:
+                self._server.close()
+            except Exception:
+                pass
+            self._server = None
+
+    def prepare(self, attachment_paths):
+        """Zip (if enabled) and pack the attachments into per-message batches"""
+        attachments = []
+        for path in attachment_paths:
+            if not os.path.exists(path):
+                logger.warning(f"Attachment file not found: {path}")
+                continue
+            filename = os.path.basename(path)
+            if self.compress:
+                if self._work_dir is None:
+                    self._work_dir = tempfile.mkdtemp(prefix="idoo-mail-")
+                zip_path = os.path.join(self._work_dir, filename + ".zip")
+                with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                    archive.write(path, filename)
+                logger.info(f"Zipped {filename}: {os.path.getsize(path)} -> {os.path.getsize(zip_path)} bytes")
+                path, filename = zip_path, filename + ".zip"
+            attachments.append((path, filename))
+        return pack_attachments(attachments, self.max_bytes, overhead=64 * 1024)
+
+    def _stream(self, server, recipient, chunks):
+        server.ehlo_or_helo_if_needed()
+        code, reply = server.mail(self.sender)
+        if code != 250:
+            raise smtplib.SMTPSenderRefused(code, reply, self.sender)
+        code, reply = server.rcpt(recipient)
+        if code not in (250, 251):
+            raise smtplib.SMTPRecipientsRefused({recipient: (code, reply)})
+        server.putcmd("data")
+        code, reply = server.getreply()
+        if code != 354:
+            raise smtplib.SMTPDataError(code, reply)
+        for chunk in chunks:
+            server.send(chunk)
+        server.send(b".\r\n")
+        code, reply = server.getreply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, reply)
+
+    def _send_one(self, recipient, subject, body, batch):
+        for attempt in range(2):
+            server = self._connection()
+            try:
+                self._stream(server, recipient, iter_message(self.sender, recipient, subject, body, batch))
+                return
+            except smtplib.SMTPServerDisconnected:
+                # Connection went stale between messages: reconnect once
+                self._drop()
+                if attempt:
+                    raise
+            except Exception:
+                # The session is mid-transaction; don't reuse it
+                self._drop()
+                raise
+
+    def deliver(self, subject, body, batches, recipients):
+        """Send the prepared batches to each recipient; returns the number of messages sent"""
+        if isinstance(recipients, str):
+            recipients = [r.strip() for r in recipients.split(",") if r.strip()]
+        sent = 0
+        for recipient in recipients:
+            for index, batch in enumerate(batches, start=1):
+                part_subject = subject if len(batches) == 1 else f"{subject} (part {index}/{len(batches)})"
+                self._send_one(recipient, part_subject, body, batch)
+                sent += 1
+                logger.info(f"Email sent to {recipient}: {part_subject} ({len(batch)} attachment(s))")
+        return sent
+
+    def send(self, subject, body, attachment_paths, recipients):
+        return self.deliver(subject, body, self.prepare(attachment_paths), recipients)
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+        if self._work_dir:
+            shutil.rmtree(self._work_dir, ignore_errors=True)
+            self._work_dir = None
@@ -0,0 +1,134 @@
+"""
+Page-load telemetry from the browser.
+
+sample(driver, step) looks at the document in the driver's current frame
+and records:
+
+    Navigation Timing   time to first byte, DOMContentLoaded, load (ms)
+    Resource Timing     resources loaded, bytes transferred, render-blocking ones
+    Performance CDP     JS heap, plus layout / script / task time since the
+                        previous sample in the same tab (or since it opened)
+
+Samples are added to the phase being timed (scraper.timed_phase(), via
+collect_into()). RunRecorder stores them in the history DB's page_loads
+table next to the phase's duration. `python history_store.py report`
+prints their medians per step.
+
+Cross-origin resources that don't send Timing-Allow-Origin count as 0
+bytes. Sampling never fails a run. Set PAGE_METRICS=0 to turn it off.
+"""
+
+import os
+import time
+import logging
+import weakref
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_phase = contextvars.ContextVar("page_metrics_phase", default=None)
+
+# Previous CDP sample per driver and tab, for per-interaction deltas
+_previous = weakref.WeakKeyDictionary()
+
+TIMING_JS = """
+const nav = performance.getEntriesByType("navigation")[0] || {};
+const resources = performance.getEntriesByType("resource");
+let bytes = nav.transferSize || 0, blocking = 0;
+for (const r of resources) {
+    bytes += r.transferSize || 0;
+    if (r.renderBlockingStatus === "blocking") blocking++;
+}
+const slowest = resources.slice().sort((a, b) => b.duration - a.duration).slice(0, 3)
+    .map(r => r.name.split("?")[0].split("/").pop() + " " + Math.round(r.duration) + "ms");
+return {
+    url: location.href,
+    ttfb_ms: nav.responseStart ? nav.responseStart - nav.startTime : null,
+    dom_ready_ms: nav.domContentLoadedEventEnd || null,
+    load_ms: nav.loadEventEnd || null,
+    resources: resources.length,
+    transfer_bytes: bytes,
+    blocking: blocking,
+    slowest: slowest.join(", "),
+};
+"""
+
+# Performance.getMetrics durations (cumulative seconds) -> sample key (ms since the previous sample)
+DURATIONS = {
+    "LayoutDuration": "layout_ms",
+    "RecalcStyleDuration": "style_ms",
+    "ScriptDuration": "script_ms",
+    "TaskDuration": "task_ms",
+}
+
+
+def enabled():
+    return os.getenv("PAGE_METRICS", "1").lower() not in ("0", "false", "no")
+
+
+@contextmanager
+def collect_into(status):
+    """Add samples taken in this block to status["page_loads"]"""
+    token = _phase.set(status)
+    try:
+        yield status
+    finally:
+        _phase.reset(token)
+
+
+def _performance_metrics(driver):
+    """Performance.getMetrics as {name: value}; enables the domain once per tab"""
+    handle = driver.current_window_handle
+    tabs = _previous.setdefault(driver, {})
+    if handle not in tabs:
+        driver.execute_cdp_cmd("Performance.enable", {})
+        tabs[handle] = None
+    result = driver.execute_cdp_cmd("Performance.getMetrics", {}) or {}
+    metrics = {m["name"]: m["value"] for m in result.get("metrics", [])}
+
+    previous, tabs[handle] = tabs[handle], metrics
+    sample = {"js_heap_mb": round(metrics["JSHeapUsedSize"] / (1024 * 1024), 1)} if "JSHeapUsedSize" in metrics else {}
+    for name, key in DURATIONS.items():
+        if name in metrics:
+            since = metrics[name] - (previous or {}).get(name, 0)
+            sample[key] = round(since * 1000, 1)
+    return sample
+
+
+def sample(driver, step):
+    """Record page timing for step in the current phase; returns the sample or None"""
+    if not enabled():
+        return None
+    entry = {"step": step, "sampled_at": time.time()}
+    try:
+        timing = driver.execute_script(TIMING_JS)
+        if isinstance(timing, dict):
+            entry.update(timing)
+    except Exception as e:
+        logger.debug(f"Navigation timing unavailable at {step}: {e}")
+    try:
+        entry.update(_performance_metrics(driver))
+    except Exception as e:
+        logger.debug(f"Performance metrics unavailable at {step}: {e}")
+
+    if len(entry) == 2:
+        return None
+
+    def ms(key):
+        value = entry.get(key)
+        return f"{value:.0f} ms" if isinstance(value, (int, float)) else "n/a"
+
+    logger.info(
+        f"Page {step}: load {ms('load_ms')} (ttfb {ms('ttfb_ms')}), "
+        f"{entry.get('resources', 'n/a')} resources / {(entry.get('transfer_bytes') or 0) / 1024:.0f} KB "
+        f"({entry.get('blocking', 0)} blocking), script {ms('script_ms')}, layout {ms('layout_ms')}, "
+        f"heap {entry.get('js_heap_mb', 'n/a')} MB"
+    )
+    if entry.get("slowest"):
+        logger.debug(f"Page {step}: slowest resources {entry['slowest']}")
+
+    status = _phase.get()
+    if status is not None:
+        status.setdefault("page_loads", []).append(entry)
+    return entry
@@ -0,0 +1,159 @@
+"""
+Per-host politeness scheduler shared by every worker.
+
+Each site (t-mobiledealerordering.com, myrtpos.com) gets:
+- a cap on concurrent logins (semaphore)
+- a token bucket limiting page requests per second
+
+Retries and backoff live in retry.py, which reports each outcome back here.
+
+The request rate adapts (AIMD): every success nudges it up towards the
+host's ceiling, every failure halves it, so workers settle at the highest
+rate the site tolerates without getting accounts locked out.
+
+Limits can be overridden with HOST_LIMITS, e.g.
+    HOST_LIMITS="www.myrtpos.com=1:0.5:2"   (max logins : max req/s : burst)
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+TMO_HOST = "www.t-mobiledealerordering.com"
+RTPOS_HOST = "www.myrtpos.com"
+
+
+class HostPolicy:
+    """Limits for one host"""
+
+    def __init__(self, max_logins=2, max_rate=1.0, burst=3, min_rate=0.05):
+        self.max_logins = max_logins
+        self.max_rate = max_rate
+        self.burst = burst
+        self.min_rate = min_rate
+
+
+DEFAULT_POLICIES = {
+    TMO_HOST: HostPolicy(max_logins=2, max_rate=1.0, burst=3),
+    RTPOS_HOST: HostPolicy(max_logins=2, max_rate=1.0, burst=3),
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is free"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class _HostState:
+    def __init__(self, policy):
+        self.policy = policy
+        self.logins = threading.BoundedSemaphore(policy.max_logins)
+        self.bucket = TokenBucket(policy.max_rate, policy.burst)
+        self.lock = threading.Lock()
+
+
+class PolitenessScheduler:
+    """Per-host concurrency and rate control shared by all workers"""
+
+    def __init__(self, policies=None):
+        self.policies = dict(DEFAULT_POLICIES)
+        self.policies.update(policies or {})
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host):
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = _HostState(self.policies.get(host, HostPolicy()))
+            return self._hosts[host]
+
+    @contextmanager
+    def login_slot(self, host):
+        """Hold one of the host's concurrent-login slots for the duration of a login"""
+        state = self._state(host)
+        waited = time.time()
+        state.logins.acquire()
+        waited = time.time() - waited
+        if waited > 1:
+            logger.info(f"Waited {waited:.1f}s for a login slot on {host}")
+        try:
+            yield
+        finally:
+            state.logins.release()
+
+    def throttle(self, host):
+        """Block until the host's token bucket allows another request"""
+        self._state(host).bucket.acquire()
+
+    def get(self, driver, url):
+        """driver.get() paced by the target host's rate limit"""
+        self.throttle(urlsplit(url).hostname)
+        driver.get(url)
+
+    def record_success(self, host):
+        """Additive increase of the host's request rate"""
+        state = self._state(host)
+        with state.lock:
+            bucket = state.bucket
+            bucket.rate = min(state.policy.max_rate, bucket.rate + state.policy.max_rate * 0.1)
+
+    def record_failure(self, host):
+        """Multiplicative decrease of the host's request rate"""
+        state = self._state(host)
+        with state.lock:
+            bucket = state.bucket
+            bucket.rate = max(state.policy.min_rate, bucket.rate / 2)
+            logger.debug(f"{host} request rate lowered to {bucket.rate:.2f}/s")
+
+
+def _parse_limits(value):
+    policies = {}
+    for part in (value or "").split(","):
+        if "=" not in part:
+            continue
+        host, spec = part.split("=", 1)
+        try:
+            logins, rate, burst = spec.split(":")
+            policies[host.strip()] = HostPolicy(int(logins), float(rate), int(burst))
+        except ValueError:
+            logger.warning(f"Ignoring malformed HOST_LIMITS entry: {part}")
+    return policies
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide scheduler shared by all workers"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PolitenessScheduler(_parse_limits(os.getenv("HOST_LIMITS")))
+        return _scheduler
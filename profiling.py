@@ -0,0 +1,165 @@
+"""
+Per-stage profiling for `scraper.py --profile`.
+
+Stages (parse_export, filter, write_sheets, styling, save_workbook,
+email_build, ...) are wrapped in profile_stage(). With profiling off that is
+a no-op; with it on, each stage run writes to PROFILE_DIR (default
+download_files/profiles/<timestamp>/):
+
+    NN-<stage>.prof     cProfile data (snakeviz, pstats, gprof2dot)
+    NN-<stage>.txt      top functions by cumulative time
+    NN-<stage>.folded   sampled stacks in folded format for flamegraph.pl /
+                        speedscope / inferno
+
+Modes: "cprofile" (deterministic), "sample" (stack sampling every
+PROFILE_SAMPLE_INTERVAL seconds, low overhead) or "both" (default).
+"time" writes nothing and only collects stage durations (see timings()),
+which is what `cli.py bench` uses.
+Stages don't nest: a stage opened inside another one is folded into the outer.
+"""
+
+import os
+import sys
+import time
+import pstats
+import logging
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+MODES = ("cprofile", "sample", "both", "time")
+
+_settings = None
+_active = threading.local()
+_sequence = 0
+_sequence_lock = threading.Lock()
+_timings = []
+
+
+def enable(mode="both", out_dir=None, interval=None):
+    """Turn profiling on for the rest of the process; returns the output directory"""
+    global _settings
+    if mode not in MODES:
+        raise ValueError(f"Unknown profile mode {mode!r}, expected one of {', '.join(MODES)}")
+    if mode == "time":
+        _settings = {"mode": mode, "out_dir": None, "interval": None}
+        return None
+    if out_dir is None:
+        out_dir = os.getenv("PROFILE_DIR") or os.path.join(
+            os.getcwd(), "download_files", "profiles", datetime.now().strftime('%Y%m%d_%H%M%S')
+        )
+    os.makedirs(out_dir, exist_ok=True)
+    _settings = {
+        "mode": mode,
+        "out_dir": out_dir,
+        "interval": interval or float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005")),
+    }
+    logger.info(f"Profiling enabled ({mode}), writing to {out_dir}")
+    return out_dir
+
+
+def enabled():
+    return _settings is not None
+
+
+def timings(reset=False):
+    """(stage, seconds) for every stage run so far"""
+    result = list(_timings)
+    if reset:
+        _timings.clear()
+    return result
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into folded-stack counts"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def write_folded(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _next_prefix():
+    global _sequence
+    with _sequence_lock:
+        _sequence += 1
+        return f"{_sequence:02d}"
+
+
+@contextmanager
+def profile_stage(name):
+    """Profile the enclosed block as one stage when profiling is enabled"""
+    if _settings is None or getattr(_active, "stage", None):
+        yield
+        return
+
+    mode = _settings["mode"]
+    if mode == "time":
+        _active.stage = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            _active.stage = None
+            _timings.append((name, time.perf_counter() - start))
+        return
+
+    base = os.path.join(_settings["out_dir"], f"{_next_prefix()}-{name}")
+    profiler = cProfile.Profile() if mode in ("cprofile", "both") else None
+    sampler = StackSampler(threading.get_ident(), _settings["interval"]) if mode in ("sample", "both") else None
+
+    _active.stage = name
+    start = time.perf_counter()
+    if sampler:
+        sampler.start()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        if sampler:
+            sampler.stop()
+        elapsed = time.perf_counter() - start
+        _active.stage = None
+        _timings.append((name, elapsed))
+
+        try:
+            if profiler:
+                profiler.dump_stats(base + ".prof")
+                with open(base + ".txt", "w", encoding="utf-8") as f:
+                    stats = pstats.Stats(profiler, stream=f)
+                    stats.sort_stats("cumulative").print_stats(40)
+            if sampler:
+                sampler.write_folded(base + ".folded")
+            logger.info(f"Profiled stage {name}: {elapsed:.2f}s -> {base}.*")
+        except Exception as e:
+            logger.warning(f"Could not write profile for {name}: {e}")
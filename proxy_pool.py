@@ -0,0 +1,208 @@
+"""
+Proxy pool for browser sessions.
+
+Running several accounts in parallel from one egress IP gets logins slowed
+down or challenged, so each session can be given its own proxy.
+
+Configuration (environment):
+    PROXY_POOL          comma-separated proxies, e.g. "http://10.0.0.5:3128,socks5://10.0.0.6:1080"
+    PROXY_ASSIGNMENTS   optional per-account pins, e.g. "iotphilly=http://10.0.0.5:3128"
+    PROXY_HEALTH_URL    URL fetched through a proxy to check it (default: RT POS login page)
+    PROXY_MAX_LATENCY   seconds; proxies slower than this are evicted (default 8)
+
+Accounts without a pin get a healthy proxy round-robin. Assignment is sticky:
+the same session key keeps its proxy until the proxy is evicted.
+"""
+
+import os
+import time
+import logging
+import threading
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEALTH_URL = "https://www.myrtpos.com/newbdi/index.fwx"
+
+
+class Proxy:
+    """One proxy endpoint and its health state"""
+
+    def __init__(self, url):
+        self.url = url
+        self.latency = None          # smoothed health-check / request latency
+        self.failures = 0            # consecutive failures
+        self.evicted_until = 0.0
+        self.last_checked = 0.0
+
+    @property
+    def server_arg(self):
+        """Value for Chrome's --proxy-server (Chrome can't take credentials here)"""
+        parts = urlsplit(self.url)
+        scheme = parts.scheme or "http"
+        return f"{scheme}://{parts.hostname}:{parts.port}" if parts.port else f"{scheme}://{parts.hostname}"
+
+    @property
+    def has_credentials(self):
+        return bool(urlsplit(self.url).username)
+
+    def is_available(self, now=None):
+        return (now or time.time()) >= self.evicted_until
+
+    def __repr__(self):
+        return f"Proxy({self.server_arg})"
+
+
+class ProxyPool:
+    """Thread-safe proxy pool with health checks, sticky sessions and eviction"""
+
+    def __init__(self, proxy_urls, assignments=None, health_url=DEFAULT_HEALTH_URL,
+                 max_latency=8.0, max_failures=2, evict_seconds=600, check_timeout=10):
+        self.proxies = {url: Proxy(url) for url in proxy_urls}
+        self.assignments = {k.lower(): v for k, v in (assignments or {}).items()}
+        for url in self.assignments.values():
+            self.proxies.setdefault(url, Proxy(url))
+        self.health_url = health_url
+        self.max_latency = max_latency
+        self.max_failures = max_failures
+        self.evict_seconds = evict_seconds
+        self.check_timeout = check_timeout
+        self.sessions = {}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.proxies)
+
+    # ── Health ───────────────────────────────────────────────────────────────
+
+    def check(self, proxy):
+        """Fetch the health URL through the proxy and record the outcome"""
+        import requests
+
+        start = time.time()
+        try:
+            response = requests.get(
+                self.health_url,
+                proxies={"http": proxy.url, "https": proxy.url},
+                timeout=self.check_timeout
+            )
+            ok = response.status_code < 500
+        except Exception as e:
+            logger.debug(f"Proxy health check failed for {proxy}: {e}")
+            ok = False
+        proxy.last_checked = time.time()
+        if not ok:
+            with self._lock:
+                self._evict(proxy, "health check failed")
+            return False
+        self.report(proxy, True, time.time() - start)
+        return proxy.is_available()
+
+    def check_all(self):
+        """Health-check every proxy; returns the number still available"""
+        for proxy in list(self.proxies.values()):
+            self.check(proxy)
+        available = sum(1 for p in self.proxies.values() if p.is_available())
+        logger.info(f"Proxy pool: {available}/{len(self.proxies)} proxies healthy")
+        return available
+
+    def report(self, proxy, ok, latency=None):
+        """Record a request outcome; slow or failing proxies get evicted"""
+        with self._lock:
+            if latency is not None:
+                proxy.latency = latency if proxy.latency is None else 0.7 * proxy.latency + 0.3 * latency
+            proxy.failures = 0 if ok else proxy.failures + 1
+
+            reason = None
+            if proxy.failures >= self.max_failures:
+                reason = f"{proxy.failures} consecutive failures"
+            elif proxy.latency is not None and proxy.latency > self.max_latency:
+                reason = f"latency {proxy.latency:.1f}s > {self.max_latency}s"
+
+            if reason:
+                self._evict(proxy, reason)
+
+    def _evict(self, proxy, reason):
+        """Take a proxy out of rotation and drop its sticky sessions (lock held)"""
+        proxy.evicted_until = time.time() + self.evict_seconds
+        proxy.failures = 0
+        proxy.latency = None
+        stale = [key for key, url in self.sessions.items() if url == proxy.url]
+        for key in stale:
+            del self.sessions[key]
+        logger.warning(f"Evicted {proxy} for {self.evict_seconds}s: {reason}")
+
+    # ── Assignment ───────────────────────────────────────────────────────────
+
+    def acquire(self, session_key):
+        """
+        Return the proxy for a session (account), or None if none is usable.
+
+        Pinned accounts always get their pin while it is healthy. Others keep
+        the proxy they were first given until it is evicted.
+        """
+        key = (session_key or "").lower()
+        now = time.time()
+
+        with self._lock:
+            pinned = self.assignments.get(key)
+            current = self.sessions.get(key)
+            if pinned and self.proxies[pinned].is_available(now):
+                proxy = self.proxies[pinned]
+            elif current and self.proxies[current].is_available(now):
+                proxy = self.proxies[current]
+            else:
+                pinned_urls = set(self.assignments.values())
+                candidates = [p for url, p in self.proxies.items()
+                              if p.is_available(now) and url not in pinned_urls]
+                if not candidates:
+                    candidates = [p for p in self.proxies.values() if p.is_available(now)]
+                if not candidates:
+                    return None
+                proxy = candidates[self._next % len(candidates)]
+                self._next += 1
+            self.sessions[key] = proxy.url
+
+        # Health-check lazily when a proxy is first handed out or gets stale
+        if now - proxy.last_checked > self.evict_seconds and not self.check(proxy):
+            return self.acquire(session_key)
+        return proxy
+
+    def release(self, session_key):
+        """Drop a session's sticky assignment"""
+        with self._lock:
+            self.sessions.pop((session_key or "").lower(), None)
+
+
+def _parse_assignments(value):
+    assignments = {}
+    for part in (value or "").split(","):
+        if "=" in part:
+            account, url = part.split("=", 1)
+            if account.strip() and url.strip():
+                assignments[account.strip()] = url.strip()
+    return assignments
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_proxy_pool():
+    """Process-wide pool built from the environment, or None if no proxies are configured"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            urls = [u.strip() for u in os.getenv("PROXY_POOL", "").split(",") if u.strip()]
+            assignments = _parse_assignments(os.getenv("PROXY_ASSIGNMENTS"))
+            if not urls and not assignments:
+                return None
+            _pool = ProxyPool(
+                urls,
+                assignments=assignments,
+                health_url=os.getenv("PROXY_HEALTH_URL", DEFAULT_HEALTH_URL),
+                max_latency=float(os.getenv("PROXY_MAX_LATENCY", "8")),
+            )
+            logger.info(f"Proxy pool configured with {len(_pool)} proxies")
+        return _pool
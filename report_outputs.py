@@ -0,0 +1,78 @@
+"""
+Machine-readable copies of the IDOO report.
+
+create_new_report() writes the styled workbook for people; systems that only
+want the data can ask for plain files instead, written straight from the
+DataFrames without touching openpyxl:
+
+    <stem>.report.<ext>   filtered RT POS rows (the "report" sheet)
+    <stem>.stock.<ext>    catalog allocations (the "stock_quantity" sheet)
+
+OUTPUT_FORMATS picks the outputs per run, comma-separated from xlsx, csv,
+parquet and jsonl (default "xlsx"). Leaving xlsx out skips the workbook.
+Parquet needs pyarrow (or fastparquet), which is not in requirements.txt;
+without it the parquet output is skipped with a warning.
+"""
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("xlsx", "csv", "parquet", "jsonl")
+DATA_FORMATS = ("csv", "parquet", "jsonl")
+
+CSV_CHUNK_ROWS = 10000
+
+
+def output_formats(value=None):
+    """Requested formats, in FORMATS order; unknown names are logged and ignored"""
+    value = value if value is not None else os.getenv("OUTPUT_FORMATS", "xlsx")
+    requested = {f.strip().lower() for f in value.split(",") if f.strip()}
+    for unknown in sorted(requested - set(FORMATS)):
+        logger.warning(f"Unknown output format {unknown!r}, expected one of {', '.join(FORMATS)}")
+    formats = [f for f in FORMATS if f in requested]
+    return formats or ["xlsx"]
+
+
+def _parquet_available():
+    for engine in ("pyarrow", "fastparquet"):
+        try:
+            __import__(engine)
+            return True
+        except ImportError:
+            continue
+    return False
+
+
+def write_frame(df, path, fmt):
+    if fmt == "csv":
+        df.to_csv(path, index=False, chunksize=CSV_CHUNK_ROWS)
+    elif fmt == "jsonl":
+        df.to_json(path, orient="records", lines=True, date_format="iso")
+    elif fmt == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        raise ValueError(f"Not a data format: {fmt}")
+
+
+def write_data_outputs(frames, base_path, formats):
+    """
+    Write each named DataFrame in every requested data format.
+
+    frames maps a name ("report", "stock") to a DataFrame; files are named
+    <base_path>.<name>.<ext>. Returns the paths written.
+    """
+    paths = []
+    for fmt in formats:
+        if fmt not in DATA_FORMATS:
+            continue
+        if fmt == "parquet" and not _parquet_available():
+            logger.warning("Parquet output needs pyarrow or fastparquet, skipping it")
+            continue
+        for name, df in frames.items():
+            path = f"{base_path}.{name}.{fmt}"
+            write_frame(df, path, fmt)
+            paths.append(path)
+            logger.info(f"Wrote {len(df)} {name} rows to {os.path.basename(path)}")
+    return paths
@@ -0,0 +1,194 @@
+"""
+Retry policy engine with per-host circuit breakers.
+
+Every flaky step (logins, frame navigation, catalog clicks) runs through
+retry_call() with a RetryPolicy: an attempt and time budget plus jittered
+exponential backoff. Failures are counted per host; once a host fails
+repeatedly its circuit opens and further calls raise CircuitOpenError right
+away, so an account is abandoned early instead of burning the full retry
+budget on every step while a site is down.
+
+Usage:
+    retry_call("catalog click", click_catalog, NAV_POLICY, host=TMO_HOST,
+               on_retry=lambda attempt, error: reload_frameset(driver))
+"""
+
+import time
+import random
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RetryError(Exception):
+    """An operation failed on every attempt its policy allowed"""
+
+    def __init__(self, operation, attempts, last_error):
+        super().__init__(f"{operation} failed after {attempts} attempt(s): {last_error}")
+        self.operation = operation
+        self.attempts = attempts
+        self.last_error = last_error
+
+
+class CircuitOpenError(Exception):
+    """The host's circuit is open; the caller should give up on this account"""
+
+
+class RetryPolicy:
+    """Attempt/time budget and backoff for one kind of operation"""
+
+    def __init__(self, attempts=3, base_delay=2.0, max_delay=30.0, budget=None, jitter=0.5):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget        # seconds for all attempts together, None = unlimited
+        self.jitter = jitter        # +/- fraction applied to each delay
+
+    def within(self, time_budget):
+        """Copy whose time budget also fits in time_budget (a deadline.Budget), or self when None"""
+        if time_budget is None:
+            return self
+        limit = time_budget.cap(self.budget if self.budget is not None else time_budget.seconds)
+        return RetryPolicy(self.attempts, self.base_delay, self.max_delay, limit, self.jitter)
+
+    def delay(self, attempt):
+        """Backoff before retry number attempt + 1 (attempt is 0-based)"""
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return max(0.0, delay * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed -> open after failure_threshold failures in a row; open -> half-open
+    after reset_timeout, where a single trial call decides whether to close
+    again or re-open.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=120):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.time() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        if self.state == "open":
+            remaining = self.reset_timeout - (time.time() - self.opened_at)
+            raise CircuitOpenError(f"{self.name} circuit is open ({remaining:.0f}s until retry)")
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"{self.name} circuit closed")
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.error(f"{self.name} circuit opened after {self.failures} consecutive failures")
+                self.opened_at = time.time()
+
+
+# Default budgets per operation type
+LOGIN_POLICY = RetryPolicy(attempts=3, base_delay=3, max_delay=30, budget=240)
+NAV_POLICY = RetryPolicy(attempts=3, base_delay=3, max_delay=20, budget=90)
+CLICK_POLICY = RetryPolicy(attempts=3, base_delay=2, max_delay=10, budget=60)
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(host):
+    """Shared circuit breaker for a host"""
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+def retry_call(operation, fn, policy, host=None, on_retry=None, retry_on=Exception, give_up_on=()):
+    """
+    Run fn(attempt) until it returns without raising, within the policy budget.
+
+    Args:
+        operation: name used in logs and errors
+        fn: callable taking the 0-based attempt number; raise to signal failure
+        policy: RetryPolicy
+        host: host whose circuit breaker (and politeness rate) is updated
+        on_retry: optional callable(attempt, error) run before the next attempt,
+                  e.g. to refresh the page; its own errors are logged and ignored
+        retry_on: exception type(s) worth another attempt; anything else is
+                  re-raised at once
+        give_up_on: exception type(s) re-raised at once without counting
+                    against the host, e.g. a rejected password
+
+    Raises:
+        CircuitOpenError: the host's circuit is open
+        RetryError: every attempt failed or the time budget ran out
+    """
+    from politeness import get_scheduler
+    from log_pipeline import log_context
+
+    breaker = get_breaker(host) if host else None
+    start = time.time()
+    last_error = None
+
+    for attempt in range(policy.attempts):
+        if breaker:
+            breaker.before_call()
+        try:
+            with log_context(attempt=attempt + 1):
+                result = fn(attempt)
+        except CircuitOpenError:
+            raise
+        except give_up_on:
+            raise
+        except Exception as e:
+            last_error = e
+            if breaker:
+                breaker.record_failure()
+            if host:
+                get_scheduler().record_failure(host)
+            if not isinstance(e, retry_on):
+                raise
+            logger.warning(f"{operation} attempt {attempt + 1}/{policy.attempts} failed: {e}")
+        else:
+            if breaker:
+                breaker.record_success()
+            if host:
+                get_scheduler().record_success(host)
+            return result
+
+        if attempt == policy.attempts - 1:
+            break
+
+        delay = policy.delay(attempt)
+        if policy.budget is not None and time.time() - start + delay > policy.budget:
+            logger.warning(f"{operation}: retry budget of {policy.budget}s exhausted")
+            break
+        if breaker:
+            breaker.before_call()
+
+        time.sleep(delay)
+        if on_retry:
+            try:
+                on_retry(attempt, last_error)
+            except Exception as e:
+                logger.warning(f"{operation} recovery step failed: {e}")
+
+    raise RetryError(operation, attempt + 1, last_error)
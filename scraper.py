@@ -1,27 +1,41 @@
+"""
+T-Mobile dealer catalog allocations + RT POS reorder export -> IDOO workbook.
+
+Importing this module has no side effects and loads no heavy packages:
+pandas and Selenium are imported inside the stages that use them, and
+logging/.env are set up by the entry points (cli.py, daemon.py).
+"""
+
 import os
 import time
-import resend
 import logging
 from datetime import datetime
 from glob import glob
-from dotenv import load_dotenv
 import platform
 import subprocess
-import requests
+import threading
 import json
 import traceback
-
-import pandas as pd
-from pandas import DataFrame
-
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
-
-
-# Load environment variables
-load_dotenv()
+from contextlib import contextmanager, nullcontext
+
+from history_store import open_store, RunRecorder
+from artifact_store import get_artifact_store
+from proxy_pool import get_proxy_pool
+from politeness import get_scheduler, TMO_HOST, RTPOS_HOST
+from deadline import RunDeadline, CATALOG_SHARE, RTPOS_SHARE
+from driver_watchdog import run_watched
+import diagnostics
+import page_metrics
+from log_pipeline import configure as configure_logging, log_context, SkuLog
+from tmo_catalog import (
+    TMO_LOGIN_URL, CATALOG_ITEM_XPATH, CATALOG_SECTIONS,
+    allocation_available, merge_sections, section_nav_xpath,
+)
+from profiling import profile_stage
+from retry import (
+    retry_call, RetryPolicy, RetryError, CircuitOpenError,
+    LOGIN_POLICY, NAV_POLICY, CLICK_POLICY
+)
 
 
 class WebhookHandler(logging.Handler):
@@ -52,35 +66,57 @@ class WebhookHandler(logging.Handler):
                         "text": f"ðŸš¨ *{self.service_name} Error*\n```{log_entry}```"
                     }
 
+                import requests
                 requests.post(self.webhook_url, json=payload, timeout=5)
             except Exception:
                 pass
 
 
 def setup_logging():
-    """Setup local and remote logging"""
-    handlers = [
-        logging.FileHandler('scraper.log'),
-        logging.StreamHandler()
-    ]
+    """Setup local and remote logging (queued; JSON lines in scraper.log)"""
+    handlers = []
 
     webhook_url = os.getenv('WEBHOOK_URL')
     if webhook_url:
-        handlers.append(WebhookHandler(webhook_url))
+        webhook = WebhookHandler(webhook_url)
+        webhook.setLevel(logging.ERROR)
+        handlers.append(webhook)
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=handlers
-    )
+    configure_logging('scraper.log', extra_handlers=handlers)
     return logging.getLogger(__name__)
 
 
-logger = setup_logging()
-logger.info(f"Scraper starting on {platform.node()}")
+logger = logging.getLogger(__name__)
 
 root_path = os.getcwd()
 
+RTPOS_LOGIN_URL = "https://www.myrtpos.com/newbdi/index.fwx"
+RTPOS_REPORT_URL = "https://www.myrtpos.com/newbdi/reorder_custom2.fwx"
+REPORT_FILE_NAME = "ReOrder Custom Report.xlsx"
+
+
+PRIMARY_DAY_WINDOW = 7
+
+
+def get_day_windows():
+    """
+    Day windows to export from RT POS, e.g. RTPOS_DAY_WINDOWS="7,14,30".
+    The 7-day window always comes first since it drives the formatted sheet.
+    """
+    windows = [PRIMARY_DAY_WINDOW]
+    for part in os.getenv('RTPOS_DAY_WINDOWS', '').split(','):
+        part = part.strip()
+        if part.isdigit() and int(part) > 0 and int(part) not in windows:
+            windows.append(int(part))
+    return windows
+
+
+def report_file_name(days):
+    """Export file name for a day window (the primary window keeps the legacy name)"""
+    if days == PRIMARY_DAY_WINDOW:
+        return REPORT_FILE_NAME
+    return f"ReOrder Custom Report {days}d.xlsx"
+
 
 def cleanup_chrome_processes():
     """Clean up any hanging Chrome processes"""
@@ -104,12 +140,16 @@ def create_download_directory():
     return os.path.abspath(download_dir)
 
 
-def wait_for_download(dir_path, target_name="ReOrder Custom Report.xlsx", timeout=240):
+def wait_for_download(dir_path, target_name=REPORT_FILE_NAME, timeout=240, known_files=None):
     """
     Wait for a download to complete in dir_path.
     Handles headless Chrome (GitHub Actions) where files may land with
     a different name or after a slight delay.
+
+    Files listed in known_files existed before the export was clicked and
+    are never treated as the new download.
     """
+    known_files = known_files or set()
     start = time.time()
     final_path = os.path.join(dir_path, target_name)
     logger.info(f"Waiting for download in: {dir_path}")
@@ -129,12 +169,15 @@ def wait_for_download(dir_path, target_name="ReOrder Custom Report.xlsx", timeou
             continue
 
         # Already have the target file
-        if os.path.exists(final_path) and os.path.getsize(final_path) > 0:
+        if final_path not in known_files and os.path.exists(final_path) and os.path.getsize(final_path) > 0:
             logger.info(f"Download complete: {final_path} ({os.path.getsize(final_path)} bytes)")
             return final_path
 
         # Look for any new xlsx file and rename it
-        xlsxs = sorted(glob(os.path.join(dir_path, "*.xlsx")), key=os.path.getmtime, reverse=True)
+        xlsxs = sorted(
+            [f for f in glob(os.path.join(dir_path, "*.xlsx")) if f not in known_files],
+            key=os.path.getmtime, reverse=True
+        )
         if xlsxs:
             newest = xlsxs[0]
             try:
@@ -156,7 +199,74 @@ def wait_for_download(dir_path, target_name="ReOrder Custom Report.xlsx", timeou
     return None
 
 
-def driverinitialize(use_proxy=False):
+def select_proxy(session_key):
+    """Sticky proxy for a session from the configured pool, or None"""
+    pool = get_proxy_pool()
+    if not pool:
+        logger.info("Proxy requested but PROXY_POOL is not configured - connecting directly")
+        return None
+
+    proxy = pool.acquire(session_key)
+    if not proxy:
+        logger.warning("No healthy proxy available - connecting directly")
+        return None
+
+    if proxy.has_credentials:
+        logger.warning(f"{proxy} has credentials; Chrome ignores them in --proxy-server, use IP allow-listing")
+    logger.info(f"Using proxy {proxy} for session {session_key}")
+    return proxy
+
+
+class PageUnavailable(Exception):
+    """A login page didn't load or render its form (connection, proxy or navigation)"""
+
+
+class LoginRejected(Exception):
+    """The site answered the login but sent us back to the form (credentials, lockout)"""
+
+
+def navigation_failed(error):
+    """Whether a login failure points at the connection rather than the account"""
+    from selenium.common.exceptions import WebDriverException, TimeoutException
+
+    if isinstance(error, RetryError):
+        error = error.last_error
+    if isinstance(error, (PageUnavailable, TimeoutException)):
+        return True
+    # Chrome reports unreachable hosts and proxy errors as net::ERR_* on get()
+    return isinstance(error, WebDriverException) and "net::ERR_" in str(error)
+
+
+def report_proxy(driver, ok, error=None):
+    """
+    Feed a login outcome back to the proxy pool so failing proxies get evicted.
+
+    Only connection and navigation failures count against the proxy: a
+    rejected password says nothing about it.
+    """
+    proxy = getattr(driver, "proxy", None)
+    pool = get_proxy_pool()
+    if not proxy or not pool:
+        return
+    if ok or navigation_failed(error):
+        pool.report(proxy, ok)
+
+
+# Browsers launched ahead of time by the daemon (daemon.BrowserPool), or None
+_warm_pool = None
+
+# undetected_chromedriver patches the chromedriver binary on every launch,
+# so launches from different threads (the warm pool's, a phase's) must not overlap
+_uc_launch_lock = threading.Lock()
+
+
+def set_warm_pool(pool):
+    """Serve driverinitialize() from pre-launched browsers (daemon mode)"""
+    global _warm_pool
+    _warm_pool = pool
+
+
+def driverinitialize(use_proxy=False, session_key=None, warm=True):
     """
     Initialize Chrome driver.
 
@@ -165,11 +275,50 @@ def driverinitialize(use_proxy=False):
     undetected_chromedriver will auto match the installed Chrome version.
     Fallback uses Selenium Manager (Selenium 4.6+) to auto provision driver.
     Detects headless environment (GitHub Actions, Docker, etc.)
+
+    With use_proxy, the session (keyed by session_key, usually the account)
+    is routed through a sticky proxy from the pool in proxy_pool.py.
+
+    SESSION_RECORD_DIR records the session; SESSION_REPLAY_DIR serves a
+    recorded one instead of starting Chrome (session_replay.py).
+
+    Each session downloads into its own job directory from the artifact
+    store, available as driver.download_dir.
+
+    DRIVER_BACKEND=cdp drives Chrome over the DevTools Protocol directly
+    (cdp_driver.py), falling back to the chromedriver paths if it can't start.
+
+    In daemon mode a browser pre-launched for session_key with the same
+    use_proxy is used when one is available (warm=False forces a fresh
+    launch), and Chrome processes are not killed first since other warm
+    browsers are running.
     """
-    dl_dir = create_download_directory()
+    import session_replay   # pulls in selenium
+
+    replaying = session_replay.replay_dir()
+
+    # A warm browser already has its own job directory
+    if _warm_pool is not None and warm and not replaying:
+        driver = _warm_pool.take(session_key, use_proxy)
+        if driver is not None:
+            logger.info(f"Using warm browser for {session_key}")
+            return driver
+
+    dl_dir = get_artifact_store().job_dir(session_key or "session")
     logger.info(f"Downloads will save to: {dl_dir}")
 
-    cleanup_chrome_processes()
+    # Offline run from a recorded session (see session_replay.py)
+    if replaying:
+        driver = session_replay.open_replay(session_key, dl_dir)
+        driver.proxy = None
+        driver.download_dir = dl_dir
+        driver.diagnostics = diagnostics.SessionDiagnostics(driver, session_key or "session")
+        return driver
+
+    if _warm_pool is None:
+        cleanup_chrome_processes()
+
+    proxy = select_proxy(session_key) if use_proxy else None
 
     prefs = {
         "download.default_directory": dl_dir,
@@ -184,6 +333,22 @@ def driverinitialize(use_proxy=False):
     if is_headless_env:
         logger.info("Headless environment detected (GitHub Actions/CI) - using headless mode")
 
+    # Chrome driven over CDP directly, without chromedriver (see cdp_driver.py)
+    if os.getenv("DRIVER_BACKEND", "").lower() == "cdp":
+        try:
+            import cdp_driver
+
+            driver = session_replay.wrap_for_recording(
+                cdp_driver.launch(dl_dir, headless=is_headless_env, proxy=proxy), session_key, dl_dir)
+            driver.proxy = proxy
+            driver.download_dir = dl_dir
+            driver.diagnostics = diagnostics.SessionDiagnostics(driver, session_key or "session")
+            driver.implicitly_wait(10)
+            logger.info("CDP driver initialized successfully")
+            return driver
+        except Exception as e:
+            logger.error(f"CDP driver init failed, falling back to undetected Chrome. Error: {e}")
+
     try:
         import undetected_chromedriver as uc
 
@@ -198,8 +363,16 @@ def driverinitialize(use_proxy=False):
         chrome_options.add_argument("--disable-gpu")
         chrome_options.add_argument("--disable-blink-features=AutomationControlled")
         chrome_options.add_experimental_option("prefs", prefs)
+        chrome_options.set_capability("goog:loggingPrefs", diagnostics.logging_prefs())
+        if proxy:
+            chrome_options.add_argument(f"--proxy-server={proxy.server_arg}")
 
-        driver = uc.Chrome(options=chrome_options)
+        with _uc_launch_lock:
+            uc_driver = uc.Chrome(options=chrome_options)
+        driver = session_replay.wrap_for_recording(uc_driver, session_key, dl_dir)
+        driver.proxy = proxy
+        driver.download_dir = dl_dir
+        driver.diagnostics = diagnostics.SessionDiagnostics(driver, session_key or "session")
 
         driver.implicitly_wait(10)
 
@@ -238,8 +411,14 @@ def driverinitialize(use_proxy=False):
             chrome_options.add_experimental_option("prefs", prefs)
             chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
             chrome_options.add_experimental_option("useAutomationExtension", False)
+            chrome_options.set_capability("goog:loggingPrefs", diagnostics.logging_prefs())
+            if proxy:
+                chrome_options.add_argument(f"--proxy-server={proxy.server_arg}")
 
-            driver = webdriver.Chrome(options=chrome_options)
+            driver = session_replay.wrap_for_recording(webdriver.Chrome(options=chrome_options), session_key, dl_dir)
+            driver.proxy = proxy
+            driver.download_dir = dl_dir
+            driver.diagnostics = diagnostics.SessionDiagnostics(driver, session_key or "session")
 
             driver.implicitly_wait(10)
 
@@ -262,8 +441,14 @@ def driverinitialize(use_proxy=False):
             raise
 
 
-def wait_for_element(driver, xpath, timeout=10, condition=EC.presence_of_element_located):
-    """Wait for element with proper error handling"""
+def wait_for_element(driver, xpath, timeout=10, condition=None):
+    """Wait for element with proper error handling (default condition: presence)"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+
+    condition = condition or EC.presence_of_element_located
     try:
         element = WebDriverWait(driver, timeout).until(
             condition((By.XPATH, xpath))
@@ -277,479 +462,1087 @@ def wait_for_element(driver, xpath, timeout=10, condition=EC.presence_of_element
         return None
 
 
-def do_login(driver, user_id, password, max_retries=3):
-    """Login with improved error handling and retry logic"""
-    for attempt in range(max_retries):
-        try:
-            logger.info(f"Login attempt {attempt + 1}/{max_retries}")
+def do_login(driver, user_id, password, max_retries=3, time_budget=None):
+    """
+    Login with improved error handling and retry logic.
 
-            driver.get("https://www.t-mobiledealerordering.com/b2b_tmo/init.do")
-            time.sleep(3)
+    Holds one of the dealer site's login slots; attempts, backoff and the
+    site's circuit breaker are handled by retry_call(). A rejected password
+    is not retried: another try would only risk locking the account.
+    Retries stop when time_budget (the catalog phase's Budget) runs out.
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.common.exceptions import NoSuchElementException
 
-            userid_field = wait_for_element(driver, '//input[@id="userid"]', timeout=15)
-            if not userid_field:
-                logger.error("Login form not found")
-                continue
+    scheduler = get_scheduler()
+
+    def attempt_login(attempt):
+        logger.info(f"Login attempt {attempt + 1}/{max_retries}")
+
+        scheduler.get(driver, TMO_LOGIN_URL)
+        time.sleep(3)
 
-            userid_field.clear()
+        userid_field = wait_for_element(driver, '//input[@id="userid"]', timeout=15)
+        if not userid_field:
+            raise PageUnavailable("Login form not found")
+
+        userid_field.clear()
+        time.sleep(0.5)
+        userid_field.send_keys(user_id)
+
+        password_field = wait_for_element(driver, '//input[@id="password"]')
+        if password_field:
+            password_field.clear()
             time.sleep(0.5)
-            userid_field.send_keys(user_id)
+            password_field.send_keys(password)
+
+        agree_checkbox = wait_for_element(driver, '//input[@name="AgreeTerms"]')
+        if agree_checkbox:
+            agree_checkbox.click()
+            time.sleep(1)
 
-            password_field = wait_for_element(driver, '//input[@id="password"]')
-            if password_field:
-                password_field.clear()
-                time.sleep(0.5)
-                password_field.send_keys(password)
+        login_button = wait_for_element(driver, '//a[@name="login"]')
+        if login_button:
+            login_button.click()
+            time.sleep(5)
 
-            agree_checkbox = wait_for_element(driver, '//input[@name="AgreeTerms"]')
-            if agree_checkbox:
-                agree_checkbox.click()
+        for _ in range(25):
+            try:
+                driver.find_element(By.XPATH, '//frameset[@id="isaTopFS"]')
+                page_metrics.sample(driver, "tmo_login")
+                return True
+            except NoSuchElementException:
                 time.sleep(1)
 
-            login_button = wait_for_element(driver, '//a[@name="login"]')
-            if login_button:
-                login_button.click()
-                time.sleep(5)
+        if driver.find_elements(By.XPATH, '//input[@id="userid"]'):
+            raise LoginRejected("Login form came back after submitting - credentials may be wrong")
+        raise Exception("Frameset did not appear after submitting the login form")
 
-            for _ in range(25):
-                try:
-                    driver.find_element(By.XPATH, '//frameset[@id="isaTopFS"]')
-                    logger.info("Login successful!")
-                    return True
-                except NoSuchElementException:
-                    time.sleep(1)
+    policy = RetryPolicy(attempts=max_retries, base_delay=LOGIN_POLICY.base_delay,
+                         max_delay=LOGIN_POLICY.max_delay, budget=LOGIN_POLICY.budget).within(time_budget)
+    try:
+        with scheduler.login_slot(TMO_HOST):
+            retry_call("Login", attempt_login, policy, host=TMO_HOST, give_up_on=LoginRejected)
+        logger.info("Login successful!")
+        report_proxy(driver, True)
+        return True
+    except LoginRejected as e:
+        logger.error(f"Login rejected, not retrying: {e}")
+        return False
+    except (RetryError, CircuitOpenError) as e:
+        logger.error(f"All login attempts failed: {e}")
+        report_proxy(driver, False, e)
+        return False
 
-            logger.warning(f"Login attempt {attempt + 1} failed")
 
-            if attempt < max_retries - 1:
-                logger.info("Refreshing page and retrying...")
-                driver.refresh()
-                time.sleep(5)
+def reload_frameset(driver, home_url):
+    """Reload the logged-in frameset (recovery step between navigation retries)"""
+    driver.switch_to.default_content()
+    get_scheduler().get(driver, home_url)
+    time.sleep(3)
 
-        except Exception as e:
-            logger.error(f"Error during login attempt {attempt + 1}: {e}")
-            if attempt < max_retries - 1:
-                time.sleep(5)
 
-    logger.error("All login attempts failed")
-    return False
+def open_catalog(driver, home_url, time_budget=None):
+    """
+    Navigate isaTop/header -> catalog view -> isaTop/form_input.
+
+    Each step is retried through retry_call() with its own recovery action,
+    for no longer than time_budget allows.
+    Raises RetryError or CircuitOpenError when the catalog can't be reached,
+    so the caller abandons the account instead of carrying on in the wrong frame.
+    """
+    retry_call(
+        "Frame navigation",
+        lambda attempt: enter_catalog_frame(driver, "header"),
+        NAV_POLICY.within(time_budget), host=TMO_HOST,
+        on_retry=lambda attempt, error: reload_frameset(driver, home_url)
+    )
+
+    def click_catalog(attempt):
+        from selenium.webdriver.common.by import By
 
+        enter_catalog_frame(driver, "header")
+        driver.find_element(By.XPATH, '//a[@onclick="show_catalog_view()"]').click()
+
+    retry_call(
+        "Catalog button", click_catalog, CLICK_POLICY.within(time_budget), host=TMO_HOST,
+        on_retry=lambda attempt, error: reload_frameset(driver, home_url)
+    )
+    logger.info("Clicked catalog view button")
+
+    def recover_form_frame(attempt, error):
+        try:
+            click_catalog(attempt)
+        except Exception:
+            reload_frameset(driver, home_url)
+            click_catalog(attempt)
+
+    retry_call(
+        "Form frame", lambda attempt: enter_catalog_frame(driver, "form_input"),
+        NAV_POLICY.within(time_budget), host=TMO_HOST, on_retry=recover_form_frame
+    )
+    logger.info("Successfully navigated to form_input frame")
+    page_metrics.sample(driver, "catalog_view")
 
-def download_report(report_user_id, report_password):
-    """Download report with improved error handling"""
-    report_driver = None
+
+def wait_for_catalog_items(driver, timeout=20, poll_interval=1):
+    """
+    Wait until the catalog item list is rendered and its size stops changing.
+    Replaces the fixed sleeps after catalog clicks; returns the item count.
+    """
+    from selenium.webdriver.common.by import By
+
+    driver.implicitly_wait(0)
     try:
-        report_driver = driverinitialize()
+        end = time.time() + timeout
+        last_count = -1
+        while time.time() < end:
+            count = len(driver.find_elements(By.XPATH, CATALOG_ITEM_XPATH))
+            if count > 0 and count == last_count:
+                return count
+            last_count = count
+            time.sleep(poll_interval)
+        return max(last_count, 0)
+    finally:
+        driver.implicitly_wait(10)
 
-        report_driver.set_page_load_timeout(300)
-        report_driver.implicitly_wait(30)
 
-        login_success = False
-        for attempt in range(3):
-            try:
-                report_driver.get("https://www.myrtpos.com/newbdi/index.fwx")
-                time.sleep(5)
+def extract_catalog_items(driver, section_name):
+    """Return [(sku, available_qty)] for items with allocation in the current section"""
+    from selenium.webdriver.common.by import By
 
-                userid_field = wait_for_element(report_driver, '//input[@name="secUserID"]')
-                if userid_field:
-                    userid_field.clear()
-                    userid_field.send_keys(report_user_id)
+    items = []
+    sku_log = SkuLog(logger, section_name)
+    nodes = driver.find_elements(By.XPATH, CATALOG_ITEM_XPATH)
 
-                password_field = wait_for_element(report_driver, '//input[@name="secPassword"]')
-                if password_field:
-                    password_field.clear()
-                    password_field.send_keys(report_password)
+    for node in nodes:
+        try:
+            node_sku = node.find_element(By.XPATH, './/div[@class="cat-prd-id"]').get_attribute("innerText").strip()
+            qty_text = node.find_element(By.XPATH, './/td[@class="cat-prd-qty"]').get_attribute("innerText").strip()
+            node_allocation_available_qty = allocation_available(qty_text)
 
-                login_button = wait_for_element(report_driver, '//input[@value="Login"]')
-                if login_button:
-                    login_button.click()
-                    time.sleep(5)
+            if int(node_allocation_available_qty) > 0:
+                sku_log.added(node_sku)
+                items.append((node_sku, node_allocation_available_qty))
+        except Exception as e:
+            logger.error(f"Error processing {section_name} node: {e}")
+            continue
 
-                time.sleep(3)
+    sku_log.summary()
+    return items
 
-                # Navigate directly to report URL - if not logged in it will redirect back to login
-                logger.info("Navigating directly to reorder_custom2.fwx...")
-                report_driver.get("https://www.myrtpos.com/newbdi/reorder_custom2.fwx")
-                time.sleep(5)
 
-                # Now verify: if we got redirected back to login page, login failed
-                if "index.fwx" in report_driver.current_url or "secUserID" in report_driver.page_source:
-                    raise Exception("Redirected back to login - credentials may be wrong or session not established")
+def enter_catalog_frame(driver, frame_name):
+    """Switch from the top-level document into isaTop/<frame_name>"""
+    driver.switch_to.default_content()
+    driver.switch_to.frame("isaTop")
+    driver.switch_to.frame(frame_name)
 
-                login_success = True
-                logger.info("RT POS login successful")
-                break
 
-            except Exception as e:
-                if attempt < 2:
-                    logger.warning(f"RT POS login attempt {attempt + 1} failed: {e}")
-                    screenshot_path = os.path.join(create_download_directory(), f"rtpos_error_{report_user_id}_{attempt}.png")
-                    try:
-                        report_driver.save_screenshot(screenshot_path)
-                        logger.info(f"Error screenshot saved to: {screenshot_path}")
-                    except Exception:
-                        pass
-                    continue
-                logger.error(f"RT POS login failed after 3 attempts: {e}")
+def open_section_tab(driver, home_url):
+    """Open the logged-in frameset in a new tab and start loading the catalog"""
+    from selenium.webdriver.common.by import By
 
-        if not login_success:
-            logger.error("Failed to login to RT POS after 3 attempts")
+    driver.switch_to.new_window('tab')
+    get_scheduler().get(driver, home_url)
+    enter_catalog_frame(driver, "header")
+    driver.find_element(By.XPATH, '//a[@onclick="show_catalog_view()"]').click()
+    return driver.current_window_handle
+
+
+def click_section_link(driver, section, timeout=30):
+    """Click a section's nav link inside the form_input frame (does not wait for items)"""
+    end = time.time() + timeout
+    while True:
+        try:
+            enter_catalog_frame(driver, "form_input")
+            link = wait_for_element(driver, section_nav_xpath(section["nav_label"]), timeout=5)
+            if link:
+                link.click()
+                return True
+        except Exception as e:
+            logger.debug(f"{section['name']} link not ready: {type(e).__name__}")
+        if time.time() >= end:
             return False
+        time.sleep(1)
 
-        time.sleep(5)
 
-        days_field = wait_for_element(report_driver, '//input[@name="frmDays"]')
-        if days_field:
-            days_field.click()
-            time.sleep(0.5)
-            days_field.clear()
-            time.sleep(1)
-            days_field.send_keys("7")
-            time.sleep(1)
-            logger.info("Set days to 7")
+def harvest_catalog_sections(driver, home_url, sections=None, time_budget=None):
+    """
+    Harvest allocations from every catalog section.
 
-        logger.info("Looking for Generate button...")
-        generate_button = wait_for_element(report_driver, '//span[contains(text(),"Generate")]')
+    The driver must already be in the form_input frame showing the default
+    (first) section. Every other section is opened in its own tab of the same
+    logged-in session and all tabs load at once, so the catalog phase takes
+    about as long as the slowest section rather than the sum of them.
+    A section whose tab fails is retried in the main tab, the old way.
+    Waits are capped by time_budget; once it runs out, failed sections are
+    skipped instead of retried.
 
-        if not generate_button:
-            logger.error("Generate button not found")
-            return False
+    Returns [(section, sku, qty)], de-duplicated by SKU (first section wins).
+    """
+    sections = sections or CATALOG_SECTIONS
+
+    def capped(timeout):
+        return time_budget.cap(timeout) if time_budget else timeout
 
-        logger.info("Clicking Generate button...")
-        clicked = False
+    main_handle = driver.current_window_handle
+    default_section, extra_sections = sections[0], sections[1:]
+
+    # Kick off every extra section in its own tab before extracting anything
+    opened = []
+    pending = []
+    for section in extra_sections:
         try:
-            generate_button.click()
-            clicked = True
-        except Exception:
+            opened.append((section, open_section_tab(driver, home_url)))
+            logger.info(f"Opened {section['name']} section in a new tab")
+        except Exception as e:
+            logger.warning(f"Could not open tab for {section['name']} section: {e}")
+            pending.append(section)
             try:
-                report_driver.execute_script("arguments[0].click();", generate_button)
-                clicked = True
+                if driver.current_window_handle != main_handle:
+                    driver.close()
             except Exception:
-                clicked = False
+                pass
+            driver.switch_to.window(main_handle)
 
-        if not clicked:
-            logger.error("Failed to click Generate button")
-            return False
+    tabs = []
+    for section, handle in opened:
+        driver.switch_to.window(handle)
+        if click_section_link(driver, section, timeout=capped(30)):
+            tabs.append((section, handle))
+        else:
+            logger.warning(f"{section['name']} link not found in its tab")
+            pending.append(section)
+            driver.close()
+
+    # Default section is already loaded in the main tab
+    harvested = {}
+    driver.switch_to.window(main_handle)
+    enter_catalog_frame(driver, "form_input")
+    wait_for_catalog_items(driver, timeout=capped(20))
+    page_metrics.sample(driver, f"catalog_{default_section['name']}")
+    harvested[default_section["name"]] = extract_catalog_items(driver, default_section["name"])
+
+    for section, handle in tabs:
+        try:
+            driver.switch_to.window(handle)
+            enter_catalog_frame(driver, "form_input")
+            wait_for_catalog_items(driver, timeout=capped(20))
+            page_metrics.sample(driver, f"catalog_{section['name']}")
+            harvested[section["name"]] = extract_catalog_items(driver, section["name"])
+        except Exception as e:
+            logger.warning(f"{section['name']} tab harvest failed: {e}")
+            diagnostics.mark(driver, f"section_{section['name']}_failed")
+            pending.append(section)
+        finally:
+            try:
+                driver.close()
+            except Exception:
+                pass
 
-        logger.info("Form submitted, waiting for report generation...")
-        time.sleep(5)
+    driver.switch_to.window(main_handle)
+    enter_catalog_frame(driver, "form_input")
 
-        max_wait_time = 300
-        poll_interval = 3
-        elapsed_time = 0
+    # Sections whose tab failed fall back to clicking through in the main tab
+    for section in pending:
+        if time_budget and time_budget.expired() and not time_budget.critical:
+            logger.warning(f"Catalog budget used up, skipping the {section['name']} section")
+            continue
+        if click_section_link(driver, section, timeout=capped(10)):
+            wait_for_catalog_items(driver, timeout=capped(20))
+            page_metrics.sample(driver, f"catalog_{section['name']}")
+            harvested[section["name"]] = extract_catalog_items(driver, section["name"])
+        else:
+            logger.warning(f"{section['name']} section not available, skipping")
 
-        while elapsed_time < max_wait_time:
-            try:
-                # First confirm data rows are actually present before touching export
-                data_rows = report_driver.find_elements(By.XPATH, '//tr[contains(@class,"dx-row dx-data-row")] | //td[contains(@class,"dx-cell")]')
-                has_data = len(data_rows) > 0
+    return merge_sections(sections, harvested)
 
-                if has_data:
-                    # Now check the export button is visible and enabled
-                    export_buttons = report_driver.find_elements(By.XPATH, '//i[@class="dx-icon dx-icon-export-excel-button"]')
-                    visible_buttons = [b for b in export_buttons if b.is_displayed()]
 
-                    if visible_buttons:
-                        export_button = visible_buttons[0]
-                        logger.info(f"Report data ready, export button visible after {elapsed_time} seconds")
+def generate_and_export(report_driver, days, target_name, time_budget=None):
+    """
+    Generate the reorder grid for one day window on a logged-in RT POS page
+    and export it to <session download dir>/<target_name>.
 
-                        logger.info("Clicking Excel export button...")
-                        try:
-                            export_button.click()
-                        except Exception:
-                            report_driver.execute_script("arguments[0].click();", export_button)
-
-                        time.sleep(3)
-
-                        dl_dir = create_download_directory()
-                        logger.info(f"Waiting for download to complete in: {dl_dir}")
-                        downloaded = wait_for_download(dl_dir)
-
-                        if downloaded:
-                            logger.info(f"Report downloaded successfully: {downloaded}")
-                            return True
-                        else:
-                            logger.error("Download did not complete within timeout - trying CDP fallback")
-                            try:
-                                export_buttons = report_driver.find_elements(By.XPATH, '//i[@class="dx-icon dx-icon-export-excel-button"]')
-                                visible_buttons = [b for b in export_buttons if b.is_displayed()]
-                                if visible_buttons:
-                                    report_driver.execute_script("arguments[0].click();", visible_buttons[0])
-                                time.sleep(3)
-                                downloaded = wait_for_download(dl_dir, timeout=120)
-                                if downloaded:
-                                    logger.info(f"Report downloaded on retry: {downloaded}")
-                                    return True
-                            except Exception as retry_err:
-                                logger.error(f"Export retry failed: {retry_err}")
-                            return False
+    Report and download waits are capped by time_budget when given.
+    Returns the downloaded file path, or None on failure.
+    """
+    from selenium.webdriver.common.by import By
+    import session_replay
+
+    def capped(timeout):
+        return time_budget.cap(timeout) if time_budget else timeout
+
+    days_field = wait_for_element(report_driver, '//input[@name="frmDays"]')
+    if days_field:
+        days_field.click()
+        time.sleep(0.5)
+        days_field.clear()
+        time.sleep(1)
+        days_field.send_keys(str(days))
+        time.sleep(1)
+        logger.info(f"Set days to {days}")
+
+    logger.info("Looking for Generate button...")
+    generate_button = wait_for_element(report_driver, '//span[contains(text(),"Generate")]')
+
+    if not generate_button:
+        logger.error("Generate button not found")
+        return None
 
-            except Exception as e:
-                logger.debug(f"Polling check at {elapsed_time}s: {type(e).__name__}")
+    logger.info("Clicking Generate button...")
+    clicked = False
+    try:
+        generate_button.click()
+        clicked = True
+    except Exception:
+        try:
+            report_driver.execute_script("arguments[0].click();", generate_button)
+            clicked = True
+        except Exception:
+            clicked = False
 
-            time.sleep(poll_interval)
-            elapsed_time += poll_interval
+    if not clicked:
+        logger.error("Failed to click Generate button")
+        return None
+
+    logger.info("Form submitted, waiting for report generation...")
+    diagnostics.mark(report_driver, f"generate_{days}d")
+    time.sleep(5)
 
-            if elapsed_time % 30 == 0:
-                logger.info(f"Still waiting for report... ({elapsed_time} seconds elapsed)")
+    max_wait_time = capped(300)
+    poll_interval = 3
+    elapsed_time = 0
 
-        logger.error(f"Report generation timed out after {max_wait_time} seconds")
+    while elapsed_time < max_wait_time:
         try:
-            report_driver.save_screenshot(f"report_timeout_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
-        except Exception:
-            pass
+            # First confirm data rows are actually present before touching export
+            data_rows = report_driver.find_elements(By.XPATH, '//tr[contains(@class,"dx-row dx-data-row")] | //td[contains(@class,"dx-cell")]')
+            has_data = len(data_rows) > 0
+
+            if has_data:
+                # Now check the export button is visible and enabled
+                export_buttons = report_driver.find_elements(By.XPATH, '//i[@class="dx-icon dx-icon-export-excel-button"]')
+                visible_buttons = [b for b in export_buttons if b.is_displayed()]
+
+                if visible_buttons:
+                    export_button = visible_buttons[0]
+                    logger.info(f"Report data ready, export button visible after {elapsed_time} seconds")
+                    page_metrics.sample(report_driver, f"rtpos_grid_{days}d")
+
+                    # Snapshot existing files so an older export (or a previous
+                    # window's file) is never picked up as this download
+                    dl_dir = report_driver.download_dir
+                    known_files = set(glob(os.path.join(dl_dir, "*.xlsx")))
+
+                    logger.info("Clicking Excel export button...")
+                    try:
+                        export_button.click()
+                    except Exception:
+                        report_driver.execute_script("arguments[0].click();", export_button)
+
+                    time.sleep(3)
+
+                    logger.info(f"Waiting for download to complete in: {dl_dir}")
+                    downloaded = wait_for_download(dl_dir, target_name, timeout=capped(240), known_files=known_files)
+
+                    if downloaded:
+                        logger.info(f"Report downloaded successfully: {downloaded}")
+                        session_replay.note_download(report_driver, downloaded)
+                        page_metrics.sample(report_driver, f"rtpos_export_{days}d")
+                        return downloaded
+                    else:
+                        logger.error("Download did not complete within timeout - trying CDP fallback")
+                        try:
+                            export_buttons = report_driver.find_elements(By.XPATH, '//i[@class="dx-icon dx-icon-export-excel-button"]')
+                            visible_buttons = [b for b in export_buttons if b.is_displayed()]
+                            if visible_buttons:
+                                report_driver.execute_script("arguments[0].click();", visible_buttons[0])
+                            time.sleep(3)
+                            downloaded = wait_for_download(dl_dir, target_name, timeout=capped(120), known_files=known_files)
+                            if downloaded:
+                                logger.info(f"Report downloaded on retry: {downloaded}")
+                                session_replay.note_download(report_driver, downloaded)
+                                return downloaded
+                        except Exception as retry_err:
+                            logger.error(f"Export retry failed: {retry_err}")
+                        return None
+
+        except Exception as e:
+            logger.debug(f"Polling check at {elapsed_time}s: {type(e).__name__}")
+
+        time.sleep(poll_interval)
+        elapsed_time += poll_interval
+
+        if elapsed_time % 30 == 0:
+            logger.info(f"Still waiting for report... ({elapsed_time} seconds elapsed)")
+
+    logger.error(f"Report generation timed out after {max_wait_time} seconds")
+    diagnostics.mark(report_driver, f"report_timeout_{days}d")
+    return None
+
+
+def rtpos_login(report_driver, report_user_id, report_password):
+    """
+    Log into RT POS and land on the reorder report page; returns True on success.
+
+    Like do_login(), a rejected password is not retried.
+    """
+    scheduler = get_scheduler()
+
+    def attempt_login(attempt):
+        scheduler.get(report_driver, RTPOS_LOGIN_URL)
+        time.sleep(5)
+
+        userid_field = wait_for_element(report_driver, '//input[@name="secUserID"]')
+        if not userid_field:
+            raise PageUnavailable("RT POS login form not found")
+        userid_field.clear()
+        userid_field.send_keys(report_user_id)
+
+        password_field = wait_for_element(report_driver, '//input[@name="secPassword"]')
+        if password_field:
+            password_field.clear()
+            password_field.send_keys(report_password)
+
+        login_button = wait_for_element(report_driver, '//input[@value="Login"]')
+        if login_button:
+            login_button.click()
+            time.sleep(5)
+
+        time.sleep(3)
+
+        # Navigate directly to report URL - if not logged in it will redirect back to login
+        logger.info("Navigating directly to reorder_custom2.fwx...")
+        scheduler.get(report_driver, RTPOS_REPORT_URL)
+        time.sleep(5)
+
+        # Now verify: if we got redirected back to login page, login failed
+        if "index.fwx" in report_driver.current_url or "secUserID" in report_driver.page_source:
+            raise LoginRejected("Redirected back to login - credentials may be wrong or session not established")
+
+    try:
+        with scheduler.login_slot(RTPOS_HOST):
+            retry_call("RT POS login", attempt_login, LOGIN_POLICY, host=RTPOS_HOST, give_up_on=LoginRejected,
+                       on_retry=lambda attempt, error: diagnostics.mark(report_driver, f"rtpos_login_failed_{attempt}"))
+        logger.info("RT POS login successful")
+        report_proxy(report_driver, True)
+        diagnostics.mark(report_driver, "rtpos_report_page")
+        page_metrics.sample(report_driver, "rtpos_report_page")
+        return True
+    except LoginRejected as e:
+        logger.error(f"RT POS login rejected, not retrying: {e}")
+        return False
+    except (RetryError, CircuitOpenError) as e:
+        logger.error(f"Failed to login to RT POS: {e}")
+        report_proxy(report_driver, False, e)
         return False
 
+
+@contextmanager
+def timed_phase(history, name):
+    """
+    history.phase(name) when history is recorded, else a no-op yielding a
+    status dict. Browser page-load samples taken inside go to status["page_loads"].
+    """
+    with (history.phase(name) if history else nullcontext({})) as status, page_metrics.collect_into(status):
+        yield status
+
+
+def download_report(report_user_id, report_password, day_windows=None, time_budget=None, history=None,
+                    account=None, run_date=None):
+    """
+    Download report with improved error handling.
+
+    All day windows are generated one after another on the same logged-in
+    session, so each extra window only costs grid generation time. Each
+    export is moved into the artifact store as "rtpos_export_<days>d" for
+    account (default report_user_id). Returns {days: stored path} when the
+    primary (first) window was downloaded, otherwise False.
+
+    With a time_budget, waits are capped by it and extra windows are dropped
+    when the time left wouldn't comfortably cover another one. The browser
+    runs under a driver watchdog; if it has to be recycled the export starts
+    over on a fresh browser.
+
+    With a history RunRecorder, the login and each window's generation are
+    recorded as phases (rtpos_login, rtpos_generate_<days>d).
+    """
+    day_windows = day_windows or get_day_windows()
+    account = account or report_user_id
+
+    def export_phase(report_driver):
+        exports = {}
+        try:
+            report_driver.set_page_load_timeout(300)
+            report_driver.implicitly_wait(30)
+
+            with timed_phase(history, "rtpos_login") as phase:
+                if not rtpos_login(report_driver, report_user_id, report_password):
+                    phase["outcome"] = "failed"
+                    diagnostics.capture_failure(report_driver, "rtpos_login")
+                    return False
+
+            time.sleep(5)
+
+            primary_start = time.time()
+            for index, days in enumerate(day_windows):
+                target_name = report_file_name(days)
+                if index > 0 and time_budget and time_budget.remaining() < 1.5 * (time.time() - primary_start) / index:
+                    logger.warning(f"Not enough time left for the {days}-day window, skipping remaining windows")
+                    break
+                if index > 0:
+                    # Reload the report page on the warm session so the grid from
+                    # the previous window can't be mistaken for fresh data
+                    logger.info(f"Generating additional {days}-day window on the same session")
+                    get_scheduler().get(report_driver, RTPOS_REPORT_URL)
+                    time.sleep(3)
+
+                with timed_phase(history, f"rtpos_generate_{days}d") as phase:
+                    downloaded = generate_and_export(report_driver, days, target_name, time_budget=time_budget)
+                    if not downloaded:
+                        phase["outcome"] = "failed"
+                if not downloaded:
+                    if index == 0:
+                        diagnostics.capture_failure(report_driver, "rtpos_export")
+                        return False
+                    logger.warning(f"{days}-day window export failed, continuing without it")
+                    continue
+                exports[days] = get_artifact_store().put(
+                    downloaded, account, f"rtpos_export_{days}d", run_date=run_date
+                )
+
+            return exports
+
+        except Exception as e:
+            logger.error(f"Error downloading report: {e}")
+            diagnostics.capture_failure(report_driver, "rtpos_export", e)
+            return False
+
+    try:
+        return run_watched(
+            "RT POS export",
+            lambda: driverinitialize(use_proxy=True, session_key=report_user_id),
+            export_phase
+        )
     except Exception as e:
         logger.error(f"Error downloading report: {e}")
         return False
     finally:
-        if report_driver:
-            try:
-                report_driver.quit()
-                logger.info("Report browser closed")
-            except Exception as e:
-                logger.error(f"Error closing report driver: {e}")
+        logger.info("Report browser closed")
 
 
-def create_new_report(ids, stock_data_rows, subject, output_file, account_label):
-    """Create new report with enhanced formatting and account-specific filtering"""
-    try:
-        from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+REPORT_COLUMNS = [
+    'Market', 'StoreID', 'Store Name', 'Manufacturer',
+    'Item Number', 'Item Description', 'On Hand', 'On PO',
+    '7 Days', 'Item Cost', 'Total Qty', 'Suggested'
+]
 
-        download_dir = create_download_directory()
-        file_path = os.path.join(download_dir, "ReOrder Custom Report.xlsx")
 
-        if not os.path.exists(file_path):
-            logger.error("Report file not found")
-            return False
+def parse_reorder_export(file_path, ids, days=PRIMARY_DAY_WINDOW):
+    """
+    Parse an RT POS reorder export into one row per store and item.
 
-        df = pd.read_excel(file_path)
-        market = ""
-        store_id = ""
-        store_name = ""
-        datarows = []
+    Market / StoreID / Store Name come from the group header rows that precede
+    each store's items. Only items in ids are kept. The sales column is named
+    "<days> Days".
+    """
+    import pandas as pd
+
+    df = pd.read_excel(file_path)
+    market = ""
+    store_id = ""
+    store_name = ""
+    datarows = []
+
+    has_on_hand = 'On Hand' in df.columns
+    has_on_po = 'On PO' in df.columns
+
+    sales_column = f"{days} Days"
+    if sales_column not in df.columns:
+        candidates = [c for c in df.columns if str(c).endswith(" Days")]
+        if candidates:
+            logger.warning(f"'{sales_column}' column not in export, using '{candidates[0]}'")
+            sales_column = candidates[0]
+
+    for _, row in df.iterrows():
+        data_row = row.to_dict()
+        item_number = str(data_row.get("Item Number"))
+
+        if item_number == "nan":
+            manufacturer = str(data_row.get("Manufacturer"))
+            if manufacturer == "nan":
+                continue
+            if "Market" in manufacturer:
+                market = manufacturer.replace("Market:", "").strip()
+            elif "StoreID" in manufacturer:
+                store_id = manufacturer.replace("StoreID:", "").strip()
+            elif "Store Name" in manufacturer:
+                store_name = manufacturer.replace("Store Name:", "").strip()
+            continue
 
-        has_on_hand = 'On Hand' in df.columns
-        has_on_po = 'On PO' in df.columns
+        if item_number not in ids:
+            continue
 
-        for _, row in df.iterrows():
-            data_row = row.to_dict()
-            item_number = str(data_row.get("Item Number"))
+        on_hand = data_row.get("On Hand") if has_on_hand else ""
+        on_po = data_row.get("On PO") if has_on_po else ""
 
-            if item_number == "nan":
-                manufacturer = str(data_row.get("Manufacturer"))
-                if manufacturer == "nan":
-                    continue
-                if "Market" in manufacturer:
-                    market = manufacturer.replace("Market:", "").strip()
-                elif "StoreID" in manufacturer:
-                    store_id = manufacturer.replace("StoreID:", "").strip()
-                elif "Store Name" in manufacturer:
-                    store_name = manufacturer.replace("Store Name:", "").strip()
-                continue
+        datarow = [
+            market, store_id, store_name,
+            data_row.get("Manufacturer"), item_number,
+            data_row.get("Item Description"),
+            on_hand, on_po,
+            data_row.get(sales_column), data_row.get("Item Cost"),
+            data_row.get("Total Qty"), data_row.get("Suggested")
+        ]
+        datarows.append(datarow)
+
+    columns = list(REPORT_COLUMNS)
+    columns[columns.index('7 Days')] = f"{days} Days"
+    return pd.DataFrame(datarows, columns=columns)
+
+
+def merge_day_windows(out_df, exports, ids):
+    """
+    Merge the extra day-window exports ({days: path}) into out_df, keyed by
+    store and item.
+
+    Each window adds a "<days> Days" column after "7 Days". Windows whose
+    export is missing are skipped. Returns (merged_df, export_paths_used).
+    """
+    used_files = []
+    insert_at = out_df.columns.get_loc('7 Days') + 1
+
+    for days in get_day_windows()[1:]:
+        window_path = exports.get(days)
+        if not window_path or not os.path.exists(window_path):
+            logger.warning(f"No export found for the {days}-day window, skipping")
+            continue
+
+        column = f"{days} Days"
+        window_df = parse_reorder_export(window_path, ids, days=days)
+        window_df = window_df[['StoreID', 'Item Number', column]].drop_duplicates(
+            subset=['StoreID', 'Item Number']
+        )
+        out_df = out_df.merge(window_df, on=['StoreID', 'Item Number'], how='left')
+        columns = [c for c in out_df.columns if c != column]
+        columns.insert(insert_at, column)
+        out_df = out_df[columns]
+        insert_at += 1
+        used_files.append(window_path)
+        logger.info(f"Merged {days}-day window ({len(window_df)} store/item rows)")
+
+    return out_df, used_files
+
+
+def style_distribution_sheet(worksheet):
+    """Borders, store banding, formulas and merged per-store totals on the distribution sheet"""
+    from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+
+    thin_border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+
+    center_alignment = Alignment(horizontal='center', vertical='center')
+
+    orange_fill = PatternFill(start_color='FFA500', end_color='FFA500', fill_type='solid')
+    light_blue_fill = PatternFill(start_color='ADD8E6', end_color='ADD8E6', fill_type='solid')
+    white_fill = PatternFill(start_color='FFFFFF', end_color='FFFFFF', fill_type='solid')
+
+    red_font = Font(color='FF0000')
+
+    max_row = worksheet.max_row
+
+    worksheet.column_dimensions['A'].width = 10.00
+    worksheet.column_dimensions['B'].width = 10.00
+    worksheet.column_dimensions['C'].width = 20.00
+    worksheet.column_dimensions['D'].width = 15.00
+    worksheet.column_dimensions['E'].width = 30.00
+    worksheet.column_dimensions['F'].width = 10.00
+    worksheet.column_dimensions['G'].width = 10.00
+    worksheet.column_dimensions['H'].width = 10.00
+    worksheet.column_dimensions['I'].width = 10.00
+    worksheet.column_dimensions['J'].width = 10.00
+    worksheet.column_dimensions['K'].width = 10.00
+    worksheet.column_dimensions['L'].width = 10.00
+    worksheet.column_dimensions['M'].width = 10.00
+    worksheet.column_dimensions['N'].width = 10.00
+    worksheet.column_dimensions['O'].width = 10.00
+    worksheet.column_dimensions['P'].width = 10.00
+
+    current_store = None
+    use_blue = True
+
+    for row in range(1, max_row + 1):
+        for col in range(1, 17):
+            cell = worksheet.cell(row=row, column=col)
+            cell.border = thin_border
+            cell.alignment = center_alignment
+
+            if col in [15, 16]:
+                cell.fill = orange_fill
+
+            if col == 16 and row > 1:
+                cell.font = red_font
+                cell.value = f'=O{row}-N{row}'
+
+            if col == 3 and row > 1:
+                store_val = cell.value
+                if store_val != current_store:
+                    current_store = store_val
+                    use_blue = not use_blue
+
+                for row_col in range(1, 17):
+                    if row_col not in [15, 16]:
+                        worksheet.cell(row=row, column=row_col).fill = light_blue_fill if use_blue else white_fill
+
+    for row in range(2, max_row + 1):
+        worksheet[f'L{row}'].value = f'=K{row}*A{row}'
+
+    worksheet['L1'].value = f'=SUM(L2:L{max_row})'
+
+    store_groups = []
+    current_store = None
+    start_row = 2
+
+    for row in range(2, max_row + 1):
+        store_val = worksheet[f'C{row}'].value
+        if store_val != current_store:
+            if current_store is not None:
+                store_groups.append((current_store, start_row, row - 1))
+            current_store = store_val
+            start_row = row
+
+    if current_store is not None:
+        store_groups.append((current_store, start_row, max_row))
+
+    for _, start_row, end_row in store_groups:
+        if start_row < end_row:
+            worksheet.merge_cells(f'N{start_row}:N{end_row}')
+            worksheet.merge_cells(f'O{start_row}:O{end_row}')
+            worksheet.merge_cells(f'P{start_row}:P{end_row}')
+
+        worksheet[f'N{start_row}'].value = f'=SUM(L{start_row}:L{end_row})'
+        worksheet[f'N{start_row}'].alignment = center_alignment
+        worksheet[f'N{start_row}'].border = thin_border
+
+        worksheet[f'O{start_row}'].alignment = center_alignment
+        worksheet[f'O{start_row}'].border = thin_border
+        worksheet[f'O{start_row}'].fill = orange_fill
+
+        worksheet[f'P{start_row}'].value = f'=O{start_row}-N{start_row}'
+        worksheet[f'P{start_row}'].alignment = center_alignment
+        worksheet[f'P{start_row}'].border = thin_border
+        worksheet[f'P{start_row}'].font = red_font
+        worksheet[f'P{start_row}'].fill = orange_fill
+
+    for col in range(1, 17):
+        header_cell = worksheet.cell(row=1, column=col)
+        header_cell.font = Font(bold=True)
+        header_cell.border = thin_border
+        header_cell.alignment = center_alignment
+        if col not in [15, 16]:
+            header_cell.fill = white_fill
+
+
+def distribution_cached_values(formatted_df):
+    """
+    Results of the distribution sheet's formulas, computed from the DataFrame:
+    line totals (L = K*A), per-store totals (N = SUM(L)), differences
+    (P = O-N) and the grand total in L1. Returns {cell: value}.
+    """
+    import pandas as pd
+
+    cost = pd.to_numeric(formatted_df['Item Cost'], errors='coerce').fillna(0)
+    qty = pd.to_numeric(formatted_df['Qty'], errors='coerce').fillna(0)
+    line_totals = (qty * cost).tolist()
+
+    values = {f'L{index + 2}': total for index, total in enumerate(line_totals)}
+    values['L1'] = sum(line_totals)
+
+    # Same grouping as style_distribution_sheet: runs of consecutive rows per store
+    stores = formatted_df['Store Name'].fillna('').reset_index(drop=True)
+    runs = (stores != stores.shift()).cumsum()
+    for _, positions in stores.groupby(runs).groups.items():
+        start_row = positions[0] + 2
+        store_total = sum(line_totals[positions[0]:positions[-1] + 1])
+        values[f'N{start_row}'] = store_total
+        values[f'P{start_row}'] = 0 - store_total   # "Your Total" (O) is filled in by hand
+    return values
 
-            if item_number not in ids:
-                continue
 
-            on_hand = data_row.get("On Hand") if has_on_hand else ""
-            on_po = data_row.get("On PO") if has_on_po else ""
-
-            datarow = [
-                market, store_id, store_name,
-                data_row.get("Manufacturer"), item_number,
-                data_row.get("Item Description"),
-                on_hand, on_po,
-                data_row.get("7 Days"), data_row.get("Item Cost"),
-                data_row.get("Total Qty"), data_row.get("Suggested")
-            ]
-            datarows.append(datarow)
-
-        if not datarows:
-            logger.warning("No matching items found in report")
+def store_order_values(out_df, qty_column='Suggested'):
+    """[(store, qty * item cost)] per store in report order, plus the overall total"""
+    import pandas as pd
+
+    value = (
+        pd.to_numeric(out_df[qty_column], errors='coerce').fillna(0)
+        * pd.to_numeric(out_df['Item Cost'], errors='coerce').fillna(0)
+    )
+    per_store = value.groupby(out_df['Store Name'], sort=False).sum()
+    return [(store, float(total)) for store, total in per_store.items()], float(value.sum())
+
+
+def create_new_report(ids, stock_data_rows, subject, output_file, account_label, exports, history=None,
+                      formats=None, totals=None):
+    """
+    Create new report with enhanced formatting and account-specific filtering.
+
+    exports maps each day window to its RT POS export (as returned by
+    download_report); the exports are left in place.
+
+    formats (default OUTPUT_FORMATS, see report_outputs.py) adds CSV, Parquet
+    or JSON Lines copies of the report and stock rows; without "xlsx" the
+    styled workbook is not built. REPORT_SHARD_BY ("market" or "stores")
+    splits the workbook, see write_sharded_report(). Returns the paths
+    written, or False.
+
+    If a history RunRecorder is passed, the filtered report rows are appended
+    to the local history store. If a totals dict is passed, it is filled with
+    the suggested order value per store for the email.
+    """
+    import pandas as pd
+    from account_rules import compile_rules, load_rules
+    from report_outputs import output_formats, write_data_outputs
+
+    formats = output_formats(formats)
+
+    try:
+        download_dir = create_download_directory()
+        file_path = exports.get(PRIMARY_DAY_WINDOW)
+
+        if not file_path or not os.path.exists(file_path):
+            logger.error("Report file not found")
             return False
 
-        out_df = DataFrame(datarows, columns=[
-            'Market', 'StoreID', 'Store Name', 'Manufacturer',
-            'Item Number', 'Item Description', 'On Hand', 'On PO',
-            '7 Days', 'Item Cost', 'Total Qty', 'Suggested'
-        ])
-        out_df.drop_duplicates(inplace=True)
-
-        # Apply account-specific filtering
-        logger.info(f"Applying filters for account: {account_label}")
-        
-        # Filter by account type
-        if 'PHILLY' in account_label.upper():
-            # IOTPHILLY: Remove BAWA market
-            out_df = out_df[out_df['Market'] != 'BAWA']
-            logger.info("IOTPHILLY: Removed BAWA market")
-        elif 'BAWA' in account_label.upper():
-            # IOTBAWA: Keep only BAWA market
-            out_df = out_df[out_df['Market'] == 'BAWA']
-            logger.info("IOTBAWA: Kept only BAWA market (removed DELAWARE, PHILADELPHIA, PPUSHERS)")
-        
-        # Remove "PHILLY - HUB" store from all accounts
-        out_df = out_df[out_df['Store Name'] != 'PHILLY - HUB']
-        logger.info("Removed 'PHILLY - HUB' store")
-        
+        with profile_stage("parse_export"):
+            out_df = parse_reorder_export(file_path, ids)
+            if out_df.empty:
+                logger.warning("No matching items found in report")
+                return False
+
+            # Add a sales column per extra day window exported on the same session
+            out_df, _ = merge_day_windows(out_df, exports, ids)
+            out_df.drop_duplicates(inplace=True)
+
+        # Apply account-specific filtering (rules in account_rules.py)
+        with profile_stage("filter"):
+            account_filter = compile_rules(account_label, load_rules())
+            rows_before = len(out_df)
+            out_df = account_filter.apply(out_df)
+            logger.info(f"Filters for {account_label} ({account_filter.describe()}): "
+                        f"kept {len(out_df)} of {rows_before} rows")
+
         # Check if we still have data after filtering
         if out_df.empty:
             logger.warning("No data remaining after filtering")
             return False
 
-        formatted_df = out_df.copy()
-        formatted_df = formatted_df.drop(columns=['StoreID', 'Manufacturer'])
+        if history:
+            history.reorder_rows(out_df)
 
-        cols = formatted_df.columns.tolist()
-        item_cost_col = cols.pop(7)
-        cols.insert(0, item_cost_col)
-        formatted_df = formatted_df[cols]
+        if totals is not None:
+            totals['stores'], totals['total'] = store_order_values(out_df)
 
-        formatted_df.columns = [
-            'Item Cost', 'Market', 'Store Name', 'Item Number', 'Item Description',
-            'On Hand', 'On PO', '7 Days', 'Total Qty', 'Suggested'
-        ]
+        stock_df = pd.DataFrame(stock_data_rows, columns=['SKU', 'Quantity'])
+        output_path = os.path.join(download_dir, output_file)
+        outputs = []
 
-        formatted_df['Qty'] = 0
-        formatted_df['0'] = 0
-        formatted_df['Shipping'] = ''
-        formatted_df['Total'] = ''
-        formatted_df['Your Total'] = ''
-        formatted_df['Difference'] = ''
+        if "xlsx" in formats:
+            shard_by = os.getenv("REPORT_SHARD_BY", "").strip().lower()
+            if shard_by:
+                outputs += write_sharded_report(out_df, stock_df, output_path, shard_by,
+                                                mode=os.getenv("REPORT_SHARD_MODE", "files").strip().lower())
+            else:
+                outputs.append(write_workbook(out_df, stock_df, output_path))
 
-        stock_df = pd.DataFrame(stock_data_rows, columns=['SKU', 'Quantity'])
+        with profile_stage("write_data"):
+            outputs += write_data_outputs(
+                {"report": out_df, "stock": stock_df}, os.path.splitext(output_path)[0], formats
+            )
 
-        output_path = os.path.join(download_dir, output_file)
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+        return outputs
+
+    except Exception as e:
+        logger.error(f"Error creating report: {e}")
+        logger.error(traceback.format_exc())
+        return False
+
+
+DISTRIBUTION_SHEET = "Phone distribution idoo"
+
+
+def distribution_frame(out_df):
+    """The "Phone distribution idoo" layout of the report rows"""
+    formatted_df = out_df[REPORT_COLUMNS].copy()
+    formatted_df = formatted_df.drop(columns=['StoreID', 'Manufacturer'])
+
+    cols = formatted_df.columns.tolist()
+    item_cost_col = cols.pop(7)
+    cols.insert(0, item_cost_col)
+    formatted_df = formatted_df[cols]
+
+    formatted_df.columns = [
+        'Item Cost', 'Market', 'Store Name', 'Item Number', 'Item Description',
+        'On Hand', 'On PO', '7 Days', 'Total Qty', 'Suggested'
+    ]
+
+    formatted_df['Qty'] = 0
+    formatted_df['0'] = 0
+    formatted_df['Shipping'] = ''
+    formatted_df['Total'] = ''
+    formatted_df['Your Total'] = ''
+    formatted_df['Difference'] = ''
+    return formatted_df
+
+
+def write_workbook(out_df, stock_df, output_path, sheet_groups=None):
+    """
+    Write the IDOO workbook: report, styled distribution sheet, stock_quantity.
+
+    sheet_groups ([(sheet name, rows)]) writes one distribution sheet per
+    group instead of a single one.
+    """
+    import pandas as pd
+
+    sheet_groups = sheet_groups or [(DISTRIBUTION_SHEET, out_df)]
+    distribution = [(name, distribution_frame(rows)) for name, rows in sheet_groups]
+
+    writer = pd.ExcelWriter(output_path, engine='openpyxl')
+    try:
+        with profile_stage("write_sheets"):
             out_df.to_excel(writer, sheet_name="report", index=False)
-            formatted_df.to_excel(writer, sheet_name="Phone distribution idoo", index=False)
+            for name, formatted_df in distribution:
+                formatted_df.to_excel(writer, sheet_name=name, index=False)
             stock_df.to_excel(writer, sheet_name="stock_quantity", index=False)
 
-            workbook = writer.book
-            worksheet = workbook["Phone distribution idoo"]
+        with profile_stage("styling"):
+            for name, _ in distribution:
+                style_distribution_sheet(writer.book[name])
+    finally:
+        with profile_stage("save_workbook"):
+            writer.close()
 
-            thin_border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
+    # Formula results for readers that don't recalculate (pandas, previews)
+    with profile_stage("cache_formulas"):
+        from xlsx_cache import write_cached_values
+        for name, formatted_df in distribution:
+            write_cached_values(output_path, name, distribution_cached_values(formatted_df))
 
-            center_alignment = Alignment(horizontal='center', vertical='center')
-
-            orange_fill = PatternFill(start_color='FFA500', end_color='FFA500', fill_type='solid')
-            light_blue_fill = PatternFill(start_color='ADD8E6', end_color='ADD8E6', fill_type='solid')
-            white_fill = PatternFill(start_color='FFFFFF', end_color='FFFFFF', fill_type='solid')
-
-            red_font = Font(color='FF0000')
-
-            max_row = worksheet.max_row
-
-            worksheet.column_dimensions['A'].width = 10.00
-            worksheet.column_dimensions['B'].width = 10.00
-            worksheet.column_dimensions['C'].width = 20.00
-            worksheet.column_dimensions['D'].width = 15.00
-            worksheet.column_dimensions['E'].width = 30.00
-            worksheet.column_dimensions['F'].width = 10.00
-            worksheet.column_dimensions['G'].width = 10.00
-            worksheet.column_dimensions['H'].width = 10.00
-            worksheet.column_dimensions['I'].width = 10.00
-            worksheet.column_dimensions['J'].width = 10.00
-            worksheet.column_dimensions['K'].width = 10.00
-            worksheet.column_dimensions['L'].width = 10.00
-            worksheet.column_dimensions['M'].width = 10.00
-            worksheet.column_dimensions['N'].width = 10.00
-            worksheet.column_dimensions['O'].width = 10.00
-            worksheet.column_dimensions['P'].width = 10.00
-
-            current_store = None
-            use_blue = True
-
-            for row in range(1, max_row + 1):
-                for col in range(1, 17):
-                    cell = worksheet.cell(row=row, column=col)
-                    cell.border = thin_border
-                    cell.alignment = center_alignment
-
-                    if col in [15, 16]:
-                        cell.fill = orange_fill
-
-                    if col == 16 and row > 1:
-                        cell.font = red_font
-                        cell.value = f'=O{row}-N{row}'
-
-                    if col == 3 and row > 1:
-                        store_val = cell.value
-                        if store_val != current_store:
-                            current_store = store_val
-                            use_blue = not use_blue
-
-                        for row_col in range(1, 17):
-                            if row_col not in [15, 16]:
-                                worksheet.cell(row=row, column=row_col).fill = light_blue_fill if use_blue else white_fill
-
-            for row in range(2, max_row + 1):
-                worksheet[f'L{row}'].value = f'=K{row}*A{row}'
-
-            worksheet['L1'].value = f'=SUM(L2:L{max_row})'
-
-            store_groups = []
-            current_store = None
-            start_row = 2
-
-            for row in range(2, max_row + 1):
-                store_val = worksheet[f'C{row}'].value
-                if store_val != current_store:
-                    if current_store is not None:
-                        store_groups.append((current_store, start_row, row - 1))
-                    current_store = store_val
-                    start_row = row
+    logger.info("Enhanced Excel file created successfully")
+    return output_path
 
-            if current_store is not None:
-                store_groups.append((current_store, start_row, max_row))
-
-            for _, start_row, end_row in store_groups:
-                if start_row < end_row:
-                    worksheet.merge_cells(f'N{start_row}:N{end_row}')
-                    worksheet.merge_cells(f'O{start_row}:O{end_row}')
-                    worksheet.merge_cells(f'P{start_row}:P{end_row}')
-
-                worksheet[f'N{start_row}'].value = f'=SUM(L{start_row}:L{end_row})'
-                worksheet[f'N{start_row}'].alignment = center_alignment
-                worksheet[f'N{start_row}'].border = thin_border
-
-                worksheet[f'O{start_row}'].alignment = center_alignment
-                worksheet[f'O{start_row}'].border = thin_border
-                worksheet[f'O{start_row}'].fill = orange_fill
-
-                worksheet[f'P{start_row}'].value = f'=O{start_row}-N{start_row}'
-                worksheet[f'P{start_row}'].alignment = center_alignment
-                worksheet[f'P{start_row}'].border = thin_border
-                worksheet[f'P{start_row}'].font = red_font
-                worksheet[f'P{start_row}'].fill = orange_fill
-
-            for col in range(1, 17):
-                header_cell = worksheet.cell(row=1, column=col)
-                header_cell.font = Font(bold=True)
-                header_cell.border = thin_border
-                header_cell.alignment = center_alignment
-                if col not in [15, 16]:
-                    header_cell.fill = white_fill
-
-        logger.info("Enhanced Excel file created successfully")
 
-        try:
-            os.remove(file_path)
-        except Exception as e:
-            logger.error(f"Error removing original file: {e}")
+def shard_report(out_df, shard_by, stores_per_shard=10):
+    """
+    Split the report rows into [(shard name, rows)] in report order.
 
-        return True
+    shard_by "market" gives one shard per Market; "stores" gives runs of
+    stores_per_shard stores each.
+    """
+    if shard_by == "market":
+        return [(str(market), rows) for market, rows in out_df.groupby('Market', sort=False)]
+    if shard_by == "stores":
+        stores = list(dict.fromkeys(out_df['Store Name']))
+        shards = []
+        for index in range(0, len(stores), stores_per_shard):
+            chunk = stores[index:index + stores_per_shard]
+            shards.append((f"Stores {index // stores_per_shard + 1:02d}", out_df[out_df['Store Name'].isin(chunk)]))
+        return shards
+    raise ValueError(f"Unknown shard key {shard_by!r}, expected 'market' or 'stores'")
+
+
+def _slug(name):
+    return "".join(c if c.isalnum() else "-" for c in name).strip("-").upper() or "SHARD"
+
+
+def _unique_names(names, reserved=(), max_length=None):
+    """Make names unique (case-insensitively, and apart from reserved) by adding -2, -3, ... on a clash"""
+    taken = {name.lower() for name in reserved}
+    unique = []
+    for name in names:
+        candidate, count = name[:max_length], 1
+        while candidate.lower() in taken:
+            count += 1
+            suffix = f"-{count}"
+            candidate = name[:max_length - len(suffix) if max_length else None] + suffix
+        taken.add(candidate.lower())
+        unique.append(candidate)
+    return unique
+
+
+def write_shard_index(index_path, shard_files, stock_df):
+    """Small workbook listing each shard's file (linked), row and store counts"""
+    import pandas as pd
+    from openpyxl.styles import Font
+
+    index_df = pd.DataFrame(
+        [(name, os.path.basename(path), len(rows), rows['Store Name'].nunique(), rows['Item Number'].nunique())
+         for name, path, rows in shard_files],
+        columns=['Shard', 'File', 'Rows', 'Stores', 'Items']
+    )
+    with pd.ExcelWriter(index_path, engine='openpyxl') as writer:
+        index_df.to_excel(writer, sheet_name="index", index=False)
+        stock_df.to_excel(writer, sheet_name="stock_quantity", index=False)
+        sheet = writer.book["index"]
+        for row in range(2, len(index_df) + 2):
+            cell = sheet.cell(row=row, column=2)
+            cell.hyperlink = cell.value
+            cell.font = Font(color='0563C1', underline='single')
+        for column, width in zip("ABCDE", (20, 45, 8, 8, 8)):
+            sheet.column_dimensions[column].width = width
+
+
+def write_sharded_report(out_df, stock_df, output_path, shard_by, mode="files", workers=None):
+    """
+    Write the report split by market or store group.
 
-    except Exception as e:
-        logger.error(f"Error creating report: {e}")
-        logger.error(traceback.format_exc())
-        return False
+    mode "sheets" puts one distribution sheet per shard in output_path.
+    mode "files" builds one workbook per shard (<stem>-<SHARD>.xlsx) in
+    parallel worker processes, and output_path becomes an index workbook
+    linking them. Returns the paths written.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    shards = shard_report(out_df, shard_by, int(os.getenv("REPORT_SHARD_STORES", "10")))
+    logger.info(f"Sharding report by {shard_by}: {len(shards)} shard(s), mode {mode}")
+
+    if mode == "sheets":
+        # Sheet names: 31 characters, no []:*?/\, unique and apart from the fixed sheets
+        names = _unique_names(
+            ["".join(c for c in name if c not in '[]:*?/\\')[:31] or f"Shard {i + 1}"
+             for i, (name, _) in enumerate(shards)],
+            reserved=("report", "stock_quantity"), max_length=31
+        )
+        groups = [(name, rows) for name, (_, rows) in zip(names, shards)]
+        return [write_workbook(out_df, stock_df, output_path, sheet_groups=groups)]
+    if mode != "files":
+        raise ValueError(f"Unknown shard mode {mode!r}, expected 'files' or 'sheets'")
+
+    stem, ext = os.path.splitext(output_path)
+    # "North/East" and "North East" slug alike; two workers must never share a path
+    slugs = _unique_names([_slug(name) for name, _ in shards])
+    shard_files = [(name, f"{stem}-{slug}{ext}", rows) for slug, (name, rows) in zip(slugs, shards)]
+    workers = workers or min(len(shard_files), os.cpu_count() or 1)
+
+    with profile_stage("write_shards"):
+        if workers > 1:
+            # spawn: workers start clean (no inherited log queue or profiler)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+                futures = [pool.submit(write_workbook, rows, stock_df, path) for _, path, rows in shard_files]
+                for future in futures:
+                    future.result()
+        else:
+            for _, path, rows in shard_files:
+                write_workbook(rows, stock_df, path)
+        write_shard_index(output_path, shard_files, stock_df)
+
+    logger.info(f"Wrote {len(shard_files)} shard workbook(s) with {workers} worker(s) and index {os.path.basename(output_path)}")
+    return [output_path] + [path for _, path, _ in shard_files]
 
 
 def safe_quit(driver):
@@ -761,88 +1554,381 @@ def safe_quit(driver):
         pass
 
 
-def send_email_with_attachments(subject, body, attachment_paths, recipient_email):
+def send_email_with_attachments(subject, body, attachment_paths, recipient_email, mailer=None):
     """
-    Send email with multiple Excel attachments using Gmail SMTP
-    
+    Send the reports by email (mailer.py: streamed, split under Gmail's size limit)
+
     Args:
         subject: Email subject
         body: Email body text
         attachment_paths: List of file paths to attach
-        recipient_email: Email address to send to
-    
+        recipient_email: Address, or several separated by commas
+        mailer: Open Mailer to reuse its SMTP connection (one is made otherwise)
+
     Requires environment variables:
     - GMAIL_USER: Your Gmail address
     - GMAIL_APP_PASSWORD: Gmail App Password (not regular password)
     - RECIPIENT_EMAIL: Email address to send reports to
     """
+    from mailer import Mailer
+
+    own_mailer = mailer is None
     try:
-        import smtplib
-        from email.mime.multipart import MIMEMultipart
-        from email.mime.text import MIMEText
-        from email.mime.base import MIMEBase
-        from email import encoders
-        
-        gmail_user = os.getenv('GMAIL_USER')
-        gmail_password = os.getenv('GMAIL_APP_PASSWORD')
-        
-        if not gmail_user or not gmail_password:
+        if own_mailer:
+            mailer = Mailer()
+
+        if not (mailer.user and mailer.password) and mailer.host == "smtp.gmail.com":
             logger.error("Gmail credentials not found in environment variables")
             return False
-        
+
         if not recipient_email:
             logger.warning("No recipient email specified, skipping email")
             return False
-            
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = gmail_user
-        msg['To'] = recipient_email
-        msg['Subject'] = subject
-        
-        # Add body
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # Attach all files
-        attached_count = 0
-        for attachment_path in attachment_paths:
-            if os.path.exists(attachment_path):
-                filename = os.path.basename(attachment_path)
-                with open(attachment_path, 'rb') as attachment:
-                    part = MIMEBase('application', 'octet-stream')
-                    part.set_payload(attachment.read())
-                    encoders.encode_base64(part)
-                    part.add_header('Content-Disposition', f'attachment; filename= {filename}')
-                    msg.attach(part)
-                    attached_count += 1
-                    logger.info(f"Attached file: {filename}")
-            else:
-                logger.warning(f"Attachment file not found: {attachment_path}")
-        
-        if attached_count == 0:
+
+        with profile_stage("email_build"):
+            batches = mailer.prepare(attachment_paths)
+
+        if not batches:
             logger.error("No valid attachments found, not sending email")
             return False
-        
-        # Send email
-        logger.info(f"Sending email with {attached_count} attachment(s) to {recipient_email}...")
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(gmail_user, gmail_password)
-        server.send_message(msg)
-        server.quit()
-        
+
+        attached_count = sum(len(batch) for batch in batches)
+        logger.info(f"Sending email with {attached_count} attachment(s) in {len(batches)} message(s) to {recipient_email}...")
+        with profile_stage("email_send"):
+            mailer.deliver(subject, body, batches, recipient_email)
+
         logger.info(f"Email sent successfully to {recipient_email} with {attached_count} attachment(s)")
         return True
-        
+
     except Exception as e:
         logger.error(f"Failed to send email: {e}")
         logger.error(traceback.format_exc())
         return False
+    finally:
+        if own_mailer and mailer is not None:
+            mailer.close()
+
+
+def email_body_for(summaries, report_count, today_date):
+    """Email text for the given account summaries only (item counts, order and store totals)"""
+    body = """Hello,
+
+Your T-Mobile inventory reports have been generated successfully.
+
+Report Summary:
+"""
+    for summary in summaries:
+        body += f"  • {summary['account']}: {summary['items_with_stock']} items with stock\n"
+
+    body += "\nSuggested order value (Suggested × Item Cost):\n"
+    for summary in summaries:
+        body += f"  {summary['account']}: ${summary['order_total']:,.2f}\n"
+        for store, value in summary['store_totals']:
+            body += f"    - {store}: ${value:,.2f}\n"
+
+    body += f"""
+Date: {today_date}
+Total Reports: {report_count}
+
+Please find the attached Excel reports.
+
+Best regards,
+Automated Inventory System
+"""
+    return body
+
+
+def load_accounts(cred_file="cred.txt"):
+    """Parse cred.txt lines "user|password||report_user|report_password" into account dicts"""
+    accounts = []
+    with open(cred_file, "r") as f:
+        creds = f.read().split("\n")
+
+    for cred in creds:
+        if not cred.strip():
+            continue
+        try:
+            user_part, report_part = cred.split("||")
+            user_id, password = user_part.split("|")
+            report_user_id, report_password = report_part.split("|")
+        except ValueError as e:
+            logger.error(f"Invalid credential format: {e}")
+            continue
+        accounts.append({
+            'user_id': user_id,
+            'password': password,
+            'report_user_id': report_user_id,
+            'report_password': report_password,
+            'label': account_label_for(user_id),
+        })
+    return accounts
+
+
+def account_label_for(user_id):
+    return user_id.upper() if user_id.lower().startswith('iot') else user_id
+
+
+def process_account(account, today_date, budget, history_store=None, history_date=None, critical=True):
+    """
+    Scrape one account end to end: catalog allocations -> RT POS export -> report.
+
+    Returns a summary dict for the email on success, otherwise None. Non-critical
+    accounts are abandoned when their time budget runs out between phases.
+    """
+    user_id = account['user_id']
+    account_label = account['label']
+    output_file = f"IDOO-{account_label}-{today_date}.xlsx"
+
+    logger.info(f"Processing user: {user_id} ({budget})")
+
+    history = RunRecorder(history_store, account_label, history_date) if history_store else None
+    medians = {}
+    if history_store:
+        try:
+            medians = history_store.phase_medians(account_label)
+        except Exception as e:
+            logger.warning(f"Could not read phase medians: {e}")
+
+    def log_eta(done_phase):
+        """Remaining time for this account from historical phase medians"""
+        order = ["catalog", "rtpos", "report"]
+        later = order[order.index(done_phase) + 1:]
+        remaining = sum(
+            seconds for phase, seconds in medians.items() if phase.split("_")[0] in later
+        ) if medians else None
+        if remaining is not None:
+            logger.info(f"ETA for {account_label}: ~{remaining:.0f}s after {done_phase} (historical medians)")
+
+    datarows = []
+    stocks_data_rows = []
+
+    def catalog_phase(driver):
+        login_ok = do_login(driver, user_id, account['password'], time_budget=catalog_budget)
+        if not login_ok:
+            logger.error(f"Login failed for user {user_id}")
+            diagnostics.capture_failure(driver, "login")
+            return None
+        diagnostics.mark(driver, "logged_in")
+
+        # Top-level frameset URL, used to open catalog sections in extra tabs
+        driver.switch_to.default_content()
+        catalog_home_url = driver.current_url
+
+        try:
+            open_catalog(driver, catalog_home_url, time_budget=catalog_budget)
+        except (RetryError, CircuitOpenError) as e:
+            logger.error(f"Could not open the catalog for {user_id}: {e}")
+            diagnostics.capture_failure(driver, "catalog", e)
+            return None
+        diagnostics.mark(driver, "catalog")
+
+        try:
+            return harvest_catalog_sections(driver, catalog_home_url, time_budget=catalog_budget)
+        except Exception as e:
+            diagnostics.capture_failure(driver, "catalog_harvest", e)
+            raise
+
+    # Fresh browser for this account, closed again before the RT POS phase
+    catalog_budget = budget.phase("catalog", CATALOG_SHARE)
+    logger.info(f"Catalog phase budget: {catalog_budget}")
+    try:
+        with log_context(phase="catalog"), profile_stage(f"{account_label}-catalog"), \
+                timed_phase(history, "catalog") as phase:
+            allocation_rows = None
+            if os.getenv("CATALOG_CLIENT", "browser").lower() == "http":
+                import catalog_http
+                try:
+                    allocation_rows = catalog_http.harvest_allocations(
+                        user_id, account['password'], proxy=select_proxy(user_id))
+                except catalog_http.CatalogLoginError as e:
+                    # A second try in the browser would only risk locking the account
+                    logger.error(f"{e}; not retrying in the browser")
+                    phase["outcome"] = "failed"
+                    return None
+                if allocation_rows is None and catalog_budget.expired() and not critical:
+                    logger.warning(f"Catalog budget for {user_id} used up by the HTTP client, not falling back to the browser")
+                    phase["outcome"] = "failed"
+                    return None
+                if allocation_rows is None:
+                    logger.info(f"Falling back to the browser for the {user_id} catalog")
+            if allocation_rows is None:
+                allocation_rows = run_watched(
+                    f"{user_id} catalog",
+                    lambda: driverinitialize(use_proxy=True, session_key=user_id),
+                    catalog_phase
+                )
+            if allocation_rows is None:
+                phase["outcome"] = "failed"
+    except Exception as e:
+        logger.error(f"Catalog phase failed for {user_id}: {e}")
+        return None
+    logger.info(f"Browser closed for user: {user_id}")
+
+    if allocation_rows is None:
+        return None
+    if catalog_budget.expired():
+        logger.warning(f"Catalog phase for {user_id} overran its {catalog_budget.seconds:.0f}s budget")
+    log_eta("catalog")
+
+    for section_name, node_sku, node_allocation_available_qty in allocation_rows:
+        datarows.append(node_sku)
+        stocks_data_rows.append([node_sku, node_allocation_available_qty])
+
+    if history:
+        history.allocations(allocation_rows)
+
+    SIM_CARD_SKU = "METROTRIPLESIM"
+    if SIM_CARD_SKU not in datarows:
+        datarows.append(SIM_CARD_SKU)
+
+    if not datarows:
+        logger.info("No products have stock available.")
+        return None
+
+    logger.info(f"Found {len(datarows)} items with stock")
+
+    if budget.expired() and not critical:
+        logger.warning(f"Time budget for {user_id} used up after the catalog phase, skipping RT POS report")
+        return None
+
+    # Waits are capped to the RT POS share, so a slow export leaves time for the report
+    rtpos_budget = budget.phase("rtpos", RTPOS_SHARE)
+    logger.info(f"RT POS phase budget: {rtpos_budget}")
+    with log_context(phase="rtpos_export"), profile_stage(f"{account_label}-rtpos_export"):
+        exports = download_report(account['report_user_id'], account['report_password'],
+                                  time_budget=rtpos_budget, history=history,
+                                  account=account_label, run_date=history_date)
+        if not exports:
+            logger.error("Failed to download report")
+            return None
+    log_eta("rtpos")
+
+    totals = {}
+    # The report is local work with no waits or retries to cap, and a half-written
+    # workbook is worth nothing, so its budget is only checked afterwards
+    report_budget = budget.phase("report", 1.0)
+    with log_context(phase="report"), timed_phase(history, "report") as phase:
+        outputs = create_new_report(datarows, stocks_data_rows, f"INVENTORY - {account_label} - {today_date}", output_file, account_label, exports, history=history, totals=totals)
+        if not outputs:
+            phase["outcome"] = "failed"
+            logger.error("Failed to create report")
+            return None
+    if report_budget.expired():
+        logger.warning(f"Report phase for {user_id} overran its {report_budget.seconds:.0f}s budget")
+
+    logger.info("Process completed successfully")
+
+    # Track the generated report files
+    report_paths = [path for path in outputs if os.path.exists(path)]
+    if not report_paths:
+        logger.warning(f"No report files found for {output_file}")
+        return None
+
+    # Index the outputs too: idoo_xlsx, idoo_report_csv, idoo_stock_jsonl, ...
+    stem = os.path.splitext(output_file)[0]
+    for path in report_paths:
+        try:
+            kind = "idoo_" + os.path.basename(path)[len(stem) + 1:].replace(".", "_")
+            get_artifact_store().put(path, account_label, kind, run_date=history_date, keep=True)
+        except Exception as e:
+            logger.warning(f"Could not store {os.path.basename(path)} as an artifact: {e}")
+
+    logger.info(f"Report tracked for emailing: {', '.join(os.path.basename(p) for p in report_paths)}")
+    return {
+        'account': account_label,
+        'items_with_stock': len(datarows),
+        'report_paths': report_paths,
+        'store_totals': totals.get('stores', []),
+        'order_total': totals.get('total', 0.0),
+    }
+
+
+def replay_offline(export_path, account_label, build_email=True, output_file=None, formats=None):
+    """
+    Re-run the offline stages (parse, filter, workbook, email build) from a saved export.
+
+    Window exports ("ReOrder Custom Report <days>d.xlsx") next to the export
+    are merged too; nothing is copied or deleted. SKUs come from the account's latest allocations in the history store, or
+    every item in the export when there is no history. Nothing is sent.
+    Returns the paths written, or None.
+    """
+    import pandas as pd
+
+    exports = {PRIMARY_DAY_WINDOW: export_path}
+    for days in get_day_windows()[1:]:
+        window_path = os.path.join(os.path.dirname(os.path.abspath(export_path)), report_file_name(days))
+        if os.path.exists(window_path):
+            exports[days] = window_path
+
+    allocation_rows = []
+    try:
+        with open_store() as store:
+            allocation_rows = store.latest_allocations(account_label)
+    except Exception as e:
+        logger.warning(f"History store unavailable for replay: {e}")
+
+    if allocation_rows:
+        stock_data_rows = [[sku, qty] for _, sku, qty in allocation_rows]
+        logger.info(f"Replay: using {len(stock_data_rows)} SKUs from the last {account_label} run")
+    else:
+        items = pd.read_excel(export_path)["Item Number"].dropna().astype(str).unique()
+        stock_data_rows = [[sku, 0] for sku in items]
+        logger.info(f"Replay: no history for {account_label}, using all {len(stock_data_rows)} items in the export")
+
+    ids = [sku for sku, _ in stock_data_rows]
+    output_file = output_file or f"IDOO-{account_label}-replay.xlsx"
+    outputs = create_new_report(ids, stock_data_rows, f"INVENTORY - {account_label} - replay",
+                                output_file, account_label, exports, formats=formats)
+    if not outputs:
+        return None
+
+    if build_email:
+        from mailer import Mailer, iter_message
+
+        with profile_stage("email_build"), Mailer() as mailer:
+            batches = mailer.prepare(outputs)
+            size = sum(
+                len(chunk) for batch in batches
+                for chunk in iter_message("replay@localhost", "replay@localhost",
+                                          f"IDOO Inventory Report - {account_label} (replay)", "Replay", batch)
+            )
+        logger.info(f"Replay: built {len(batches)} email(s), {size} bytes, not sent")
+    return outputs
+
+
+def plan_accounts(accounts, history_store=None, deadline=None):
+    """
+    Accounts in the order run_accounts() processes them: priority, then
+    usual duration from the history store. The daemon warms browsers in
+    this same order.
+    """
+    def expected_duration(user_id):
+        if not history_store:
+            return None
+        try:
+            return history_store.expected_duration(account_label_for(user_id))
+        except Exception:
+            return None
+
+    return (deadline or RunDeadline()).plan(accounts, expected_duration)
 
 
 def main():
     """Main function with comprehensive error handling"""
+    if os.getenv("SESSION_REPLAY_DIR") or os.getenv("SESSION_RECORD_DIR"):
+        import session_replay   # pulls in selenium
+
+        # Session numbering starts over, and sleeps are fast-forwarded, for this run only
+        session_replay.reset_sessions()
+        with session_replay.replay_clock():
+            return run_accounts()
+    return run_accounts()
+
+
+def run_accounts():
+    """Process every account in cred.txt and send the combined email"""
     total_start_time = time.time()
+    deadline = RunDeadline()
 
     try:
         cred_file = "cred.txt"
@@ -850,226 +1936,70 @@ def main():
             logger.error(f"Credentials file {cred_file} not found")
             return
 
-        with open(cred_file, "r") as f:
-            creds = f.read().split("\n")
+        accounts = load_accounts(cred_file)
 
         # Get date once at the start
         from datetime import timezone, timedelta
         eastern = timezone(timedelta(hours=-5))  # EST is UTC-5
         now = datetime.now(eastern)
         today_date = now.strftime('%m-%d-%Y')
+        history_date = now.strftime('%Y-%m-%d')
+
+        # Local history of allocations and reorder rows (best-effort)
+        try:
+            history_store = open_store()
+        except Exception as e:
+            logger.warning(f"History store unavailable, continuing without it: {e}")
+            history_store = None
+
+        plans = plan_accounts(accounts, history_store, deadline)
+
+        try:
+            get_artifact_store().prune()
+        except Exception as e:
+            logger.warning(f"Artifact retention pass failed: {e}")
 
         # Track all generated reports
         generated_reports = []
         account_summaries = []
 
-        for cred in creds:
-            if not cred.strip():
-                continue
-
-            driver = None
-            try:
-                user_part, report_part = cred.split("||")
-                user_id, password = user_part.split("|")
-                report_user_id, report_password = report_part.split("|")
-            except ValueError as e:
-                logger.error(f"Invalid credential format: {e}")
+        for index, plan in enumerate(plans):
+            budget = deadline.account_budget(plan, plans[index + 1:])
+            if budget is None:
                 continue
 
-            logger.info(f"Processing user: {user_id}")
-
-            account_label = user_id.upper() if user_id.lower().startswith('iot') else user_id
-            output_file = f"IDOO-{account_label}-{today_date}.xlsx"
-
-            datarows = []
-            stocks_data_rows = []
+            eta = sum(p.expected for p in plans[index:])
+            logger.info(
+                f"Run ETA: ~{eta / 60:.0f} min for {len(plans) - index} account(s) left, "
+                f"finishing around {datetime.fromtimestamp(time.time() + eta).strftime('%H:%M')}"
+            )
 
-            # Initialize fresh browser for this account
+            account_start = time.time()
+            summary = None
             try:
-                driver = driverinitialize()
+                with log_context(account=plan.account['label']):
+                    summary = process_account(
+                        plan.account, today_date, budget,
+                        history_store=history_store, history_date=history_date,
+                        critical=plan.critical
+                    )
             except Exception as e:
-                logger.error(f"Failed to initialize browser for {user_id}: {e}")
-                continue
+                logger.error(f"Unexpected error processing {plan.user_id}: {e}")
+                logger.error(traceback.format_exc())
 
-            driver.get("https://www.t-mobiledealerordering.com/b2b_tmo/init.do")
-            time.sleep(3)
+            if summary:
+                generated_reports.extend(summary['report_paths'])
+                account_summaries.append(summary)
 
-            if not do_login(driver, user_id, password):
-                logger.error(f"Login failed for user {user_id}")
+            logger.info(f"Completed processing for user: {plan.user_id}")
+            if history_store:
                 try:
-                    driver.save_screenshot(os.path.join(root_path, f"error_screenshot_{user_id}.png"))
-                except Exception:
-                    pass
-                continue
-
-            frame_retries = 0
-            while frame_retries < 3:
-                try:
-                    driver.switch_to.default_content()
-                    driver.switch_to.frame("isaTop")
-                    time.sleep(1)
-                    driver.switch_to.frame("header")
-                    time.sleep(1)
-                    break
+                    history_store.record_account_run(
+                        plan.account['label'], history_date,
+                        time.time() - account_start, "ok" if summary else "failed"
+                    )
                 except Exception as e:
-                    frame_retries += 1
-                    logger.warning(f"Frame navigation attempt {frame_retries} failed: {e}")
-                    if frame_retries < 3:
-                        driver.refresh()
-                        time.sleep(5)
-                    else:
-                        logger.error("Failed to navigate frames after 3 attempts")
-                        continue
-
-            catalog_clicked = False
-            for attempt in range(3):
-                try:
-                    catalog_button = driver.find_element(By.XPATH, '//a[@onclick="show_catalog_view()"]')
-                    catalog_button.click()
-                    catalog_clicked = True
-                    logger.info("Clicked catalog view button")
-                    break
-                except Exception as e:
-                    logger.warning(f"Catalog button attempt {attempt + 1} failed: {e}")
-                    if attempt < 2:
-                        driver.get(driver.current_url)
-                        time.sleep(10)
-                        driver.switch_to.default_content()
-                        driver.switch_to.frame("isaTop")
-                        time.sleep(1)
-                        driver.switch_to.frame("header")
-                        time.sleep(1)
-
-            if not catalog_clicked:
-                logger.error("Failed to click catalog view button")
-                continue
-
-            time.sleep(10)
-
-            driver.switch_to.default_content()
-            form_frame_found = False
-            for attempt in range(3):
-                try:
-                    driver.switch_to.frame("isaTop")
-                    time.sleep(1)
-                    driver.switch_to.frame("form_input")
-                    form_frame_found = True
-                    logger.info("Successfully navigated to form_input frame")
-                    break
-                except Exception as e:
-                    logger.warning(f"Form frame attempt {attempt + 1} failed: {e}")
-                    if attempt < 2:
-                        try:
-                            driver.switch_to.default_content()
-                            driver.switch_to.frame("isaTop")
-                            driver.switch_to.frame("header")
-                            driver.find_element(By.XPATH, '//a[@onclick="show_catalog_view()"]').click()
-                            time.sleep(5)
-                        except Exception:
-                            driver.get(driver.current_url)
-                            time.sleep(10)
-
-            if not form_frame_found:
-                logger.error("Failed to navigate to form_input frame")
-                continue
-
-            nodes = driver.find_elements(By.XPATH, '//div[contains(@class,"catItemList-holder")]/div[@class="catalauge-item-holder "]')
-
-            for node in nodes:
-                try:
-                    node_sku = node.find_element(By.XPATH, './/div[@class="cat-prd-id"]').get_attribute("innerText").strip()
-                    qty_text = node.find_element(By.XPATH, './/td[@class="cat-prd-qty"]').get_attribute("innerText").strip()
-                    node_allocation_available_qty = qty_text.replace("Allocation :", "").strip().split("of")[0].strip()
-
-                    if int(node_allocation_available_qty) > 0:
-                        logger.info(f"Stock added for SKU: {node_sku}")
-                        datarows.append(node_sku)
-                        stocks_data_rows.append([node_sku, node_allocation_available_qty])
-                except Exception as e:
-                    logger.error(f"Error processing node: {e}")
-                    continue
-
-            if datarows:
-                filter_button = wait_for_element(driver, '//input[@id="filterAllocBtn"]')
-                if filter_button:
-                    filter_button.click()
-                    time.sleep(10)
-                    try:
-                        driver.save_screenshot(os.path.join(create_download_directory(), "phone_screenshot.png"))
-                    except Exception:
-                        pass
-                    time.sleep(3)
-
-            cpo_link = wait_for_element(driver, '//div[@class="cat-secnav-areaname"]/a/span[contains(text(),"CPO")]')
-            if cpo_link:
-                cpo_link.click()
-                time.sleep(8)
-
-                cpo_nodes = driver.find_elements(By.XPATH, '//div[contains(@class,"catItemList-holder")]/div[@class="catalauge-item-holder "]')
-
-                for node in cpo_nodes:
-                    try:
-                        node_sku = node.find_element(By.XPATH, './/div[@class="cat-prd-id"]').get_attribute("innerText").strip()
-                        qty_text = node.find_element(By.XPATH, './/td[@class="cat-prd-qty"]').get_attribute("innerText").strip()
-                        node_allocation_available_qty = qty_text.replace("Allocation :", "").strip().split("of")[0].strip()
-
-                        if int(node_allocation_available_qty) > 0:
-                            logger.info(f"CPO Stock added for SKU: {node_sku}")
-                            datarows.append(node_sku)
-                            stocks_data_rows.append([node_sku, node_allocation_available_qty])
-                    except Exception as e:
-                        logger.error(f"Error processing CPO node: {e}")
-                        continue
-
-                if cpo_nodes:
-                    try:
-                        driver.save_screenshot(os.path.join(create_download_directory(), "cpo_screenshot.png"))
-                    except Exception:
-                        pass
-                    time.sleep(3)
-
-            SIM_CARD_SKU = "METROTRIPLESIM"
-            if SIM_CARD_SKU not in datarows:
-                datarows.append(SIM_CARD_SKU)
-
-            if not datarows:
-                logger.info("No products have stock available.")
-            else:
-                logger.info(f"Found {len(datarows)} items with stock")
-
-                if download_report(report_user_id, report_password):
-                    if create_new_report(datarows, stocks_data_rows, f"INVENTORY - {account_label} - {today_date}", output_file, account_label):
-                        logger.info("Process completed successfully")
-                        
-                        # Track the generated report
-                        download_dir = create_download_directory()
-                        report_path = os.path.join(download_dir, output_file)
-                        
-                        if os.path.exists(report_path):
-                            generated_reports.append(report_path)
-                            account_summaries.append({
-                                'account': account_label,
-                                'items_with_stock': len(datarows)
-                            })
-                            logger.info(f"Report tracked for emailing: {output_file}")
-                        else:
-                            logger.warning(f"Report file not found at {report_path}")
-                    else:
-                        logger.error("Failed to create report")
-                else:
-                    logger.error("Failed to download report")
-
-            logger.info(f"Completed processing for user: {user_id}")
-            
-            # Close browser after processing this account
-            if driver:
-                try:
-                    driver.quit()
-                    logger.info(f"Browser closed for user: {user_id}")
-                except Exception as e:
-                    logger.error(f"Error closing browser for {user_id}: {e}")
-                finally:
-                    driver = None
+                    logger.warning(f"Could not record account duration: {e}")
 
         # After processing all accounts, send ONE email with ALL reports
         if generated_reports:
@@ -1081,38 +2011,48 @@ def main():
                 
                 subject = f"IDOO Inventory Report - {account_names_str}"
                 
-                # Create detailed email body
-                email_body = f"""Hello,
-
-Your T-Mobile inventory reports have been generated successfully.
-
-Report Summary:
-"""
-                for summary in account_summaries:
-                    email_body += f"  • {summary['account']}: {summary['items_with_stock']} items with stock\n"
-                
-                email_body += f"""
-Date: {today_date}
-Total Reports: {len(generated_reports)}
-
-Please find the attached Excel reports.
-
-Best regards,
-Automated Inventory System
-"""
-                
-                logger.info(f"Sending combined email with {len(generated_reports)} report(s)")
-                send_email_with_attachments(
-                    subject=subject,
-                    body=email_body,
-                    attachment_paths=generated_reports,
-                    recipient_email=recipient
-                )
+                email_body = email_body_for(account_summaries, len(generated_reports), today_date)
+
+                from mailer import Mailer
+
+                email_start = time.time()
+                with log_context(phase="email"), Mailer() as mailer:
+                    if os.getenv("EMAIL_PER_ACCOUNT") == "1":
+                        # One message per account, all over the same SMTP connection
+                        logger.info(f"Sending {len(account_summaries)} per-account email(s)")
+                        sent = all([
+                            send_email_with_attachments(
+                                subject=f"IDOO Inventory Report - {summary['account'].replace('IOT', '').title()}",
+                                body=email_body_for([summary], len(summary['report_paths']), today_date),
+                                attachment_paths=summary['report_paths'],
+                                recipient_email=recipient,
+                                mailer=mailer
+                            )
+                            for summary in account_summaries
+                        ])
+                    else:
+                        logger.info(f"Sending combined email with {len(generated_reports)} report(s)")
+                        sent = send_email_with_attachments(
+                            subject=subject,
+                            body=email_body,
+                            attachment_paths=generated_reports,
+                            recipient_email=recipient,
+                            mailer=mailer
+                        )
+                if history_store:
+                    try:
+                        history_store.record_phase(None, "ALL", history_date, "email",
+                                                   time.time() - email_start, "ok" if sent else "failed")
+                    except Exception as e:
+                        logger.warning(f"Could not record email duration: {e}")
             else:
                 logger.info("No recipient email configured, skipping email")
         else:
             logger.info("No reports were generated, skipping email")
 
+        if history_store:
+            history_store.close()
+
     except Exception as e:
         logger.error(f"Unexpected error in main: {e}")
         logger.error(traceback.format_exc())
@@ -1123,18 +2063,14 @@ Automated Inventory System
 
 
 if __name__ == "__main__":
-    import warnings
     import sys
-
-    warnings.filterwarnings("ignore")
-
-    # NOTE: Do NOT redirect stderr - GitHub Actions needs it for error visibility
-    try:
-        main()
-    except KeyboardInterrupt:
-        print("\nScript interrupted by user")
-    except Exception as e:
-        logger.error(f"Fatal error: {e}")
-        logger.error(traceback.format_exc())
-    finally:
-        sys.exit(0)
+    from cli import main as cli_main
+
+    # `python scraper.py [--profile] [--replay EXPORT --account X]` predates cli.py
+    argv = sys.argv[1:]
+    if "--replay" in argv:
+        index = argv.index("--replay")
+        argv = ["build-report", argv[index + 1], "--build-email"] + argv[:index] + argv[index + 2:]
+    else:
+        argv = ["scrape"] + argv
+    sys.exit(cli_main(argv))
@@ -0,0 +1,646 @@
+"""
+Record and replay browser sessions for offline runs.
+
+Record mode wraps the real driver. Every element lookup, page read
+(current_url, title, page_source) and script result is saved, per window
+and frame. Files that land in the download directory are saved too,
+tagged with the click that produced them. Replay mode serves those
+responses from a ReplayDriver with the same interface, so do_login(), the
+catalog loops and download_report() run unchanged, with no Chrome and no
+network.
+
+    SESSION_RECORD_DIR=recordings/2026-10-19 python scraper.py
+    SESSION_REPLAY_DIR=recordings/2026-10-19 python scraper.py
+
+Each driver session is stored as <dir>/<session_key>-<n>/session.json plus
+an artifacts/ folder. Downloads the scraper moves away before the driver
+quits (the RT POS exports go to the artifact store) are handed over with
+note_download() when they complete. Credentials are scrubbed before anything is written:
+every string typed with send_keys, password input values and jsessionid
+tokens are replaced with "***".
+
+Replays also fast-forward time.sleep() on a per-thread virtual clock, so
+the scraper's fixed waits cost nothing. scraper.main() installs it for the
+run with replay_clock() and restores the time module afterwards. It also
+calls reset_sessions() first, so every run in a long-lived daemon records
+and replays <session_key>-01 onwards. Replay needs lxml (pip install lxml).
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import NoSuchElementException, NoSuchWindowException
+
+logger = logging.getLogger(__name__)
+
+SCRUBBED = "***"
+_session_counters = defaultdict(int)
+_counter_lock = threading.Lock()
+
+
+def reset_sessions():
+    """Number sessions from 01 again; called at the start of each run"""
+    with _counter_lock:
+        _session_counters.clear()
+
+
+def _next_session_dir(base_dir, session_key):
+    with _counter_lock:
+        _session_counters[session_key] += 1
+        return os.path.join(base_dir, f"{session_key}-{_session_counters[session_key]:02d}")
+
+
+def _context(window, frame):
+    return f"w{window}|{'/'.join(frame)}"
+
+
+# ── Recording ────────────────────────────────────────────────────────────────
+
+class RecordingElement:
+    """Proxy for a live WebElement that reports clicks and typed text to the recorder"""
+
+    def __init__(self, recorder, element):
+        self._recorder = recorder
+        self.wrapped = element
+
+    def click(self):
+        self._recorder._clicked()
+        return self.wrapped.click()
+
+    def send_keys(self, *values):
+        self._recorder._typed(values)
+        return self.wrapped.send_keys(*values)
+
+    def find_element(self, by=By.ID, value=None):
+        return RecordingElement(self._recorder, self.wrapped.find_element(by, value))
+
+    def find_elements(self, by=By.ID, value=None):
+        return [RecordingElement(self._recorder, e) for e in self.wrapped.find_elements(by, value)]
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+
+class _RecordingSwitchTo:
+    def __init__(self, recorder):
+        self._recorder = recorder
+        self._switch = recorder._driver.switch_to
+
+    def frame(self, reference):
+        name = _frame_name(reference)
+        self._switch.frame(reference.wrapped if isinstance(reference, RecordingElement) else reference)
+        self._recorder._frame.append(name)
+
+    def default_content(self):
+        self._switch.default_content()
+        self._recorder._frame = []
+
+    def parent_frame(self):
+        self._switch.parent_frame()
+        self._recorder._frame = self._recorder._frame[:-1]
+
+    def window(self, handle):
+        self._switch.window(handle)
+        self._recorder._set_window(handle)
+
+    def new_window(self, type_hint=None):
+        self._switch.new_window(type_hint)
+        self._recorder._set_window(self._recorder._driver.current_window_handle)
+
+    def __getattr__(self, name):
+        return getattr(self._switch, name)
+
+
+class RecordingDriver:
+    """Wraps a live driver and saves what it returns, for ReplayDriver"""
+
+    def __init__(self, driver, session_dir, download_dir):
+        self._driver = driver
+        self.session_dir = session_dir
+        self.download_dir = download_dir
+        self._responses = defaultdict(list)
+        self._secrets = set()
+        self._clicks = []
+        self._artifacts = []
+        self._frame = []
+        self._windows = {}
+        self._handle = None
+        self._started = time.time()
+        self._known_files = set(os.listdir(download_dir)) if os.path.isdir(download_dir) else set()
+        self._saved = False
+        self._set_window(driver.current_window_handle)
+
+    # bookkeeping
+
+    def _set_window(self, handle):
+        """Track the current window; windows are numbered in the order they are first seen"""
+        if handle not in self._windows:
+            self._windows[handle] = len(self._windows)
+        self._handle = handle
+        self._frame = []
+
+    def _ctx(self):
+        return _context(self._windows.get(self._handle, 0), self._frame)
+
+    def _record(self, key, value):
+        self._responses[f"{self._ctx()}|{key}"].append(value)
+
+    def _clicked(self):
+        self._clicks.append(time.time())
+
+    def _typed(self, values):
+        for value in values:
+            if isinstance(value, str) and len(value) >= 3:
+                self._secrets.add(value)
+
+    @staticmethod
+    def _describe(element):
+        try:
+            return element.get_attribute("outerHTML") or ""
+        except Exception:
+            return ""
+
+    # driver interface
+
+    def find_element(self, by=By.ID, value=None):
+        try:
+            element = self._driver.find_element(by, value)
+        except NoSuchElementException:
+            self._record(f"find|{by}|{value}", [])
+            raise
+        self._record(f"find|{by}|{value}", [self._describe(element)])
+        return RecordingElement(self, element)
+
+    def find_elements(self, by=By.ID, value=None):
+        elements = self._driver.find_elements(by, value)
+        self._record(f"find|{by}|{value}", [self._describe(e) for e in elements])
+        return [RecordingElement(self, e) for e in elements]
+
+    @property
+    def current_url(self):
+        url = self._driver.current_url
+        self._record("current_url", url)
+        return url
+
+    @property
+    def title(self):
+        title = self._driver.title
+        self._record("title", title)
+        return title
+
+    @property
+    def page_source(self):
+        source = self._driver.page_source
+        self._record("page_source", source)
+        return source
+
+    @property
+    def window_handles(self):
+        return self._driver.window_handles
+
+    @property
+    def current_window_handle(self):
+        return self._driver.current_window_handle
+
+    @property
+    def switch_to(self):
+        return _RecordingSwitchTo(self)
+
+    def execute_script(self, script, *args):
+        if args and "click" in script:
+            self._clicked()
+        args = [a.wrapped if isinstance(a, RecordingElement) else a for a in args]
+        result = self._driver.execute_script(script, *args)
+        try:
+            json.dumps(result)
+            self._record(f"script|{script}", result)
+        except (TypeError, ValueError):
+            pass
+        return result
+
+    def close(self):
+        self._driver.close()
+        self._frame = []
+
+    def quit(self):
+        try:
+            self.save()
+        finally:
+            self._driver.quit()
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+    def note_download(self, path):
+        """Save a completed download now, before the scraper moves it out of the download directory"""
+        try:
+            os.makedirs(os.path.join(self.session_dir, "artifacts"), exist_ok=True)
+            name = os.path.basename(path)
+            shutil.copy2(path, os.path.join(self.session_dir, "artifacts", name))
+            self._artifacts.append({"file": name, "after_click": max(1, len(self._clicks))})
+        except OSError as e:
+            logger.warning(f"Could not record download {path}: {e}")
+
+    # persistence
+
+    def _scrub(self, value):
+        if isinstance(value, str):
+            for secret in sorted(self._secrets, key=len, reverse=True):
+                value = value.replace(secret, SCRUBBED)
+            value = re.sub(r'(<input[^>]*type="password"[^>]*value=")[^"]*', r'\1' + SCRUBBED, value)
+            return re.sub(r'(jsessionid=)[^;&?"\'\s]+', r'\1' + SCRUBBED, value, flags=re.IGNORECASE)
+        if isinstance(value, list):
+            return [self._scrub(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self._scrub(v) for k, v in value.items()}
+        return value
+
+    def save(self):
+        """Write session.json and the downloaded artifacts (once, on quit)"""
+        if self._saved:
+            return
+        self._saved = True
+        try:
+            os.makedirs(os.path.join(self.session_dir, "artifacts"), exist_ok=True)
+            artifacts = list(self._artifacts)
+            noted = {artifact["file"] for artifact in artifacts}
+            if os.path.isdir(self.download_dir):
+                for name in sorted(os.listdir(self.download_dir)):
+                    path = os.path.join(self.download_dir, name)
+                    if name in self._known_files or name in noted or not os.path.isfile(path):
+                        continue
+                    mtime = os.path.getmtime(path)
+                    if mtime < self._started:
+                        continue
+                    shutil.copy2(path, os.path.join(self.session_dir, "artifacts", name))
+                    artifacts.append({
+                        "file": name,
+                        "after_click": max(1, sum(1 for t in self._clicks if t <= mtime)),
+                    })
+
+            with open(os.path.join(self.session_dir, "session.json"), "w", encoding="utf-8") as f:
+                json.dump({
+                    "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "clicks": len(self._clicks),
+                    "responses": self._scrub(dict(self._responses)),
+                    "artifacts": artifacts,
+                }, f)
+            logger.info(f"Recorded session to {self.session_dir} "
+                        f"({sum(len(v) for v in self._responses.values())} responses, {len(artifacts)} artifacts)")
+        except Exception as e:
+            logger.warning(f"Could not save recorded session {self.session_dir}: {e}")
+
+
+# ── Replay ───────────────────────────────────────────────────────────────────
+
+_FRAGMENT_WRAPPERS = {
+    "tr": "<table><tbody>{}</tbody></table>",
+    "td": "<table><tbody><tr>{}</tr></tbody></table>",
+    "th": "<table><tbody><tr>{}</tr></tbody></table>",
+    "tbody": "<table>{}</table>",
+    "thead": "<table>{}</table>",
+    "option": "<select>{}</select>",
+}
+
+
+def _parse_fragment(html):
+    """lxml element for an outerHTML string (table parts need a table around them)"""
+    import lxml.html
+
+    match = re.match(r"\s*<([a-zA-Z0-9]+)", html or "")
+    tag = match.group(1).lower() if match else "div"
+    if tag in ("html", "frameset", "frame", "body", "head"):
+        doc = lxml.html.document_fromstring(html if tag == "html" else f"<html>{html}</html>")
+        found = doc.xpath(f"//{tag}")
+        return found[0] if found else doc
+    wrapped = _FRAGMENT_WRAPPERS.get(tag, "{}").format(html or "<div></div>")
+    doc = lxml.html.document_fromstring(f"<html><body>{wrapped}</body></html>")
+    found = doc.xpath(f"//{tag}")
+    return found[0] if found else doc
+
+
+def _to_xpath(by, value):
+    if by == By.XPATH:
+        return value
+    if by == By.ID:
+        return f'//*[@id="{value}"]'
+    if by == By.NAME:
+        return f'//*[@name="{value}"]'
+    if by == By.TAG_NAME:
+        return f"//{value}"
+    if by == By.CLASS_NAME:
+        return f'//*[contains(concat(" ", normalize-space(@class), " "), " {value} ")]'
+    if by == By.CSS_SELECTOR:
+        from cssselect import GenericTranslator
+        return GenericTranslator().css_to_xpath(value)
+    raise ValueError(f"Replay does not support locator {by!r}")
+
+
+def _frame_name(reference):
+    if isinstance(reference, str):
+        return reference
+    if isinstance(reference, int):
+        return str(reference)
+    for attribute in ("name", "id"):
+        value = reference.get_attribute(attribute)
+        if value:
+            return value
+    return "frame"
+
+
+class ReplayElement:
+    """Element backed by recorded outerHTML; lookups below it run on the HTML"""
+
+    def __init__(self, driver, html=None, node=None):
+        self._driver = driver
+        self._node = node if node is not None else _parse_fragment(html)
+
+    def find_element(self, by=By.ID, value=None):
+        found = self.find_elements(by, value)
+        if not found:
+            raise NoSuchElementException(f"Replay: no element for {value}")
+        return found[0]
+
+    def find_elements(self, by=By.ID, value=None):
+        xpath = _to_xpath(by, value)
+        if xpath.startswith("/"):
+            xpath = "." + xpath
+        return [ReplayElement(self._driver, node=n) for n in self._node.xpath(xpath) if hasattr(n, "tag")]
+
+    def get_attribute(self, name):
+        import lxml.html
+
+        if name in ("innerText", "textContent"):
+            return self._node.text_content()
+        if name == "outerHTML":
+            return lxml.html.tostring(self._node, encoding="unicode")
+        if name == "innerHTML":
+            return "".join(lxml.html.tostring(c, encoding="unicode") for c in self._node)
+        return self._node.get(name)
+
+    def get_dom_attribute(self, name):
+        return self._node.get(name)
+
+    @property
+    def text(self):
+        return " ".join(self._node.text_content().split())
+
+    @property
+    def tag_name(self):
+        return self._node.tag
+
+    def is_displayed(self):
+        style = (self._node.get("style") or "").replace(" ", "").lower()
+        return self._node.get("hidden") is None and "display:none" not in style and "visibility:hidden" not in style
+
+    def is_enabled(self):
+        return self._node.get("disabled") is None
+
+    def is_selected(self):
+        return self._node.get("checked") is not None or self._node.get("selected") is not None
+
+    def click(self):
+        self._driver._clicked()
+
+    def send_keys(self, *values):
+        pass
+
+    def clear(self):
+        pass
+
+    def submit(self):
+        self._driver._clicked()
+
+
+class _ReplaySwitchTo:
+    def __init__(self, driver):
+        self._driver = driver
+
+    def frame(self, reference):
+        self._driver._frame.append(_frame_name(reference))
+
+    def default_content(self):
+        self._driver._frame = []
+
+    def parent_frame(self):
+        self._driver._frame = self._driver._frame[:-1]
+
+    def window(self, handle):
+        if handle not in self._driver._handles:
+            raise NoSuchWindowException(f"Replay: no window {handle}")
+        self._driver._current = handle
+        self._driver._frame = []
+
+    def new_window(self, type_hint=None):
+        handle = f"replay-{self._driver._opened}"
+        self._driver._opened += 1
+        self._driver._handles.append(handle)
+        self._driver._current = handle
+        self._driver._frame = []
+
+
+class ReplayDriver:
+    """Serves a recorded session through the WebDriver methods the scraper uses"""
+
+    def __init__(self, session_dir, download_dir):
+        with open(os.path.join(session_dir, "session.json"), encoding="utf-8") as f:
+            data = json.load(f)
+        self.session_dir = session_dir
+        self.download_dir = download_dir
+        self._responses = data["responses"]
+        self._artifacts = data.get("artifacts", [])
+        self._cursor = defaultdict(int)
+        self._clicks = 0
+        self._frame = []
+        self._handles = ["replay-0"]
+        self._opened = 1
+        self._current = "replay-0"
+        self._url = "about:blank"
+
+    def _take(self, key, default=None):
+        """Next recorded response for key in the current window/frame; the last one repeats"""
+        window = int(self._current.split("-")[1])
+        full_key = f"{_context(window, self._frame)}|{key}"
+        responses = self._responses.get(full_key)
+        if not responses:
+            return default
+        index = min(self._cursor[full_key], len(responses) - 1)
+        self._cursor[full_key] += 1
+        return responses[index]
+
+    def _clicked(self):
+        self._clicks += 1
+        for artifact in self._artifacts:
+            if artifact["after_click"] == self._clicks:
+                os.makedirs(self.download_dir, exist_ok=True)
+                shutil.copy(os.path.join(self.session_dir, "artifacts", artifact["file"]),
+                            os.path.join(self.download_dir, artifact["file"]))
+                logger.info(f"Replay: delivered download {artifact['file']}")
+
+    def find_element(self, by=By.ID, value=None):
+        found = self._take(f"find|{by}|{value}") or []
+        if not found:
+            raise NoSuchElementException(f"Replay: no element for {value}")
+        return ReplayElement(self, found[0])
+
+    def find_elements(self, by=By.ID, value=None):
+        return [ReplayElement(self, html) for html in self._take(f"find|{by}|{value}") or []]
+
+    def get(self, url):
+        self._url = url
+
+    @property
+    def current_url(self):
+        return self._take("current_url", self._url)
+
+    @property
+    def title(self):
+        return self._take("title", "")
+
+    @property
+    def page_source(self):
+        return self._take("page_source", "<html></html>")
+
+    @property
+    def window_handles(self):
+        return list(self._handles)
+
+    @property
+    def current_window_handle(self):
+        return self._current
+
+    @property
+    def switch_to(self):
+        return _ReplaySwitchTo(self)
+
+    def execute_script(self, script, *args):
+        if args and "click" in script:
+            self._clicked()
+        return self._take(f"script|{script}")
+
+    def execute_cdp_cmd(self, cmd, params=None):
+        return {}
+
+    def get_log(self, log_type):
+        return []
+
+    def save_screenshot(self, path):
+        return True
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def maximize_window(self):
+        pass
+
+    def refresh(self):
+        pass
+
+    def close(self):
+        if self._current in self._handles:
+            self._handles.remove(self._current)
+        self._frame = []
+
+    def quit(self):
+        self._handles = []
+
+
+# ── Virtual clock ────────────────────────────────────────────────────────────
+
+class VirtualClock:
+    """
+    Per-thread fast-forward clock: time.sleep() returns at once and moves
+    that thread's time.time()/time.monotonic() forward instead. Other threads
+    (the driver watchdog) keep real time.
+    """
+
+    def __init__(self):
+        self._offsets = threading.local()
+        self._real = (time.time, time.monotonic, time.sleep)
+
+    def _offset(self):
+        return getattr(self._offsets, "value", 0.0)
+
+    def install(self):
+        real_time, real_monotonic, _ = self._real
+        time.time = lambda: real_time() + self._offset()
+        time.monotonic = lambda: real_monotonic() + self._offset()
+        time.sleep = self._sleep
+
+    def uninstall(self):
+        time.time, time.monotonic, time.sleep = self._real
+
+    def _sleep(self, seconds):
+        self._offsets.value = self._offset() + max(0.0, seconds)
+
+
+_clock = None
+
+
+@contextmanager
+def virtual_clock():
+    """VirtualClock installed for the block; the time module is restored on exit"""
+    global _clock
+    if _clock is not None:      # already inside one
+        yield _clock
+        return
+    _clock = VirtualClock()
+    _clock.install()
+    try:
+        yield _clock
+    finally:
+        _clock.uninstall()
+        _clock = None
+
+
+def replay_clock():
+    """virtual_clock() for a replayed run unless SESSION_REPLAY_REALTIME is set, else a no-op"""
+    if replay_dir() and os.getenv("SESSION_REPLAY_REALTIME", "").lower() not in ("1", "true"):
+        return virtual_clock()
+    return nullcontext()
+
+
+# ── Entry points used by driverinitialize() ──────────────────────────────────
+
+def record_dir():
+    return os.getenv("SESSION_RECORD_DIR")
+
+
+def replay_dir():
+    return os.getenv("SESSION_REPLAY_DIR")
+
+
+def note_download(driver, path):
+    """Hand a completed download to the driver's recorder, if it is recording"""
+    if isinstance(driver, RecordingDriver):
+        driver.note_download(path)
+
+
+def wrap_for_recording(driver, session_key, download_dir):
+    """RecordingDriver around driver when SESSION_RECORD_DIR is set, else driver"""
+    base = record_dir()
+    if not base:
+        return driver
+    session_dir = _next_session_dir(base, session_key or "session")
+    logger.info(f"Recording browser session to {session_dir}")
+    return RecordingDriver(driver, session_dir, download_dir)
+
+
+def open_replay(session_key, download_dir):
+    """ReplayDriver for the next recorded session of session_key"""
+    session_dir = _next_session_dir(replay_dir(), session_key or "session")
+    if not os.path.exists(os.path.join(session_dir, "session.json")):
+        raise FileNotFoundError(f"No recorded session at {session_dir}")
+    logger.info(f"Replaying browser session from {session_dir}")
+    return ReplayDriver(session_dir, download_dir)
@@ -4,40 +4,72 @@ Tests ONLY: login -> navigate -> generate -> detect data -> export -> download
 Run this independently to debug without waiting for full T-Mobile scraper.
 
 Usage:
-    python test_rtpos.py
+    RTPOS_USER_ID=... RTPOS_PASSWORD=... python test_rtpos.py
 
-Credentials are hardcoded below for testing. Remove after confirming it works.
+Probe mode repeats the flow and measures every step separately, to size
+timeouts and concurrency from real numbers:
+
+    python test_rtpos.py --probe 10                  # 10 runs back to back
+    python test_rtpos.py --probe 0 --every 900       # forever, every 15 minutes
+
+Each run is appended to rtpos_probe_samples.jsonl; p50/p95/p99 per step and
+the failure rate over all samples are written to rtpos_probe_metrics.json.
 """
 
 import os
+import sys
+import json
 import time
 import logging
+import argparse
 from glob import glob
 from datetime import datetime
 
+from dotenv import load_dotenv
+
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
 
+load_dotenv()
+
 # ── CONFIG ────────────────────────────────────────────────────────────────────
-REPORT_USER_ID  = "adil.iot"
-REPORT_PASSWORD = "Batman786!"
-DOWNLOAD_DIR    = os.path.join(os.getcwd(), "test_downloads")
-LOG_FILE        = "test_rtpos.log"
+REPORT_USER_ID   = os.getenv("RTPOS_USER_ID")
+REPORT_PASSWORD  = os.getenv("RTPOS_PASSWORD")
+DOWNLOAD_DIR     = os.path.join(os.getcwd(), "test_downloads")
+LOG_FILE         = "test_rtpos.log"
+# Same as the scraper's report wait, so slow generations are measured, not clipped
+GENERATE_TIMEOUT = int(os.getenv("RTPOS_GENERATE_TIMEOUT", "300"))
+GENERATE_POLL    = 0.5
+SAMPLES_FILE     = "rtpos_probe_samples.jsonl"
+METRICS_FILE     = "rtpos_probe_metrics.json"
+SCREENSHOTS      = True
 # ──────────────────────────────────────────────────────────────────────────────
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler()
-    ]
-)
+STEPS = ["startup", "login", "navigate", "generate", "export", "download"]
+
+DATA_ROW_SELECTORS = [
+    '//tr[contains(@class,"dx-row dx-data-row")]',
+    '//td[contains(@class,"dx-cell")]',
+    '//div[contains(@class,"dx-datagrid-rowsview")]//tr',
+    '//table//tr[position()>1]',
+]
+
 log = logging.getLogger(__name__)
 
 
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=[
+            logging.FileHandler(LOG_FILE),
+            logging.StreamHandler()
+        ]
+    )
+
+
 def make_download_dir():
     os.makedirs(DOWNLOAD_DIR, exist_ok=True)
     return os.path.abspath(DOWNLOAD_DIR)
@@ -101,7 +133,7 @@ def init_driver():
 
 def wait_for_element(driver, xpath, timeout=15):
     try:
-        return WebDriverWait(driver, timeout).until(
+        return WebDriverWait(driver, timeout, poll_frequency=0.25).until(
             EC.presence_of_element_located((By.XPATH, xpath))
         )
     except TimeoutException:
@@ -109,24 +141,54 @@ def wait_for_element(driver, xpath, timeout=15):
         return None
 
 
-def wait_for_download(dl_dir, timeout=120):
+def wait_until(driver, condition, timeout, poll=0.25):
+    """
+    condition's first truthy result, or None on timeout. The implicit wait is
+    off meanwhile, so each poll is one lookup and the step's timer stops when
+    the condition is first seen rather than on a fixed sleep.
+    """
+    driver.implicitly_wait(0)
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=poll).until(condition)
+    except TimeoutException:
+        return None
+    finally:
+        driver.implicitly_wait(10)
+
+
+def data_rows(driver):
+    """(selector, row count) for the first selector with grid rows, else False"""
+    for sel in DATA_ROW_SELECTORS:
+        rows = driver.find_elements(By.XPATH, sel)
+        if rows:
+            return sel, len(rows)
+    return False
+
+
+def wait_for_download(dl_dir, timeout=120, known_files=None):
     log.info(f"Waiting for download in: {dl_dir}")
+    known_files = known_files or set()
     end = time.time() + timeout
     while time.time() < end:
         partials = glob(os.path.join(dl_dir, "*.crdownload")) + glob(os.path.join(dl_dir, "*.tmp"))
         if partials:
-            time.sleep(2)
+            time.sleep(0.5)
             continue
-        xlsxs = sorted(glob(os.path.join(dl_dir, "*.xlsx")), key=os.path.getmtime, reverse=True)
+        xlsxs = sorted(
+            [f for f in glob(os.path.join(dl_dir, "*.xlsx")) if f not in known_files],
+            key=os.path.getmtime, reverse=True
+        )
         if xlsxs and os.path.getsize(xlsxs[0]) > 0:
             log.info(f"Download complete: {xlsxs[0]} ({os.path.getsize(xlsxs[0])} bytes)")
             return xlsxs[0]
-        time.sleep(2)
+        time.sleep(0.5)
     log.error(f"Download timed out. Files in dir: {os.listdir(dl_dir)}")
     return None
 
 
 def take_screenshot(driver, name):
+    if not SCREENSHOTS:
+        return
     try:
         path = os.path.join(DOWNLOAD_DIR, f"{name}_{datetime.now().strftime('%H%M%S')}.png")
         driver.save_screenshot(path)
@@ -135,25 +197,57 @@ def take_screenshot(driver, name):
         log.warning(f"Screenshot failed: {e}")
 
 
-def run_test():
+class StepTimer:
+    """Wall-clock latency of each step of one run"""
+
+    def __init__(self):
+        self.timings = {}
+        self.failed_step = None
+        self._step = None
+        self._start = None
+
+    def start(self, step):
+        self.stop()
+        self._step = step
+        self._start = time.perf_counter()
+
+    def stop(self):
+        if self._step:
+            self.timings[self._step] = round(time.perf_counter() - self._start, 3)
+        self._step = None
+
+    def fail(self):
+        """Mark the running step as the one that failed (not timed)"""
+        self.failed_step = self._step
+        self._step = None
+
+
+def run_test(timer=None):
     log.info("=" * 60)
     log.info("TEST: myrtpos reorder_custom2.fwx")
     log.info("=" * 60)
 
-    driver = init_driver()
+    timer = timer or StepTimer()
+    driver = None
 
     try:
+        # A browser that won't start is a failed sample, not the end of the probe
+        timer.start("startup")
+        driver = init_driver()
+        timer.stop()
+
         # ── STEP 1: Login ──────────────────────────────────────────
         log.info("STEP 1: Navigating to myrtpos login page...")
+        timer.start("login")
         driver.get("https://www.myrtpos.com/newbdi/index.fwx")
-        time.sleep(4)
-        take_screenshot(driver, "01_login_page")
 
         user_field = wait_for_element(driver, '//input[@name="secUserID"]')
         pass_field = wait_for_element(driver, '//input[@name="secPassword"]')
         login_btn  = wait_for_element(driver, '//input[@value="Login"]')
 
         if not user_field or not pass_field or not login_btn:
+            timer.fail()
+            take_screenshot(driver, "01_login_page")
             log.error("Login form elements not found - check screenshot")
             return False
 
@@ -162,14 +256,23 @@ def run_test():
         pass_field.clear()
         pass_field.send_keys(REPORT_PASSWORD)
         login_btn.click()
-        time.sleep(4)
+        # The login page is replaced once the site answers the form
+        if not wait_until(driver, EC.staleness_of(login_btn), timeout=30):
+            timer.fail()
+            take_screenshot(driver, "02_after_login")
+            log.error("Login page did not go away after submitting - check screenshot")
+            return False
+        timer.stop()
         take_screenshot(driver, "02_after_login")
         log.info("Login submitted")
 
         # ── STEP 2: Navigate to reorder_custom2 ───────────────────
         log.info("STEP 2: Navigating directly to reorder_custom2.fwx...")
+        timer.start("navigate")
         driver.get("https://www.myrtpos.com/newbdi/reorder_custom2.fwx")
-        time.sleep(5)
+        wait_until(driver, EC.presence_of_element_located(
+            (By.XPATH, '//input[@name="frmDays"] | //span[contains(text(),"Generate")]')), timeout=30)
+        timer.stop()
         take_screenshot(driver, "03_reorder_page")
         log.info(f"Page title: {driver.title}")
         log.info(f"Current URL: {driver.current_url}")
@@ -192,6 +295,7 @@ def run_test():
             generate_btn = wait_for_element(driver, '//*[contains(text(),"Generate")]', timeout=5)
 
         if not generate_btn:
+            timer.failed_step = "generate"
             take_screenshot(driver, "04_no_generate_btn")
             log.error("Generate button NOT found - check screenshot 04")
             # Log all visible buttons to help debug
@@ -207,51 +311,24 @@ def run_test():
             return False
 
         log.info("Clicking Generate...")
+        timer.start("generate")
         try:
             generate_btn.click()
         except Exception:
             driver.execute_script("arguments[0].click();", generate_btn)
 
-        take_screenshot(driver, "05_after_generate")
-
         # ── STEP 5: Poll for data ──────────────────────────────────
-        log.info("STEP 5: Waiting for report data to appear...")
-        max_wait = 60  # only wait 60s in test - it loads in ~5s now
-        poll = 2
-        elapsed = 0
-
-        while elapsed < max_wait:
-            # Check for data rows using multiple possible selectors
-            selectors = [
-                '//tr[contains(@class,"dx-row dx-data-row")]',
-                '//td[contains(@class,"dx-cell")]',
-                '//div[contains(@class,"dx-datagrid-rowsview")]//tr',
-                '//table//tr[position()>1]',
-            ]
-            row_count = 0
-            for sel in selectors:
-                try:
-                    rows = driver.find_elements(By.XPATH, sel)
-                    if rows:
-                        row_count = len(rows)
-                        log.info(f"  Found {row_count} rows using selector: {sel}")
-                        break
-                except Exception:
-                    pass
-
-            if row_count > 0:
-                log.info(f"Data detected after {elapsed}s - {row_count} rows found")
-                take_screenshot(driver, "06_data_loaded")
-                break
-
-            if elapsed % 10 == 0:
-                log.info(f"  Still waiting... {elapsed}s elapsed")
-                take_screenshot(driver, f"06_waiting_{elapsed}s")
-
-            time.sleep(poll)
-            elapsed += poll
+        log.info(f"STEP 5: Waiting up to {GENERATE_TIMEOUT}s for report data to appear...")
+        found = wait_until(driver, data_rows, timeout=GENERATE_TIMEOUT, poll=GENERATE_POLL)
+
+        if found:
+            timer.stop()
+            sel, row_count = found
+            log.info(f"Data detected after {timer.timings['generate']}s - {row_count} rows found using: {sel}")
+            take_screenshot(driver, "06_data_loaded")
         else:
-            log.error("No data rows detected after 60 seconds")
+            timer.fail()
+            log.error(f"No data rows detected after {GENERATE_TIMEOUT} seconds")
             take_screenshot(driver, "06_timeout_no_data")
             # Dump page source snippet for debugging
             try:
@@ -263,6 +340,7 @@ def run_test():
 
         # ── STEP 6: Find and click export button ──────────────────
         log.info("STEP 6: Looking for Excel export button...")
+        timer.start("export")
         export_selectors = [
             '//i[@class="dx-icon dx-icon-export-excel-button"]',
             '//*[contains(@class,"dx-icon-export-excel-button")]',
@@ -282,6 +360,7 @@ def run_test():
                 pass
 
         if not export_btn:
+            timer.fail()
             take_screenshot(driver, "07_no_export_btn")
             log.error("Export button NOT found - check screenshot 07")
             # Log all icons on the page
@@ -298,43 +377,164 @@ def run_test():
 
         take_screenshot(driver, "07_export_btn_found")
         log.info("Clicking export button...")
+        dl_dir = make_download_dir()
+        known_files = set(glob(os.path.join(dl_dir, "*.xlsx")))
         try:
             export_btn.click()
         except Exception:
             driver.execute_script("arguments[0].click();", export_btn)
 
-        time.sleep(3)
-
         # ── STEP 7: Wait for download ──────────────────────────────
         log.info("STEP 7: Waiting for file download...")
-        dl_dir = make_download_dir()
-        result = wait_for_download(dl_dir)
+        timer.start("download")
+        result = wait_for_download(dl_dir, known_files=known_files)
 
         if result:
+            timer.stop()
             log.info(f"SUCCESS! File downloaded: {result}")
             take_screenshot(driver, "08_success")
             return True
         else:
+            timer.fail()
             log.error("Download did not complete")
             take_screenshot(driver, "08_download_failed")
             return False
 
     except Exception as e:
+        timer.fail()
         log.error(f"Unexpected error: {e}")
         import traceback
         log.error(traceback.format_exc())
-        take_screenshot(driver, "error")
+        if driver is not None:
+            take_screenshot(driver, "error")
         return False
 
     finally:
-        driver.quit()
-        log.info("Browser closed")
+        if driver is not None:
+            driver.quit()
+            log.info("Browser closed")
 
 
-if __name__ == "__main__":
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers"""
+    values = sorted(values)
+    if not values:
+        return None
+    rank = (len(values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return round(values[low] + (values[high] - values[low]) * (rank - low), 3)
+
+
+def summarize(samples):
+    """Per-step p50/p95/p99 and overall failure rate from probe samples"""
+    summary = {
+        "runs": len(samples),
+        "failures": sum(1 for s in samples if not s["ok"]),
+        "failure_rate": round(sum(1 for s in samples if not s["ok"]) / len(samples), 3) if samples else None,
+        "first_run": samples[0]["ts"] if samples else None,
+        "last_run": samples[-1]["ts"] if samples else None,
+        "steps": {},
+    }
+    for step in STEPS + ["total"]:
+        values = [s["timings"][step] for s in samples if step in s["timings"]]
+        failed = sum(1 for s in samples if s.get("failed_step") == step)
+        summary["steps"][step] = {
+            "samples": len(values),
+            "failures": failed,
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": max(values) if values else None,
+        }
+    return summary
+
+
+def load_samples(path=SAMPLES_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def probe_once():
+    """One timed run; appends the sample to SAMPLES_FILE and returns it"""
+    timer = StepTimer()
+    start = time.perf_counter()
+    ok = run_test(timer)
+    if ok:
+        timer.timings["total"] = round(time.perf_counter() - start, 3)
+    sample = {
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "ok": bool(ok),
+        "failed_step": None if ok else (timer.failed_step or "unknown"),
+        "timings": timer.timings,
+    }
+    with open(SAMPLES_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(sample) + "\n")
+
+    # Don't let probe downloads pile up
+    for path in glob(os.path.join(DOWNLOAD_DIR, "*.xlsx")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return sample
+
+
+def run_probe(iterations, every=0):
+    """Repeat the flow (iterations=0: forever) and keep the metrics file current"""
+    global SCREENSHOTS
+    SCREENSHOTS = False
+
+    run = 0
+    while iterations == 0 or run < iterations:
+        run += 1
+        started = time.time()
+        sample = probe_once()
+        log.info(f"Probe {run}: {'ok' if sample['ok'] else 'FAILED at ' + sample['failed_step']} {sample['timings']}")
+
+        summary = summarize(load_samples())
+        with open(METRICS_FILE, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+        log.info(f"{summary['runs']} runs, failure rate {summary['failure_rate']:.1%}")
+        for step, stats in summary["steps"].items():
+            if stats["samples"]:
+                log.info(f"  {step:<9} p50 {stats['p50']:>7.1f}s  p95 {stats['p95']:>7.1f}s  "
+                         f"p99 {stats['p99']:>7.1f}s  ({stats['failures']} failed)")
+
+        if iterations and run >= iterations:
+            break
+        if every:
+            time.sleep(max(0, every - (time.time() - started)))
+
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="myrtpos reorder export test / latency probe")
+    parser.add_argument("--probe", type=int, metavar="N",
+                        help="repeat the flow N times (0 = until stopped) and report latency percentiles")
+    parser.add_argument("--every", type=float, default=0,
+                        help="with --probe, start a run every this many seconds")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    if not REPORT_USER_ID or not REPORT_PASSWORD:
+        log.error("Set RTPOS_USER_ID and RTPOS_PASSWORD (environment or .env)")
+        return 2
+
+    if args.probe is not None:
+        summary = run_probe(args.probe, args.every)
+        return 0 if summary["failures"] == 0 else 1
+
     success = run_test()
     log.info("=" * 60)
     log.info(f"TEST RESULT: {'PASSED' if success else 'FAILED'}")
     log.info("=" * 60)
-    import sys
-    sys.exit(0 if success else 1)
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+<html>
+<head>
+<script>
+function show_catalog_view() {
+  parent.form_input.location.href = "../catalog/catalog.do?view=1";
+}
+</script>
+</head>
+<body><a onclick="show_catalog_view()">Catalog</a></body>
+</html>
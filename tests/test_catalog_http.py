@@ -0,0 +1,157 @@
+"""
+catalog_http against a local stand-in for b2b_tmo.
+
+The pages under fixtures/b2b_tmo mirror the live flow: the init.do login
+form, the isaTop frameset, the header frame defining show_catalog_view(),
+and the catalog and CPO area pages. The server only serves them to a
+session holding the cookie set at login, like the real site.
+"""
+
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog_http  # noqa: E402
+import politeness  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "b2b_tmo")
+PASSWORD = "secret"
+SESSION_COOKIE = "JSESSIONID=stand-in"
+
+
+def page(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Serves fixtures/b2b_tmo under /b2b_tmo/; overrides maps a path to other HTML"""
+
+    overrides = {}
+    posted = []
+
+    def _reply(self, status, body="", headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path != "/b2b_tmo/init.do" and SESSION_COOKIE not in (self.headers.get("Cookie") or ""):
+            return self._reply(403)
+        name = path[len("/b2b_tmo/"):]
+        if path in self.overrides:
+            body = self.overrides[path]
+        elif path.startswith("/b2b_tmo/") and os.path.isfile(os.path.join(FIXTURES, name)):
+            body = page(name)
+        else:
+            return self._reply(404)
+        self._reply(200, body, [("Set-Cookie", f"{SESSION_COOKIE}; Path=/")])
+
+    def do_POST(self):
+        fields = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        self.posted.append(fields)
+        if fields.get("nolog_password") == [PASSWORD]:
+            return self._reply(302, headers=[("Location", "/b2b_tmo/home.do")])
+        self._reply(200, page("init.do"))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakePool:
+    def __init__(self, reports):
+        self.reports = reports
+
+    def report(self, proxy, ok):
+        self.reports.append(ok)
+
+
+@pytest.fixture
+def login_url(monkeypatch):
+    # The stand-in doesn't need the live site's 1 request/s
+    monkeypatch.setattr(politeness, "_scheduler", politeness.PolitenessScheduler(
+        {"127.0.0.1": politeness.HostPolicy(max_rate=100.0, burst=100)}))
+    StandIn.overrides = {}
+    StandIn.posted = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/b2b_tmo/init.do"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_harvests_every_section(login_url):
+    rows = catalog_http.harvest_allocations("dealer", PASSWORD, login_url=login_url)
+
+    # SKU2 has no allocation; SKU3 is kept from the first section only
+    assert rows == [("Phones", "SKU1", "5"), ("Phones", "SKU3", "2"), ("CPO", "CPO1", "4")]
+
+
+def test_login_posts_the_whole_form(login_url):
+    catalog_http.harvest_allocations("dealer", PASSWORD, login_url=login_url)
+
+    fields = StandIn.posted[0]
+    assert fields["UserId"] == ["dealer"]
+    assert fields["_csrf"] == ["csrf-token"]
+    assert fields["AgreeTerms"] == ["Y"]
+
+
+def test_rejected_login_is_not_left_to_the_browser(login_url, monkeypatch):
+    reports = []
+    monkeypatch.setattr(catalog_http, "get_proxy_pool", lambda: FakePool(reports))
+
+    with pytest.raises(catalog_http.CatalogLoginError):
+        catalog_http.harvest_allocations("dealer", "wrong", login_url=login_url)
+
+    # Bad credentials say nothing about the proxy the session went through
+    client = catalog_http.CatalogClient(catalog_http.new_session(), login_url, proxy="stand-in proxy")
+    with pytest.raises(catalog_http.CatalogLoginError):
+        client.login("dealer", "wrong")
+    assert reports == []
+    client.login("dealer", PASSWORD)
+    assert reports == [True]
+
+
+def test_unexpected_catalog_page_returns_none(login_url):
+    StandIn.overrides["/b2b_tmo/catalog/catalog.do"] = page("maintenance.html")
+
+    assert catalog_http.harvest_allocations("dealer", PASSWORD, login_url=login_url) is None
+
+
+def test_item_list_rendered_by_script_falls_back_to_the_browser(login_url):
+    StandIn.overrides["/b2b_tmo/catalog/area.do"] = (
+        '<html><body><div class="catItemList-holder"></div>'
+        '<script>renderItems()</script></body></html>'
+    )
+
+    assert catalog_http.harvest_allocations("dealer", PASSWORD, login_url=login_url) is None
+
+
+def test_section_that_says_it_is_empty_is_harvested(login_url):
+    StandIn.overrides["/b2b_tmo/catalog/area.do"] = (
+        '<html><body><div class="catItemList-holder"><p>No items found</p></div></body></html>'
+    )
+
+    rows = catalog_http.harvest_allocations("dealer", PASSWORD, login_url=login_url)
+    assert rows == [("Phones", "SKU1", "5"), ("Phones", "SKU3", "2")]
+
+
+def test_parse_errors_name_what_is_missing():
+    doc = catalog_http._parse(page("maintenance.html"))
+
+    with pytest.raises(catalog_http.CatalogParseError, match="login form"):
+        catalog_http.login_form(doc, "http://host/b2b_tmo/init.do")
+    with pytest.raises(catalog_http.CatalogParseError, match="CPO section link"):
+        catalog_http.section_url(doc, "http://host/b2b_tmo/catalog/catalog.do", "CPO")
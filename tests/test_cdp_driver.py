@@ -0,0 +1,306 @@
+"""
+cdp_driver's protocol layer against a fake websocket.
+
+FakeSocket records every command sent and answers through a queue the
+CDPConnection reader consumes, so replies, errors, events and disconnects
+can be played in any order without Chrome.
+"""
+
+import os
+import sys
+import json
+import shutil
+import asyncio
+import subprocess
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from selenium.webdriver.common.by import By  # noqa: E402
+from selenium.webdriver.common.keys import Keys  # noqa: E402
+from selenium.common.exceptions import TimeoutException  # noqa: E402
+
+import cdp_driver  # noqa: E402
+from cdp_driver import CDPConnection, CDPError, CDPPage  # noqa: E402
+
+
+class FakeSocket:
+    """Websocket stand-in; replies maps a CDP method to its result (or a function of the params)"""
+
+    def __init__(self, replies=None):
+        self.sent = []
+        self.replies = replies
+        self.incoming = asyncio.Queue()
+
+    async def send(self, raw):
+        message = json.loads(raw)
+        self.sent.append(message)
+        if self.replies is not None and message["method"] in self.replies:
+            result = self.replies[message["method"]]
+            self.push({"id": message["id"], "result": result(message["params"]) if callable(result) else result})
+
+    def push(self, message):
+        self.incoming.put_nowait(json.dumps(message))
+
+    def disconnect(self):
+        self.incoming.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raw = await self.incoming.get()
+        if raw is None:
+            raise StopAsyncIteration
+        return raw
+
+    async def close(self):
+        self.disconnect()
+
+
+async def settle():
+    """Let the connection's reader task process what was pushed"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+# ── CDPConnection ────────────────────────────────────────────────────────────
+
+def test_responses_are_matched_to_requests_by_id():
+    async def scenario():
+        ws = FakeSocket()
+        connection = CDPConnection(ws)
+        first = asyncio.ensure_future(connection.send("Page.navigate", {"url": "a"}))
+        second = asyncio.ensure_future(connection.send("Runtime.evaluate", session_id="S1"))
+        await settle()
+
+        # Answered out of order
+        ws.push({"id": ws.sent[1]["id"], "result": {"value": 2}})
+        ws.push({"id": ws.sent[0]["id"], "result": {"frameId": "F"}})
+        results = await asyncio.gather(first, second)
+        await connection.close()
+        return ws.sent, results
+
+    sent, results = run(scenario())
+
+    assert results == [{"frameId": "F"}, {"value": 2}]
+    assert [m["id"] for m in sent] == [1, 2]
+    assert "sessionId" not in sent[0] and sent[1]["sessionId"] == "S1"
+
+
+def test_error_replies_raise_cdp_error():
+    async def scenario():
+        ws = FakeSocket()
+        connection = CDPConnection(ws)
+        pending = asyncio.ensure_future(connection.send("DOM.describeNode"))
+        await settle()
+        ws.push({"id": ws.sent[0]["id"], "error": {"code": -32000, "message": "Could not find object"}})
+        try:
+            with pytest.raises(CDPError, match=r"Could not find object \(-32000\)"):
+                await pending
+        finally:
+            await connection.close()
+
+    run(scenario())
+
+
+def test_events_go_to_the_handler_of_their_session():
+    async def scenario():
+        ws = FakeSocket()
+        connection = CDPConnection(ws)
+        seen = {"browser": [], "S1": [], "S2": []}
+        connection.subscribe(None, lambda method, params: seen["browser"].append(method))
+        connection.subscribe("S1", lambda method, params: seen["S1"].append(params["n"]))
+        connection.subscribe("S2", lambda method, params: seen["S2"].append(params["n"]))
+
+        ws.push({"method": "Target.targetCreated", "params": {}})
+        ws.push({"method": "Page.loadEventFired", "params": {"n": 1}, "sessionId": "S1"})
+        ws.push({"method": "Page.loadEventFired", "params": {"n": 2}, "sessionId": "S2"})
+        ws.push({"method": "Page.loadEventFired", "params": {"n": 3}, "sessionId": "gone"})
+        await settle()
+        connection.unsubscribe("S2")
+        ws.push({"method": "Page.loadEventFired", "params": {"n": 4}, "sessionId": "S2"})
+        await settle()
+        await connection.close()
+        return seen
+
+    assert run(scenario()) == {"browser": ["Target.targetCreated"], "S1": [1], "S2": [2]}
+
+
+def test_a_failing_event_handler_does_not_stop_the_reader():
+    async def scenario():
+        ws = FakeSocket({"Browser.getVersion": {"product": "Chrome"}})
+        connection = CDPConnection(ws)
+        connection.subscribe(None, lambda method, params: 1 / 0)
+        ws.push({"method": "Target.targetCreated", "params": {}})
+        try:
+            return await connection.send("Browser.getVersion")
+        finally:
+            await connection.close()
+
+    assert run(scenario()) == {"product": "Chrome"}
+
+
+def test_pending_requests_fail_when_the_browser_disconnects():
+    async def scenario():
+        ws = FakeSocket()
+        connection = CDPConnection(ws)
+        pending = asyncio.ensure_future(connection.send("Page.navigate"))
+        await settle()
+        ws.disconnect()
+
+        with pytest.raises(CDPError, match="browser disconnected"):
+            await pending
+        assert connection.closed
+        with pytest.raises(CDPError, match="browser disconnected"):
+            await connection.send("Page.reload")
+
+    run(scenario())
+
+
+def test_unanswered_commands_time_out():
+    async def scenario():
+        connection = CDPConnection(FakeSocket())
+        try:
+            with pytest.raises(TimeoutException, match="Page.navigate"):
+                await connection.send("Page.navigate", timeout=0.05)
+        finally:
+            await connection.close()
+
+    run(scenario())
+
+
+# ── CDPPage ──────────────────────────────────────────────────────────────────
+
+class FakeBrowser:
+    def __init__(self, connection):
+        self.connection = connection
+
+
+async def open_page(replies):
+    ws = FakeSocket(replies)
+    page = CDPPage(FakeBrowser(CDPConnection(ws)), "T1", "S1")
+    page.main_frame = "F1"
+    page.contexts["F1"] = 7
+    return ws, page
+
+
+def test_locators_are_passed_to_find_js():
+    replies = {
+        "Runtime.callFunctionOn": {"result": {"type": "object", "objectId": "array-1"}},
+        "Runtime.getProperties": {"result": [
+            {"name": "1", "value": {"objectId": "el-b"}},
+            {"name": "0", "value": {"objectId": "el-a"}},
+            {"name": "length", "value": {"value": 2}},
+        ]},
+        "Runtime.releaseObject": {},
+    }
+
+    async def scenario():
+        ws, page = await open_page(replies)
+        found = await page.query(By.XPATH, '//input[@id="userid"]')
+        await page.query(By.NAME, "AgreeTerms", object_id="form-1")
+        await page.browser.connection.close()
+        return ws.sent, found
+
+    sent, found = run(scenario())
+
+    assert found == ["el-a", "el-b"]
+    calls = [m["params"] for m in sent if m["method"] == "Runtime.callFunctionOn"]
+    assert calls[0]["functionDeclaration"] == cdp_driver.FIND_JS
+    assert calls[0]["arguments"] == [{"value": "xpath"}, {"value": '//input[@id="userid"]'}]
+    assert calls[0]["executionContextId"] == 7 and calls[0]["returnByValue"] is False
+    assert calls[1]["arguments"] == [{"value": "name"}, {"value": "AgreeTerms"}]
+    assert calls[1]["objectId"] == "form-1"
+    assert {"method": "Runtime.releaseObject", "params": {"objectId": "array-1"}} in [
+        {k: m[k] for k in ("method", "params")} for m in sent]
+
+
+@pytest.mark.parametrize("by", [By.ID, By.NAME, By.XPATH, By.CLASS_NAME, By.LINK_TEXT, By.PARTIAL_LINK_TEXT])
+def test_find_js_has_a_branch_for_each_named_strategy(by):
+    # By.CSS_SELECTOR and By.TAG_NAME values are valid CSS and use the fallthrough
+    assert f'"{by}"' in cdp_driver.FIND_JS
+
+
+def test_special_keys_match_seleniums_keys():
+    assert cdp_driver.SPECIAL_KEYS[Keys.ENTER] == ("Enter", 13)
+    assert cdp_driver.SPECIAL_KEYS[Keys.RETURN] == ("Enter", 13)
+    assert cdp_driver.SPECIAL_KEYS[Keys.TAB] == ("Tab", 9)
+    assert cdp_driver.SPECIAL_KEYS[Keys.BACKSPACE] == ("Backspace", 8)
+    assert cdp_driver.SPECIAL_KEYS[Keys.ESCAPE] == ("Escape", 27)
+    assert cdp_driver.SPECIAL_KEYS[Keys.DELETE] == ("Delete", 46)
+
+
+def test_typed_text_becomes_insert_text_and_key_events():
+    replies = {"Runtime.callFunctionOn": {"result": {}}, "Input.insertText": {}, "Input.dispatchKeyEvent": {}}
+
+    async def scenario():
+        ws, page = await open_page(replies)
+        await page.type_text("el-1", "dealer" + Keys.TAB + "pw" + Keys.ENTER)
+        await page.browser.connection.close()
+        return ws.sent
+
+    sent = run(scenario())
+
+    assert sent[0]["params"]["objectId"] == "el-1"
+    assert [(m["method"], m["params"]) for m in sent[1:]] == [
+        ("Input.insertText", {"text": "dealer"}),
+        ("Input.dispatchKeyEvent", {"type": "keyDown", "key": "Tab", "windowsVirtualKeyCode": 9}),
+        ("Input.dispatchKeyEvent", {"type": "keyUp", "key": "Tab", "windowsVirtualKeyCode": 9}),
+        ("Input.insertText", {"text": "pw"}),
+        ("Input.dispatchKeyEvent", {"type": "keyDown", "key": "Enter", "windowsVirtualKeyCode": 13, "text": "\r"}),
+        ("Input.dispatchKeyEvent", {"type": "keyUp", "key": "Enter", "windowsVirtualKeyCode": 13}),
+    ]
+    assert all(m["sessionId"] == "S1" for m in sent)
+
+
+def test_reload_without_a_load_event_raises_selenium_timeout():
+    async def scenario():
+        ws, page = await open_page({"Page.reload": {}})
+        try:
+            with pytest.raises(TimeoutException, match="reloading"):
+                await page.reload(timeout=0.05)
+        finally:
+            await page.browser.connection.close()
+
+    run(scenario())
+
+
+def test_reload_waits_for_the_load_event():
+    async def scenario():
+        ws, page = await open_page({"Page.reload": {}})
+        reloading = asyncio.ensure_future(page.reload(timeout=5))
+        await settle()
+        ws.push({"method": "Page.loadEventFired", "params": {}, "sessionId": "S1"})
+        await reloading
+        await page.browser.connection.close()
+        return [m["method"] for m in ws.sent]
+
+    assert run(scenario()) == ["Page.reload"]
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node to run FIND_JS")
+@pytest.mark.parametrize("by, value, selector", [
+    (By.ID, "userid", "#userid"),
+    (By.NAME, "AgreeTerms", '[name="AgreeTerms"]'),
+    (By.NAME, 'say "hi"', '[name="say \\"hi\\""]'),
+    (By.CLASS_NAME, "cat-prd-id", ".cat-prd-id"),
+    (By.CSS_SELECTOR, "td.cat-prd-qty", "td.cat-prd-qty"),
+    (By.TAG_NAME, "frame", "frame"),
+])
+def test_find_js_turns_locators_into_css(by, value, selector):
+    # A root node that records the selector it is queried with
+    script = (
+        "globalThis.CSS = {escape: s => s};"
+        "const root = {nodeType: 1, ownerDocument: {}, querySelectorAll(css) { return [css]; }};"
+        f"const find = {cdp_driver.FIND_JS};"
+        f"process.stdout.write(JSON.stringify(find.call(root, {json.dumps(by)}, {json.dumps(value)})));"
+    )
+    output = subprocess.run(["node", "-e", script], capture_output=True, text=True, check=True).stdout
+
+    assert json.loads(output) == [selector]
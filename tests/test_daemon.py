@@ -0,0 +1,77 @@
+"""
+daemon's warm BrowserPool with a stand-in launcher, and the warm-up order.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scraper  # noqa: E402
+from daemon import BrowserPool  # noqa: E402
+
+
+class StandInBrowser:
+    def __init__(self, key):
+        self.key = key
+        self.quit_called = False
+
+    def quit(self):
+        self.quit_called = True
+
+
+class Launcher:
+    def __init__(self):
+        self.browsers = []
+
+    def __call__(self, key, use_proxy):
+        browser = StandInBrowser(key)
+        self.browsers.append(browser)
+        return browser
+
+
+def test_take_serves_warm_browsers_in_plan_order():
+    launch = Launcher()
+    pool = BrowserPool(launch)
+    pool.prewarm(["a", "a-rt", "b", "b-rt"])
+    try:
+        assert [pool.take(key).key for key in ["a", "a-rt", "b", "b-rt"]] == ["a", "a-rt", "b", "b-rt"]
+    finally:
+        pool.drain()
+    assert not any(browser.quit_called for browser in launch.browsers)
+
+
+def test_out_of_order_take_quits_only_the_skipped_browser():
+    launch = Launcher()
+    pool = BrowserPool(launch)
+    pool.prewarm(["a", "a-rt", "b", "b-rt"])
+    try:
+        # The catalog for "a" was read over HTTP, so its browser is never taken
+        assert pool.take("a-rt") is None
+        assert pool.take("b").key == "b"
+        assert pool.take("b-rt").key == "b-rt"
+    finally:
+        pool.drain()
+    pool._executor.shutdown(wait=True)
+
+    quit_keys = [browser.key for browser in launch.browsers if browser.quit_called]
+    assert quit_keys == ["a"]
+
+
+def test_unplanned_take_is_not_served():
+    pool = BrowserPool(Launcher())
+    pool.prewarm(["a"])
+    try:
+        assert pool.take("elsewhere") is None
+        assert pool.take("a").key == "a"
+    finally:
+        pool.drain()
+
+
+def test_warm_up_order_follows_the_run_plan(monkeypatch):
+    monkeypatch.setenv("ACCOUNT_PRIORITIES", "first=2,second=1")
+    accounts = [
+        {'user_id': 'first', 'report_user_id': 'first-rt'},
+        {'user_id': 'second', 'report_user_id': 'second-rt'},
+    ]
+    assert [plan.user_id for plan in scraper.plan_accounts(accounts)] == ["second", "first"]
@@ -0,0 +1,88 @@
+"""
+deadline budgets for critical and non-critical accounts.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deadline import (  # noqa: E402
+    CRITICAL_FLOOR_SECONDS, RTPOS_SHARE, AccountPlan, Budget, RunDeadline
+)
+
+
+def expired_budget(critical):
+    budget = Budget("acct", 600, critical=critical)
+    budget.end = budget.start - 1  # catalog overran the whole account budget
+    return budget
+
+
+def test_critical_account_with_expired_budget_keeps_its_waits():
+    budget = expired_budget(critical=True)
+    assert budget.expired()
+
+    rtpos = budget.phase("rtpos", RTPOS_SHARE)
+    assert rtpos.critical
+    assert rtpos.seconds == CRITICAL_FLOOR_SECONDS
+    assert rtpos.cap(300) == 300
+    assert rtpos.cap(240) == 240
+    assert rtpos.cap(120) == 120
+    assert budget.cap(300) == 300
+
+
+def test_non_critical_account_with_expired_budget_is_cut_to_zero():
+    budget = expired_budget(critical=False)
+
+    rtpos = budget.phase("rtpos", RTPOS_SHARE)
+    assert not rtpos.critical
+    assert rtpos.seconds == 0
+    assert rtpos.cap(300) == 0
+
+
+def test_caps_follow_the_remaining_time_otherwise():
+    budget = Budget("acct", 10000, critical=True)
+    assert budget.cap(300) == 300
+    assert Budget("acct", 100).cap(300) in (99, 100)
+
+
+def test_account_budget_marks_critical_accounts():
+    deadline = RunDeadline(seconds=3600)
+    critical = AccountPlan({'user_id': 'a'}, 1, 600)
+    optional = AccountPlan({'user_id': 'b'}, 2, 600)
+
+    assert deadline.account_budget(critical, []).critical
+    assert not deadline.account_budget(optional, []).critical
+
+
+class TablessDriver:
+    """Catalog session whose extra tabs never open, so sections fall back to the main tab"""
+    current_window_handle = "main"
+
+    class switch_to:
+        @staticmethod
+        def window(handle):
+            pass
+
+
+def test_expired_catalog_budget_cuts_waits_and_skips_fallback_sections(monkeypatch):
+    import scraper
+
+    def no_tab(driver, home_url):
+        raise RuntimeError("tab did not open")
+
+    calls = []
+    monkeypatch.setattr(scraper, "open_section_tab", no_tab)
+    monkeypatch.setattr(scraper, "enter_catalog_frame", lambda driver, frame: None)
+    monkeypatch.setattr(scraper, "extract_catalog_items", lambda driver, name: [])
+    monkeypatch.setattr(scraper, "wait_for_catalog_items",
+                        lambda driver, timeout=20: calls.append(("wait", timeout)))
+    monkeypatch.setattr(scraper, "click_section_link",
+                        lambda driver, section, timeout=30: calls.append((section["name"], timeout)))
+
+    scraper.harvest_catalog_sections(TablessDriver(), "home", time_budget=expired_budget(critical=False))
+    assert calls == [("wait", 0)]
+
+    calls.clear()
+    scraper.harvest_catalog_sections(TablessDriver(), "home", time_budget=expired_budget(critical=True))
+    assert calls == [("wait", 20), ("CPO", 10)]
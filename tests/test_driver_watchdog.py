@@ -0,0 +1,50 @@
+"""
+DriverWatchdog's unresponsiveness check against a stand-in driver.
+"""
+
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from driver_watchdog import PAGE_LOAD_GRACE_SECONDS, DriverWatchdog  # noqa: E402
+
+
+class LoadingDriver:
+    """Chromedriver busy with a driver.get(): CDP commands block until released"""
+
+    def __init__(self, page_load):
+        self.timeouts = SimpleNamespace(page_load=page_load)
+        self.released = threading.Event()
+
+    def execute_cdp_cmd(self, cmd, params):
+        self.released.wait()
+        return {}
+
+
+def silent_watchdog(page_load, silent_for):
+    driver = LoadingDriver(page_load)
+    watchdog = DriverWatchdog(driver, "test", interval=1, unresponsive_seconds=120)
+    watchdog._last_response = time.time() - silent_for
+    return driver, watchdog
+
+
+def test_silence_during_a_page_load_is_tolerated():
+    driver, watchdog = silent_watchdog(page_load=300, silent_for=200)
+    try:
+        assert watchdog.silence_limit == 300 + PAGE_LOAD_GRACE_SECONDS
+        assert watchdog._check() is None
+    finally:
+        driver.released.set()
+
+
+def test_silence_past_the_page_load_timeout_trips():
+    driver, watchdog = silent_watchdog(page_load=60, silent_for=200)
+    try:
+        assert watchdog.silence_limit == 120
+        assert "no CDP response" in watchdog._check()
+    finally:
+        driver.released.set()
@@ -0,0 +1,36 @@
+"""
+Email bodies list only the accounts they are sent for.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scraper  # noqa: E402
+
+SUMMARIES = [
+    {'account': 'IOTPHILLY', 'items_with_stock': 12, 'order_total': 1500.0,
+     'store_totals': [('Philly 1', 1500.0)], 'report_paths': ['a.xlsx']},
+    {'account': 'IOTBAWA', 'items_with_stock': 7, 'order_total': 820.5,
+     'store_totals': [('Bawa 1', 820.5)], 'report_paths': ['b.xlsx', 'b.csv']},
+]
+
+
+def test_per_account_body_leaves_out_other_accounts():
+    body = scraper.email_body_for([SUMMARIES[1]], 2, "2026-10-19")
+
+    assert "IOTBAWA: 7 items with stock" in body
+    assert "$820.50" in body and "Bawa 1" in body
+    assert "Total Reports: 2" in body
+    assert "IOTPHILLY" not in body
+    assert "Philly 1" not in body
+    assert "1,500.00" not in body
+
+
+def test_combined_body_lists_every_account():
+    body = scraper.email_body_for(SUMMARIES, 3, "2026-10-19")
+
+    assert "IOTPHILLY: 12 items with stock" in body
+    assert "IOTBAWA: 7 items with stock" in body
+    assert "Total Reports: 3" in body
@@ -0,0 +1,30 @@
+"""
+history_store phase trends on a throwaway database.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_store import open_store  # noqa: E402
+
+
+def test_week_with_only_failures_stays_in_the_trend(tmp_path):
+    store = open_store(str(tmp_path / "history.db"))
+    try:
+        store.record_phase(None, "IOTPHILLY", "2026-10-05", "catalog", 100, "ok")
+        store.record_phase(None, "IOTPHILLY", "2026-10-06", "catalog", 110, "failed")
+        store.record_phase(None, "IOTPHILLY", "2026-10-13", "catalog", 90, "failed")
+        store.record_phase(None, "IOTPHILLY", "2026-10-14", "catalog", 95, "error")
+
+        trend = store.phase_trend().set_index('week')
+    finally:
+        store.close()
+
+    assert list(trend.index) == ["2026-W41", "2026-W42"]
+    assert trend.loc["2026-W41", 'runs'] == 1
+    assert trend.loc["2026-W41", 'failures'] == 1
+    assert trend.loc["2026-W41", 'median_seconds'] == 100
+    assert trend.loc["2026-W42", 'runs'] == 0
+    assert trend.loc["2026-W42", 'failures'] == 2
@@ -0,0 +1,203 @@
+"""
+mailer against a local SMTP stand-in.
+
+The stand-in speaks just enough SMTP (EHLO, MAIL, RCPT, DATA, NOOP, QUIT)
+on 127.0.0.1, keeps every message it receives and counts connections. It
+can drop all open connections to play a server that times out idle
+sessions between messages, or hang up right after answering a NOOP.
+"""
+
+import os
+import sys
+import email
+import socket
+import threading
+import socketserver
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mailer import Mailer  # noqa: E402
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPSession)
+        self.messages = []          # (recipient, email.message.Message)
+        self.connections = 0
+        self.open = set()
+        self.drop_after_noop = False    # answer the next NOOP, then hang up
+        self.lock = threading.Lock()
+
+    def drop_connections(self):
+        with self.lock:
+            sockets, self.open = list(self.open), set()
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+
+class SMTPSession(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+            self.server.open.add(self.request)
+        recipients = []
+        try:
+            self.reply("220 stand-in ESMTP")
+            for raw in self.rfile:
+                command = raw.decode().strip()
+                verb = command.split(" ", 1)[0].upper()
+                if verb == "EHLO":
+                    self.reply("250-stand-in")
+                    self.reply("250 8BITMIME")
+                elif verb in ("HELO", "NOOP", "RSET"):
+                    self.reply("250 OK")
+                    if verb == "NOOP" and self.server.drop_after_noop:
+                        self.server.drop_after_noop = False
+                        return
+                elif verb == "MAIL":
+                    recipients = []
+                    self.reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command.split(":", 1)[1].strip().strip("<>"))
+                    self.reply("250 OK")
+                elif verb == "DATA":
+                    self.reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = []
+                    for line in self.rfile:
+                        if line == b".\r\n":
+                            break
+                        data.append(line)
+                    message = email.message_from_bytes(b"".join(data))
+                    with self.server.lock:
+                        self.server.messages.extend((r, message) for r in recipients)
+                    self.reply("250 Queued")
+                elif verb == "QUIT":
+                    self.reply("221 Bye")
+                    return
+                else:
+                    self.reply("502 Not implemented")
+        except (OSError, ValueError):
+            pass    # dropped by drop_connections()
+        finally:
+            with self.server.lock:
+                self.server.open.discard(self.request)
+
+
+@pytest.fixture
+def smtp():
+    server = SMTPStandIn()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def reports(tmp_path):
+    """Four 60 KB report files"""
+    paths = []
+    for index in range(4):
+        path = tmp_path / f"IDOO-IOT{index}.xlsx"
+        path.write_bytes(os.urandom(60_000))
+        paths.append(str(path))
+    return paths
+
+
+def mailer_for(server, **kwargs):
+    host, port = server.server_address
+    return Mailer(host=host, port=port, user="", password="", starttls=False, **kwargs)
+
+
+def attachments(message):
+    return {part.get_filename(): part.get_payload(decode=True)
+            for part in message.walk() if part.get_filename()}
+
+
+def test_large_attachments_are_split_across_messages(smtp, reports):
+    # 64 KB overhead + two ~81 KB encoded attachments fit under 300 KB, three don't
+    with mailer_for(smtp, max_bytes=300_000) as mailer:
+        sent = mailer.send("IDOO Inventory Report", "Reports attached", reports, "ops@stand-in.test")
+
+    assert sent == 2
+    subjects = [message["Subject"] for _, message in smtp.messages]
+    assert subjects == ["IDOO Inventory Report (part 1/2)", "IDOO Inventory Report (part 2/2)"]
+
+    received = {}
+    for _, message in smtp.messages:
+        received.update(attachments(message))
+    assert received == {os.path.basename(p): open(p, "rb").read() for p in reports}
+
+
+def test_every_recipient_gets_every_part_over_one_connection(smtp, reports):
+    recipients = "ops@stand-in.test, buyer@stand-in.test"
+    with mailer_for(smtp, max_bytes=300_000) as mailer:
+        sent = mailer.send("IDOO Inventory Report", "Reports attached", reports, recipients)
+
+    assert sent == 4
+    assert smtp.connections == 1
+    for recipient in ("ops@stand-in.test", "buyer@stand-in.test"):
+        files = set()
+        for to, message in smtp.messages:
+            if to == recipient:
+                assert message["To"] == recipient
+                files.update(attachments(message))
+        assert files == {os.path.basename(p) for p in reports}
+
+
+def test_reconnects_after_the_server_drops_the_connection(smtp, reports):
+    with mailer_for(smtp) as mailer:
+        mailer.send("First", "body", reports[:1], "ops@stand-in.test")
+        assert smtp.connections == 1
+
+        smtp.drop_connections()
+        mailer.send("Second", "body", reports[1:2], "ops@stand-in.test")
+
+    assert smtp.connections == 2
+    assert [message["Subject"] for _, message in smtp.messages] == ["First", "Second"]
+
+
+def test_resends_when_the_connection_drops_mid_transaction(smtp, reports):
+    with mailer_for(smtp) as mailer:
+        mailer.send("First", "body", reports[:1], "ops@stand-in.test")
+
+        # The NOOP liveness check passes, then MAIL FROM finds the socket closed
+        smtp.drop_after_noop = True
+        mailer.send("Second", "body", reports[1:2], "ops@stand-in.test")
+
+    assert smtp.connections == 2
+    assert [message["Subject"] for _, message in smtp.messages] == ["First", "Second"]
+
+
+def test_attachment_too_large_for_any_message_is_left_out(smtp, reports, tmp_path):
+    huge = tmp_path / "huge.xlsx"
+    huge.write_bytes(os.urandom(400_000))
+
+    with mailer_for(smtp, max_bytes=300_000) as mailer:
+        batches = mailer.prepare([str(huge)] + reports[:1])
+
+    assert batches == [[(reports[0], os.path.basename(reports[0]))]]
+
+
+def test_non_ascii_attachment_names_survive(smtp, tmp_path):
+    shard = tmp_path / "IDOO-IOTPHILLY-ZÜRICH OST.xlsx"
+    quoted = tmp_path / 'IDOO "draft".xlsx'
+    shard.write_bytes(b"shard")
+    quoted.write_bytes(b"draft")
+
+    with mailer_for(smtp) as mailer:
+        mailer.send("IDOO Inventory Report", "body", [str(shard), str(quoted)], "ops@stand-in.test")
+
+    (_, message), = smtp.messages
+    assert attachments(message) == {shard.name: b"shard", quoted.name: b"draft"}
@@ -0,0 +1,150 @@
+"""
+proxy_pool against local stand-in proxies.
+
+Each stand-in is a plain HTTP proxy on 127.0.0.1 that answers every
+proxied request itself; a "dead" proxy is a port nobody listens on.
+"""
+
+import os
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import proxy_pool  # noqa: E402
+import scraper  # noqa: E402
+from retry import RetryError  # noqa: E402
+
+HEALTH_URL = "http://rtpos.stand-in/newbdi/index.fwx"
+
+
+class StandInProxy(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # A forward proxy gets the absolute URL in the request line
+        self.server.requests.append(self.path)
+        body = b"<html>login</html>"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def proxies():
+    """Start stand-in proxies; returns a function giving n proxy URLs"""
+    servers = []
+
+    def start(n):
+        urls = []
+        for _ in range(n):
+            server = ThreadingHTTPServer(("127.0.0.1", 0), StandInProxy)
+            server.requests = []
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            servers.append(server)
+            urls.append(f"http://127.0.0.1:{server.server_port}")
+        return urls
+
+    start.servers = servers
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def dead_proxy_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+def make_pool(urls, **kwargs):
+    return proxy_pool.ProxyPool(urls, health_url=HEALTH_URL, check_timeout=2, **kwargs)
+
+
+def test_health_check_goes_through_the_proxy(proxies):
+    pool = make_pool(proxies(1))
+
+    assert pool.check_all() == 1
+    assert proxies.servers[0].requests == [HEALTH_URL]
+
+
+def test_assignment_is_sticky_per_session(proxies):
+    pool = make_pool(proxies(2))
+
+    first = pool.acquire("IOTPHILLY")
+    other = pool.acquire("iotbawa")
+
+    assert pool.acquire("iotphilly") is first
+    assert pool.acquire("IOTBAWA") is other
+    assert first is not other
+
+
+def test_round_robin_skips_unhealthy_proxies(proxies):
+    healthy = proxies(2)
+    pool = make_pool([healthy[0], dead_proxy_url(), healthy[1]])
+
+    assert pool.check_all() == 2
+    assigned = [pool.acquire(f"session-{i}").url for i in range(4)]
+
+    assert assigned == [healthy[0], healthy[1], healthy[0], healthy[1]]
+
+
+def test_repeated_failures_evict_and_reassign(proxies):
+    pool = make_pool(proxies(2), max_failures=2)
+    pool.check_all()
+    first = pool.acquire("iotphilly")
+
+    pool.report(first, False)
+    assert pool.acquire("iotphilly") is first
+
+    pool.report(first, False)
+    assert not first.is_available()
+    replacement = pool.acquire("iotphilly")
+    assert replacement is not first and replacement.is_available()
+
+
+def test_success_resets_the_failure_count(proxies):
+    pool = make_pool(proxies(1), max_failures=2)
+    pool.check_all()
+    proxy = pool.acquire("iotphilly")
+
+    pool.report(proxy, False)
+    pool.report(proxy, True)
+    pool.report(proxy, False)
+
+    assert proxy.is_available()
+
+
+class Driver:
+    def __init__(self, proxy):
+        self.proxy = proxy
+
+
+@pytest.mark.parametrize("error, counts", [
+    (scraper.LoginRejected("credentials may be wrong"), False),
+    (scraper.PageUnavailable("Login form not found"), True),
+    (Exception("Frameset did not appear"), False),
+])
+def test_only_navigation_failures_count_against_the_proxy(proxies, monkeypatch, error, counts):
+    pool = make_pool(proxies(1), max_failures=1)
+    pool.check_all()
+    proxy = pool.acquire("iotphilly")
+    monkeypatch.setattr(scraper, "get_proxy_pool", lambda: pool)
+
+    scraper.report_proxy(Driver(proxy), False, RetryError("Login", 3, error))
+
+    assert proxy.is_available() is not counts
+
+
+def test_chrome_connection_errors_count_against_the_proxy():
+    from selenium.common.exceptions import WebDriverException
+
+    assert scraper.navigation_failed(WebDriverException("unknown error: net::ERR_PROXY_CONNECTION_FAILED"))
+    assert not scraper.navigation_failed(WebDriverException("element not interactable"))
@@ -0,0 +1,56 @@
+"""
+retry_call attempts and circuit-breaker accounting.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import retry  # noqa: E402
+from retry import RetryError, RetryPolicy, retry_call  # noqa: E402
+
+POLICY = RetryPolicy(attempts=3, base_delay=0, max_delay=0)
+
+
+class Rejected(Exception):
+    pass
+
+
+def failing(error, calls):
+    def attempt(n):
+        calls.append(n)
+        raise error
+    return attempt
+
+
+def test_give_up_on_is_not_retried_or_counted_against_the_host():
+    calls = []
+    with pytest.raises(Rejected):
+        retry_call("login", failing(Rejected("bad password"), calls), POLICY,
+                   host="rejected.test", give_up_on=Rejected)
+    assert calls == [0]
+    assert retry.get_breaker("rejected.test").failures == 0
+
+
+def test_other_errors_are_retried_and_counted():
+    calls = []
+    with pytest.raises(RetryError):
+        retry_call("login", failing(ValueError("page down"), calls), POLICY,
+                   host="flaky.test", give_up_on=Rejected)
+    assert calls == [0, 1, 2]
+    assert retry.get_breaker("flaky.test").failures == 3
+
+
+def test_policy_within_a_budget():
+    from deadline import Budget
+
+    assert POLICY.within(None) is POLICY
+    assert RetryPolicy(budget=90).within(Budget("catalog", 30)).budget in (29, 30)
+    assert RetryPolicy(budget=90).within(Budget("catalog", 600)).budget == 90
+
+    spent = Budget("catalog", 60)
+    spent.end = spent.start - 1
+    assert RetryPolicy(budget=90).within(spent).budget == 0
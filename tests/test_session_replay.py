@@ -0,0 +1,336 @@
+"""
+Record and replay round trip against a stand-in browser.
+
+StandInBrowser serves a tiny b2b_tmo catalog and RT POS report from HTML
+strings: framesets, the catalog sections, the login forms and the export
+button, which writes the report into the download directory like Chrome
+would. do_login(), the catalog harvest and download_report() run once
+through a RecordingDriver around it, then again from the recording through
+ReplayDriver with no stand-in at all.
+"""
+
+import os
+import sys
+import time
+
+import lxml.html
+import pytest
+from selenium.common.exceptions import NoSuchElementException, NoSuchFrameException
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import artifact_store  # noqa: E402
+import diagnostics  # noqa: E402
+import scraper  # noqa: E402
+import session_replay  # noqa: E402
+
+TMO_USER, TMO_PASSWORD = "iotphilly", "catalog-s3cret"
+RTPOS_USER, RTPOS_PASSWORD = "phillyreports", "rtpos-s3cret"
+SESSION_TOKEN = "A1B2C3D4E5"
+HOME_URL = f"https://www.t-mobiledealerordering.com/b2b_tmo/home.do;jsessionid={SESSION_TOKEN}"
+EXPORT_BYTES = b"reorder export, 7 days"
+
+CATALOG = {
+    "Phones": [("SKU1", "Allocation : 5 of 20"), ("SKU2", "Allocation : 0 of 10")],
+    "CPO": [("CPO1", "Allocation : 4 of 4"), ("SKU1", "Allocation : 3 of 9")],
+}
+EXPECTED_ROWS = [("Phones", "SKU1", "5"), ("CPO", "CPO1", "4")]
+
+
+# ── Stand-in browser ─────────────────────────────────────────────────────────
+
+def document(html):
+    return lxml.html.document_fromstring(html)
+
+
+class StandInElement:
+    def __init__(self, browser, node):
+        self._browser = browser
+        self._node = node
+
+    def find_element(self, by, value):
+        found = self.find_elements(by, value)
+        if not found:
+            raise NoSuchElementException(value)
+        return found[0]
+
+    def find_elements(self, by, value):
+        return [StandInElement(self._browser, n) for n in self._node.xpath("." + value)]
+
+    def get_attribute(self, name):
+        if name == "outerHTML":
+            return lxml.html.tostring(self._node, encoding="unicode")
+        if name in ("innerText", "textContent"):
+            return self._node.text_content()
+        return self._node.get(name)
+
+    def is_displayed(self):
+        return True
+
+    def clear(self):
+        self._node.set("value", "")
+
+    def send_keys(self, *values):
+        self._node.set("value", (self._node.get("value") or "") + "".join(values))
+
+    def click(self):
+        self._browser.clicked(self._node)
+
+
+class StandInSwitchTo:
+    def __init__(self, browser):
+        self._browser = browser
+
+    def default_content(self):
+        self._browser.tab["frame"] = []
+
+    def frame(self, name):
+        if name not in self._browser.frames():
+            raise NoSuchFrameException(name)
+        self._browser.tab["frame"].append(name)
+
+    def window(self, handle):
+        self._browser.handle = handle
+
+    def new_window(self, type_hint=None):
+        self._browser.handle = f"tab-{len(self._browser.tabs)}"
+        self._browser.tabs[self._browser.handle] = {"url": "about:blank", "frame": [], "doc": None}
+
+
+class StandInBrowser:
+    """Just enough of a WebDriver over the two sites' pages"""
+
+    def __init__(self, download_dir):
+        self.download_dir = download_dir
+        self.handle = "tab-0"
+        self.tabs = {"tab-0": {"url": "about:blank", "frame": [], "doc": None}}
+        self.rtpos_logged_in = False
+        self.grid = False
+        self.switch_to = StandInSwitchTo(self)
+
+    @property
+    def tab(self):
+        return self.tabs[self.handle]
+
+    # pages
+
+    def get(self, url):
+        if url == scraper.RTPOS_REPORT_URL and not self.rtpos_logged_in:
+            url = scraper.RTPOS_LOGIN_URL
+        self.tab.update(url=url, frame=[], doc=None, catalog=False, section="Phones")
+        self.grid = False
+
+    def _tree(self):
+        """{"html": page, "frames": {name: subtree}} for the current tab"""
+        url = self.tab["url"]
+        if url == scraper.TMO_LOGIN_URL:
+            return {"html": '<html><body><form><input id="userid"/><input id="password" type="password"/>'
+                            '<input name="AgreeTerms" type="checkbox"/><a name="login">Log in</a></form></body></html>'}
+        if url == HOME_URL:
+            return {"html": '<html><frameset id="isaTopFS"><frame name="isaTop"/></frameset></html>', "frames": {
+                "isaTop": {"html": '<html><frameset><frame name="header"/><frame name="form_input"/></frameset></html>',
+                           "frames": {
+                               "header": {"html": '<html><body><a onclick="show_catalog_view()">Catalog</a></body></html>'},
+                               "form_input": {"html": self._catalog_html()},
+                           }}
+            }}
+        if url == scraper.RTPOS_LOGIN_URL:
+            return {"html": '<html><body><input name="secUserID"/><input name="secPassword" type="password"/>'
+                            '<input type="submit" value="Login"/></body></html>'}
+        if url == scraper.RTPOS_REPORT_URL:
+            grid = ('<table><tr class="dx-row dx-data-row"><td class="dx-cell">SKU1</td></tr></table>'
+                    '<i class="dx-icon dx-icon-export-excel-button"></i>') if self.grid else ""
+            return {"html": f'<html><body><p>Signed in as {RTPOS_USER}</p>'
+                            f'<input type="password" name="keepalive" value="{RTPOS_PASSWORD}"/>'
+                            f'<input name="frmDays"/><button><span>Generate</span></button>{grid}</body></html>'}
+        return {"html": "<html><body></body></html>"}
+
+    def _catalog_html(self):
+        if not self.tab.get("catalog"):
+            return "<html><body><p>Welcome</p></body></html>"
+        items = "".join(
+            f'<div class="catalauge-item-holder "><div class="cat-prd-id">{sku}</div>'
+            f'<table><tr><td class="cat-prd-qty">{qty}</td></tr></table></div>'
+            for sku, qty in CATALOG[self.tab["section"]]
+        )
+        return ('<html><body><div class="cat-secnav-areaname"><a><span>CPO</span></a></div>'
+                f'<div class="catItemList-holder">{items}</div></body></html>')
+
+    def _current(self):
+        tree = self._tree()
+        for name in self.tab["frame"]:
+            tree = tree["frames"][name]
+        return tree
+
+    def frames(self):
+        return self._current().get("frames", {})
+
+    def _doc(self):
+        # Keep the parsed page while nothing changed, so typed values stick
+        key = (self.tab["url"], tuple(self.tab["frame"]), self.tab.get("catalog"), self.tab.get("section"), self.grid)
+        if self.tab.get("doc_key") != key:
+            self.tab.update(doc=document(self._current()["html"]), doc_key=key)
+        return self.tab["doc"]
+
+    def clicked(self, node):
+        doc = node.getroottree()
+        if node.get("name") == "login":
+            typed = (doc.xpath('//input[@id="userid"]')[0].get("value"),
+                     doc.xpath('//input[@id="password"]')[0].get("value"))
+            if typed == (TMO_USER, TMO_PASSWORD):
+                self.tab.update(url=HOME_URL, frame=[])
+        elif node.get("onclick") == "show_catalog_view()":
+            self.tab.update(catalog=True, section="Phones")
+        elif node.tag == "span" and node.text == "CPO":
+            self.tab["section"] = "CPO"
+        elif node.get("value") == "Login":
+            typed = (doc.xpath('//input[@name="secUserID"]')[0].get("value"),
+                     doc.xpath('//input[@name="secPassword"]')[0].get("value"))
+            self.rtpos_logged_in = typed == (RTPOS_USER, RTPOS_PASSWORD)
+        elif node.tag == "span" and node.text == "Generate":
+            self.grid = True
+        elif "dx-icon-export-excel-button" in (node.get("class") or ""):
+            with open(os.path.join(self.download_dir, scraper.REPORT_FILE_NAME), "wb") as f:
+                f.write(EXPORT_BYTES)
+
+    # WebDriver interface
+
+    def find_element(self, by, value):
+        found = self.find_elements(by, value)
+        if not found:
+            raise NoSuchElementException(value)
+        return found[0]
+
+    def find_elements(self, by, value):
+        return [StandInElement(self, n) for n in self._doc().xpath(value)]
+
+    def execute_script(self, script, *args):
+        if args and "click" in script:
+            args[0].click()
+        return None
+
+    def execute_cdp_cmd(self, cmd, params=None):
+        return {}
+
+    def get_log(self, log_type):
+        return []
+
+    @property
+    def current_url(self):
+        return self.tab["url"]
+
+    @property
+    def title(self):
+        return ""
+
+    @property
+    def page_source(self):
+        return lxml.html.tostring(self._doc(), encoding="unicode")
+
+    @property
+    def current_window_handle(self):
+        return self.handle
+
+    @property
+    def window_handles(self):
+        return list(self.tabs)
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def close(self):
+        del self.tabs[self.handle]
+
+    def quit(self):
+        self.tabs = {}
+
+
+# ── Round trip ───────────────────────────────────────────────────────────────
+
+@pytest.fixture
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PAGE_METRICS", "0")
+    monkeypatch.delenv("RTPOS_DAY_WINDOWS", raising=False)
+    monkeypatch.delenv("SESSION_RECORD_DIR", raising=False)
+    monkeypatch.delenv("SESSION_REPLAY_DIR", raising=False)
+    monkeypatch.setattr(artifact_store, "_store", artifact_store.ArtifactStore(str(tmp_path / "artifacts")))
+    monkeypatch.setattr(scraper, "get_proxy_pool", lambda: None)
+    session_replay.reset_sessions()
+    return tmp_path
+
+
+def scrape(driver_for):
+    """do_login + catalog harvest on one session, then the RT POS export"""
+    driver = driver_for(TMO_USER)
+    try:
+        assert scraper.do_login(driver, TMO_USER, TMO_PASSWORD)
+        driver.switch_to.default_content()
+        home_url = driver.current_url
+        scraper.open_catalog(driver, home_url)
+        rows = scraper.harvest_catalog_sections(driver, home_url)
+    finally:
+        driver.quit()
+
+    exports = scraper.download_report(RTPOS_USER, RTPOS_PASSWORD, account="IOTPHILLY", run_date="2026-10-19")
+    return rows, exports
+
+
+@pytest.fixture
+def recording(isolated, monkeypatch):
+    """Record a run against the stand-in browser; returns (recording dir, rows, exports)"""
+    record_dir = isolated / "recording"
+
+    def recording_driver(use_proxy=False, session_key=None, warm=True):
+        dl_dir = artifact_store.get_artifact_store().job_dir(session_key)
+        driver = session_replay.wrap_for_recording(StandInBrowser(dl_dir), session_key, dl_dir)
+        driver.proxy = None
+        driver.download_dir = dl_dir
+        driver.diagnostics = diagnostics.SessionDiagnostics(driver, session_key)
+        return driver
+
+    with monkeypatch.context() as patch:
+        patch.setenv("SESSION_RECORD_DIR", str(record_dir))
+        patch.setattr(scraper, "driverinitialize", recording_driver)
+        with session_replay.virtual_clock():
+            rows, exports = scrape(lambda key: recording_driver(session_key=key))
+    return record_dir, rows, exports
+
+
+def test_recording_holds_no_credentials(recording):
+    record_dir, rows, exports = recording
+    assert rows == EXPECTED_ROWS
+    assert list(exports) == [scraper.PRIMARY_DAY_WINDOW]
+
+    sessions = sorted(os.listdir(record_dir))
+    assert sessions == sorted([f"{TMO_USER}-01", f"{RTPOS_USER}-01"])
+    for session in sessions:
+        with open(record_dir / session / "session.json", encoding="utf-8") as f:
+            recorded = f.read()
+        for secret in (TMO_USER, TMO_PASSWORD, RTPOS_USER, RTPOS_PASSWORD, SESSION_TOKEN):
+            assert secret not in recorded, f"{secret} leaked into {session}"
+    assert os.listdir(record_dir / f"{RTPOS_USER}-01" / "artifacts") == [scraper.REPORT_FILE_NAME]
+
+
+def test_replay_matches_the_recorded_run_without_real_sleeps(recording, isolated, monkeypatch):
+    record_dir, recorded_rows, recorded_exports = recording
+    monkeypatch.setattr(artifact_store, "_store", artifact_store.ArtifactStore(str(isolated / "replayed")))
+    monkeypatch.setenv("SESSION_REPLAY_DIR", str(record_dir))
+    session_replay.reset_sessions()
+
+    started, real_started = time.time(), time.perf_counter()
+    with session_replay.replay_clock():
+        rows, exports = scrape(lambda key: scraper.driverinitialize(use_proxy=True, session_key=key))
+        virtual_elapsed = time.time() - started
+    real_elapsed = time.perf_counter() - real_started
+
+    assert rows == recorded_rows == EXPECTED_ROWS
+    with open(exports[scraper.PRIMARY_DAY_WINDOW], "rb") as f:
+        assert f.read() == EXPORT_BYTES
+    assert os.path.basename(exports[7]) == os.path.basename(recorded_exports[7])
+    # The scraper's fixed waits add up to well over 30 s; none of them really ran
+    assert virtual_elapsed > 30
+    assert real_elapsed < 10
@@ -0,0 +1,53 @@
+"""
+Shard file and sheet names stay distinct when market names clash.
+"""
+
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scraper  # noqa: E402
+
+
+def report(markets):
+    return pd.DataFrame({
+        'Market': markets,
+        'Store Name': [f"Store {i}" for i in range(len(markets))],
+        'Item Number': ["SKU1"] * len(markets),
+    })
+
+
+def test_markets_that_slug_alike_get_separate_files(tmp_path, monkeypatch):
+    written = []
+    monkeypatch.setattr(scraper, "write_workbook", lambda rows, stock, path, **kw: written.append(path))
+    monkeypatch.setattr(scraper, "write_shard_index", lambda *args: None)
+
+    output = str(tmp_path / "IDOO.xlsx")
+    paths = scraper.write_sharded_report(report(["North/East", "North East", "South"]), pd.DataFrame(),
+                                         output, "market", mode="files", workers=1)
+
+    assert [os.path.basename(p) for p in written] == [
+        "IDOO-NORTH-EAST.xlsx", "IDOO-NORTH-EAST-2.xlsx", "IDOO-SOUTH.xlsx"
+    ]
+    assert paths == [output] + written
+
+
+def test_sheet_names_are_unique_and_keep_clear_of_fixed_sheets(tmp_path, monkeypatch):
+    groups = []
+    monkeypatch.setattr(scraper, "write_workbook",
+                        lambda out, stock, path, sheet_groups: groups.extend(sheet_groups) or path)
+
+    long_name = "Greater Philadelphia Metro Market"
+    scraper.write_sharded_report(report([long_name + " A", long_name + " B", "Report", "stock_quantity"]),
+                                 pd.DataFrame(), str(tmp_path / "IDOO.xlsx"), "market", mode="sheets")
+
+    names = [name for name, _ in groups]
+    assert names == [long_name[:31], long_name[:29] + "-2", "Report-2", "stock_quantity-2"]
+    assert all(len(name) <= 31 for name in names)
+
+
+def test_unique_names():
+    assert scraper._unique_names(["A", "a", "A-2", "B"]) == ["A", "a-2", "A-2-2", "B"]
@@ -0,0 +1,47 @@
+"""
+b2b_tmo catalog layout, shared by the browser path (scraper.py) and the
+HTTP client (catalog_http.py): the login URL, where items and section
+links sit on the page, how an allocation cell reads, and how sections are
+merged into rows.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+TMO_LOGIN_URL = "https://www.t-mobiledealerordering.com/b2b_tmo/init.do"
+
+CATALOG_ITEM_XPATH = '//div[contains(@class,"catItemList-holder")]/div[@class="catalauge-item-holder "]'
+
+# Catalog sections harvested per account. The first section is the default
+# view shown after show_catalog_view(); the others are opened from the
+# cat-secnav-areaname links, each in its own tab of the logged-in session.
+CATALOG_SECTIONS = [
+    {"name": "Phones", "nav_label": None},
+    {"name": "CPO", "nav_label": "CPO"},
+]
+
+
+def section_nav_xpath(nav_label):
+    return f'//div[@class="cat-secnav-areaname"]/a/span[contains(text(),"{nav_label}")]'
+
+
+def allocation_available(qty_text):
+    """Available quantity from a cat-prd-qty cell ("Allocation : 5 of 20" -> "5")"""
+    return qty_text.replace("Allocation :", "").strip().split("of")[0].strip()
+
+
+def merge_sections(sections, harvested):
+    """[(section, sku, qty)] from {section name: [(sku, qty)]}, first section wins per SKU"""
+    rows = []
+    seen = set()
+    for section in sections:
+        for sku, qty in harvested.get(section["name"], []):
+            if sku in seen:
+                logger.info(f"SKU {sku} already harvested, skipping duplicate in {section['name']}")
+                continue
+            seen.add(sku)
+            rows.append((section["name"], sku, qty))
+
+    logger.info(f"Catalog harvest: {len(rows)} SKUs with allocation across {len(harvested)} section(s)")
+    return rows
@@ -0,0 +1,88 @@
+"""
+Cached results for formula cells in a saved .xlsx.
+
+openpyxl writes formulas with an empty cached value (<f>..</f><v></v>), so
+anything that reads the file without a calculation engine (pandas, phone
+previews, ingestion jobs) sees blanks. write_cached_values() fills in the
+<v> of the given formula cells by rewriting that one sheet's XML inside the
+zip; the formulas stay, and Excel still recalculates on open.
+"""
+
+import os
+import re
+import shutil
+import logging
+import zipfile
+import tempfile
+import posixpath
+
+logger = logging.getLogger(__name__)
+
+_FORMULA_CELL = re.compile(r'<c r="([A-Z]+[0-9]+)"([^>]*)><f>(.*?)</f><v\s*/?>(?:</v>)?</c>', re.S)
+
+
+def _sheet_part(archive, sheet_name):
+    """Zip member holding the named worksheet"""
+    workbook = archive.read("xl/workbook.xml").decode("utf-8")
+    rels = archive.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+
+    for sheet in re.finditer(r"<sheet\b[^>]*/>", workbook):
+        tag = sheet.group(0)
+        name = re.search(r'\bname="([^"]*)"', tag)
+        rel_id = re.search(r'\br:id="([^"]*)"', tag)
+        if not name or not rel_id or name.group(1) != sheet_name:
+            continue
+        for rel in re.finditer(r"<Relationship\b[^>]*/>", rels):
+            if f'Id="{rel_id.group(1)}"' in rel.group(0):
+                target = re.search(r'\bTarget="([^"]*)"', rel.group(0)).group(1)
+                return target.lstrip("/") if target.startswith("/") else posixpath.join("xl", target)
+    raise KeyError(f"Sheet {sheet_name!r} not found")
+
+
+def _format(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def write_cached_values(path, sheet_name, values):
+    """
+    Store values (cell ref -> number) as the cached results of those formula
+    cells on sheet_name. Cells without a formula are left alone. Returns the
+    number of cells filled.
+    """
+    with zipfile.ZipFile(path) as archive:
+        part = _sheet_part(archive, sheet_name)
+        xml = archive.read(part).decode("utf-8")
+
+    filled = 0
+
+    def fill(match):
+        nonlocal filled
+        ref, attrs, formula = match.groups()
+        if ref not in values:
+            return match.group(0)
+        filled += 1
+        attrs = re.sub(r'\st="[^"]*"', "", attrs)
+        return f'<c r="{ref}"{attrs}><f>{formula}</f><v>{_format(values[ref])}</v></c>'
+
+    xml = _FORMULA_CELL.sub(fill, xml)
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".xlsx", dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(path) as source, \
+                zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as target:
+            for item in source.infolist():
+                if item.filename == part:
+                    target.writestr(item, xml.encode("utf-8"))
+                else:
+                    with source.open(item) as src, target.open(item, "w") as dst:
+                        shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    logger.info(f"Cached {filled} formula result(s) on {sheet_name}")
+    return filled